@@ -32,5 +32,6 @@ import os
 __version__ = '7.7.12'
 DEBUG = bool(os.getenv('NIKOLA_DEBUG'))
 
+from . import startup_profile  # NOQA (first, to time the imports below)
 from .nikola import Nikola  # NOQA
 from . import plugins  # NOQA
@@ -35,9 +35,9 @@ try:
 except ImportError:
     pass  # This is only so raw_input/input does nicer things if it's available
 import sys
+import time
 import traceback
 
-from doit.loader import generate_tasks
 from doit.cmd_base import TaskLoader
 from doit.reporter import ExecutedOnlyReporter
 from doit.doit_cmd import DoitMain
@@ -49,9 +49,12 @@ from doit.cmd_auto import Auto as DoitAuto
 from logbook import NullHandler
 from blinker import signal
 
-from . import __version__
+from . import __version__, filters
+from .dependency_checker import checker_class
+from .manifest import changed_files, generate_site_tasks, load_affected_tasks, read_manifest, write_manifest
 from .plugin_categories import Command
 from .nikola import Nikola
+from .startup_profile import PROFILER
 from .utils import sys_decode, sys_encode, get_root_dir, req_missing, LOGGER, STRICT_HANDLER, STDERR_HANDLER, ColorfulStderrHandler
 
 if sys.version_info[0] == 3:
@@ -91,6 +94,16 @@ def main(args=None):
             conf_filename_changed = True
             break
 
+    profile_startup = None
+    for index, arg in enumerate(args):
+        if arg == '--profile-startup' or arg[:18] == '--profile-startup=':
+            del args[index]
+            del oargs[index]
+            profile_startup = arg[18:] or True
+            PROFILER.enabled = True
+            PROFILER.record('phase', 'import nikola', time.time() - PROFILER.started)
+            break
+
     quiet = False
     strict = False
     if len(args) > 0 and args[0] == 'build' and '--strict' in args:
@@ -124,11 +137,12 @@ def main(args=None):
 
     sys.path.append('')
     try:
-        if sys.version_info[0] == 3:
-            loader = importlib.machinery.SourceFileLoader("conf", conf_filename)
-            conf = loader.load_module()
-        else:
-            conf = imp.load_source("conf", conf_filename_bytes)
+        with PROFILER.timed('phase', 'main: load conf.py'):
+            if sys.version_info[0] == 3:
+                loader = importlib.machinery.SourceFileLoader("conf", conf_filename)
+                conf = loader.load_module()
+            else:
+                conf = imp.load_source("conf", conf_filename_bytes)
         config = conf.__dict__
     except Exception:
         if os.path.exists(conf_filename):
@@ -164,11 +178,19 @@ def main(args=None):
     config['__quiet__'] = quiet
     config['__configuration_filename__'] = conf_filename
     config['__cwd__'] = original_cwd
-    site = Nikola(**config)
+    with PROFILER.timed('phase', 'main: Nikola()'):
+        site = Nikola(**config)
     DN = DoitNikola(site, quiet)
     if _RETURN_DOITNIKOLA:
         return DN
-    _ = DN.run(oargs)
+    try:
+        with PROFILER.timed('phase', 'main: run command'):
+            _ = DN.run(oargs)
+    finally:
+        if profile_startup is True:
+            PROFILER.report()
+        elif profile_startup:
+            PROFILER.dump(profile_startup)
 
     if site.invariant:
         freeze.stop()
@@ -232,9 +254,43 @@ class Build(DoitRun):
                 'help': "Run quietly.",
             }
         )
+        opts.append(
+            {
+                'name': 'affected_by',
+                'long': 'affected-by',
+                'default': [],
+                'type': list,
+                'help': "Only build what depends on these files (comma-separated, relative to the site).",
+            }
+        )
+        opts.append(
+            {
+                'name': 'affected_since',
+                'long': 'affected-since',
+                'default': '',
+                'type': str,
+                'help': "Only build what depends on files changed in git since this revision.",
+            }
+        )
+        opts.append(
+            {
+                'name': 'prune_filter_cache',
+                'long': 'prune-filter-cache',
+                'default': False,
+                'type': bool,
+                'help': "Remove output of filters which is not used any more from FILTER_CACHE_FOLDER.",
+            }
+        )
         self.cmd_options = tuple(opts)
         super(Build, self).__init__(*args, **kw)
 
+    def execute(self, params, args):
+        """Build the site, then remove unused output of filters from their cache if asked to."""
+        result = super(Build, self).execute(params, args)
+        if params.get('prune_filter_cache'):
+            filters.prune_cache(self.loader.nikola.config['OUTPUT_FOLDER'])
+        return result
+
 
 class Clean(DoitClean):
     """Clean site, including the cache directory."""
@@ -259,9 +315,14 @@ class NikolaTaskLoader(TaskLoader):
         """Initialize the loader."""
         self.nikola = nikola
         self.quiet = quiet
+        # Where doit reports on the build (sys.stderr if None)
+        self.outstream = None
+        # The doit command the tasks were last loaded for
+        self.command = None
 
     def load_tasks(self, cmd, opt_values, pos_args):
         """Load Nikola tasks."""
+        self.command = cmd
         if self.quiet:
             DOIT_CONFIG = {
                 'verbosity': 0,
@@ -270,18 +331,50 @@ class NikolaTaskLoader(TaskLoader):
         else:
             DOIT_CONFIG = {
                 'reporter': ExecutedOnlyReporter,
-                'outfile': sys.stderr,
+                'outfile': self.outstream or sys.stderr,
             }
         DOIT_CONFIG['default_tasks'] = ['render_site', 'post_render']
         DOIT_CONFIG.update(self.nikola._doit_config)
-        tasks = generate_tasks(
-            'render_site',
-            self.nikola.gen_tasks('render_site', "Task", 'Group of tasks to render the site.'))
-        latetasks = generate_tasks(
-            'post_render',
-            self.nikola.gen_tasks('post_render', "LateTask", 'Group of tasks to be executed after site is rendered.'))
+        manifest = None
+        tasks = self.load_affected_tasks(opt_values)
+        if tasks is not None:
+            DOIT_CONFIG['default_tasks'] = [task.name for task in tasks]
+            manifest = read_manifest(self.nikola)
+        else:
+            generated = time.time()
+            tasks = generate_site_tasks(self.nikola)
+            if self.nikola.configured:
+                manifest = write_manifest(self.nikola, tasks, generated)
+        # Files are checked in the same mode whichever tasks are loaded
+        if manifest is not None:
+            task_deps = [(name, entry['file_dep']) for name, entry in manifest['tasks'].items()]
+        else:
+            task_deps = [(task.name, task.file_dep) for task in tasks]
+        checker = checker_class(self.nikola.config['DEPENDENCY_CHECKER'], task_deps, self.nikola.config['CACHE_FOLDER'])
+        if checker is not None and 'check_file_uptodate' not in self.nikola._doit_config:
+            DOIT_CONFIG['check_file_uptodate'] = checker
         signal('initialized').send(self.nikola)
-        return tasks + latetasks, DOIT_CONFIG
+        return tasks, DOIT_CONFIG
+
+    def load_affected_tasks(self, opt_values):
+        """Load only the tasks affected by --affected-by/--affected-since, or return None."""
+        paths = list(opt_values.get('affected_by') or [])
+        if opt_values.get('affected_since'):
+            changed = changed_files(opt_values['affected_since'])
+            if changed is None:
+                paths = None
+            else:
+                paths.extend(changed)
+        elif not paths:
+            return None
+        tasks = None
+        if paths is not None and self.nikola.configured:
+            tasks = load_affected_tasks(self.nikola, paths)
+        if tasks is None:
+            LOGGER.warning('Cannot tell which tasks are affected by the changes, building everything.')
+        else:
+            LOGGER.info('{0} files changed, {1} tasks affected.'.format(len(paths), len(tasks)))
+        return tasks
 
 
 class DoitNikola(DoitMain):
@@ -330,18 +423,23 @@ class DoitNikola(DoitMain):
                 if arg not in ('--help', '-h'):
                     args.append(arg)
 
-        if args[0] == 'help':
-            self.nikola.init_plugins(commands_only=True)
-        elif args[0] == 'plugin':
-            self.nikola.init_plugins(load_all=True)
-        else:
-            self.nikola.init_plugins()
-
-        sub_cmds = self.get_cmds()
+        with PROFILER.timed('phase', 'main: init_plugins'):
+            if args[0] == 'help':
+                self.nikola.init_plugins(commands_only=True)
+            elif args[0] == 'plugin':
+                self.nikola.init_plugins(load_all=True)
+            else:
+                self.nikola.init_plugins()
 
         if any(arg in ("--version", '-V') for arg in args):
             cmd_args = ['version']
             args = ['version']
+
+        # Only load the command we need, unless it is not a Nikola command.
+        if args[0] == 'help' or self.nikola.plugin_manager.getPluginByName(args[0], 'Command') is None:
+            self.nikola.plugin_manager.getPluginsOfCategory('Command')
+        sub_cmds = self.get_cmds()
+
         if args[0] not in sub_cmds.keys():
             LOGGER.error("Unknown command {0}".format(args[0]))
             sugg = defaultdict(list)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Checkers deciding whether the file dependencies of tasks changed.
+
+doit's default checker only trusts modification times to say that a
+file did not change; when they differ it reads the whole file to
+compare its MD5, and forgets the result if the task is up to date, so
+after a fresh checkout or a restore every photo and download is read on
+every build until its tasks run again.  Tasks that just copy or resize
+big files can trust their size, modification time and inode instead,
+and only compare the MD5 when those changed, remembering it for the
+next builds.
+
+The ``DEPENDENCY_CHECKER`` option chooses how the dependencies of each
+task family (the part of the task name before the colon) are checked.
+"""
+
+from __future__ import unicode_literals
+import atexit
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from doit.dependency import FileChangedChecker, MD5Checker, get_file_md5
+
+from . import utils
+
+CHECKER_MODES = ('md5', 'stat')
+
+__all__ = ('CHECKER_MODES', 'HashCache', 'NikolaChecker', 'checker_class', 'stat_key')
+
+
+def stat_key(file_stat):
+    """Return the size, modification time (in nanoseconds) and inode of a file, from its stat data."""
+    try:
+        mtime = file_stat.st_mtime_ns
+    except AttributeError:  # Python 2
+        mtime = int(file_stat.st_mtime * 1e9)
+    return [file_stat.st_size, mtime, file_stat.st_ino]
+
+
+class HashCache(object):
+    """MD5 hashes of files, valid while their stat data does not change, kept between runs."""
+
+    def __init__(self, path=None):
+        """Keep the hashes in path (or only in memory)."""
+        self.path = path
+        self.hashes = None
+        self.changed = False
+
+    def md5(self, path, file_stat):
+        """Return the MD5 of a file, reading it only if needed."""
+        if self.hashes is None:
+            self.hashes = {}
+            if self.path is not None:
+                try:
+                    with io.open(self.path, 'r', encoding='utf-8') as inf:
+                        self.hashes = json.load(inf)
+                except (IOError, OSError, ValueError):
+                    pass
+        key = stat_key(file_stat)
+        entry = self.hashes.get(path)
+        if entry is None or entry[:3] != key:
+            entry = self.hashes[path] = key + [get_file_md5(path)]
+            self.changed = True
+        return entry[3]
+
+    def save(self):
+        """Write the hashes, if they changed."""
+        if not self.changed or self.path is None:
+            return
+        dname = os.path.dirname(self.path)
+        utils.makedirs(dname)
+        with tempfile.NamedTemporaryFile(dir=dname, delete=False) as outf:
+            tname = outf.name
+            outf.write(json.dumps(self.hashes, separators=(',', ':')).encode('utf-8'))
+        shutil.move(tname, self.path)
+        self.changed = False
+
+
+class NikolaChecker(FileChangedChecker):
+    """Check some files by their size, modification time and inode, the rest by MD5.
+
+    In ``stat`` mode the state of a file is ``['stat', size, mtime_ns,
+    inode, md5]``; the MD5 is only compared (and computed) when the rest
+    changed.  Subclasses made by ``checker_class`` set the mode of each
+    file, and where to keep the hashes.
+    """
+
+    modes = {}
+    default = 'md5'
+    hash_cache_path = None
+
+    def __init__(self):
+        """Initialize the checker."""
+        self.md5 = MD5Checker()
+        self.hashes = HashCache(self.hash_cache_path)
+        atexit.register(self.hashes.save)
+
+    def check_modified(self, file_path, file_stat, state):
+        """Check if file_path was modified since state was saved."""
+        if state[0] == 'stat':
+            if len(state) != 5:
+                return True
+            if self.modes.get(file_path, self.default) == 'stat' and state[1:4] == stat_key(file_stat):
+                return False
+            size, md5 = state[1], state[4]
+        elif self.modes.get(file_path, self.default) == 'stat':
+            # Saved by the MD5 checker
+            size, md5 = state[1], state[2]
+        else:
+            return self.md5.check_modified(file_path, file_stat, state)
+        if file_stat.st_size != size:
+            return True
+        return md5 != self.hashes.md5(file_path, file_stat)
+
+    def get_state(self, dep, current_state):
+        """Compute the state of dep, or return None if current_state is still right."""
+        if self.modes.get(dep, self.default) == 'stat':
+            file_stat = os.stat(dep)
+            key = stat_key(file_stat)
+            if current_state and current_state[0] == 'stat' and len(current_state) == 5 and current_state[1:4] == key:
+                return None
+            return ['stat'] + key + [self.hashes.md5(dep, file_stat)]
+        if current_state and current_state[0] == 'stat':
+            current_state = None
+        return self.md5.get_state(dep, current_state)
+
+
+def checker_class(setting, task_deps, cache_folder=None):
+    """Return the checker class for a DEPENDENCY_CHECKER setting.
+
+    setting is a mode for all tasks, or a dictionary of task families to
+    modes (with ``'default'`` for the rest).  task_deps are the names and
+    file dependencies of all the tasks of the site; files used by tasks
+    in different modes are checked by MD5.  Hashes of files in ``stat``
+    mode are kept in cache_folder.  Returns None (doit's checker) if
+    there is no setting.
+    """
+    if not setting:
+        return None
+    if isinstance(setting, dict):
+        families = dict(setting)
+    else:
+        families = {'default': setting}
+    for family, mode in list(families.items()):
+        if mode not in CHECKER_MODES:
+            utils.LOGGER.warn('Unknown DEPENDENCY_CHECKER mode {0!r} for {1}, using "md5".'.format(mode, family))
+            families[family] = 'md5'
+    default = families.pop('default', 'md5')
+
+    modes = {}
+    for name, file_dep in task_deps:
+        mode = families.get(name.split(':', 1)[0], default)
+        for dep in file_dep:
+            if modes.get(dep) != 'md5':
+                modes[dep] = mode
+    hash_cache_path = os.path.join(cache_folder, 'file_hashes.json') if cache_folder else None
+    # Keep the name, so doit does not think the checker changed
+    return type(str('NikolaChecker'), (NikolaChecker,), {
+        'modes': modes, 'default': default, 'hash_cache_path': hash_cache_path})
@@ -27,15 +27,23 @@
 """Utility functions to help run filters on files."""
 
 from functools import wraps
+import hashlib
 import os
 import io
 import json
+import re
 import shutil
 import subprocess
 import tempfile
+import time
 import shlex
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which  # NOQA
 
 import lxml
+import lxml.html
 try:
     import typogrify.filters as typo
 except ImportError:
@@ -44,6 +52,19 @@ import requests
 
 from .utils import req_missing, LOGGER
 
+# Where the output of filter commands is kept, by the contents of their
+# input (set from FILTER_CACHE_FOLDER by Nikola)
+CACHE_FOLDER = None
+
+# Cached output not used for this long (in seconds) is removed by prune_cache
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Stat data of the executables run by filters, by command name
+_tool_versions = {}
+
+# Executables found by looking for them, by filter
+_executables = {}
+
 
 def apply_to_binary_file(f):
     """Apply a filter to a binary file.
@@ -88,6 +109,113 @@ def list_replace(the_list, find, replacement):
             the_list[i] = replacement
 
 
+def tool_version(name):
+    """Return something that changes when the executable called name is replaced.
+
+    That is its path, size and modification time, so upgrading a tool
+    invalidates the output cached for it, without running it to ask.
+    """
+    if name not in _tool_versions:
+        path = which(name)
+        if path is None:
+            _tool_versions[name] = None
+        else:
+            path = os.path.realpath(path)
+            stat = os.stat(path)
+            _tool_versions[name] = [path, stat.st_size, stat.st_mtime]
+    return _tool_versions[name]
+
+
+def _cache_path(key, infile):
+    """Return where the output of a filter (identified by key) for infile is kept."""
+    digest = hashlib.sha1(json.dumps(key).encode('utf-8'))
+    with open(infile, 'rb') as inf:
+        for chunk in iter(lambda: inf.read(65536), b''):
+            digest.update(chunk)
+    key = digest.hexdigest()
+    return os.path.join(CACHE_FOLDER, key[:2], key[2:] + os.path.splitext(infile)[1])
+
+
+def run_cached(key, infile, f):
+    """Run f(infile), which changes infile in place, reusing earlier output.
+
+    If CACHE_FOLDER is set, the output of f for the same key (which
+    identifies the filter, like the command it runs) and the same input
+    contents is copied from there instead of running f again.
+    """
+    # circular import prevention
+    from .utils import makedirs
+    if CACHE_FOLDER is None:
+        return f(infile)
+    cache_path = _cache_path(key, infile)
+    if os.path.isfile(cache_path):
+        shutil.copyfile(cache_path, infile)
+        # Mark it as used, for prune_cache
+        os.utime(cache_path, None)
+        return None
+    result = f(infile)
+    makedirs(os.path.dirname(cache_path))
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), delete=False) as outf:
+        with open(infile, 'rb') as inf:
+            shutil.copyfileobj(inf, outf)
+    shutil.move(outf.name, cache_path)
+    return result
+
+
+def _file_digest(path):
+    """Return the SHA1 hex digest of the contents of a file."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as inf:
+        for chunk in iter(lambda: inf.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prune_cache(output_folder, max_age=None):
+    """Remove the output in CACHE_FOLDER not used for max_age seconds (CACHE_MAX_AGE by default).
+
+    Tasks that are up to date don't look their output up, so output that
+    is still in output_folder (compared by contents) is kept, whatever
+    its age.
+    """
+    if CACHE_FOLDER is None or not os.path.isdir(CACHE_FOLDER):
+        return
+    if max_age is None:
+        max_age = CACHE_MAX_AGE
+    limit = time.time() - max_age
+    old = {}
+    for root, dirs, files in os.walk(CACHE_FOLDER):
+        for fname in files:
+            path = os.path.join(root, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:  # Removed by another process
+                continue
+            if stat.st_mtime < limit:
+                old[path] = stat.st_size
+    if not old:
+        return
+    # Only files of the same size can have the same contents
+    sizes = set(old.values())
+    in_use = set()
+    for root, dirs, files in os.walk(output_folder):
+        for fname in files:
+            path = os.path.join(root, fname)
+            if os.path.isfile(path) and os.path.getsize(path) in sizes:
+                in_use.add(_file_digest(path))
+    for path in old:
+        try:
+            if _file_digest(path) in in_use:
+                os.utime(path, None)
+            else:
+                os.unlink(path)
+        except (IOError, OSError):  # Removed or replaced by another process
+            pass
+    for root, dirs, files in os.walk(CACHE_FOLDER, topdown=False):
+        if root != CACHE_FOLDER and not os.listdir(root):
+            os.rmdir(root)
+
+
 def runinplace(command, infile):
     """Run a command in-place on a file.
 
@@ -102,10 +230,18 @@ def runinplace(command, infile):
     That will replace myfile.css with a minified version.
 
     You can also supply command as a list.
+
+    The output is cached by run_cached, for this command and the version
+    of the tool it runs.
     """
     if not isinstance(command, list):
         command = shlex.split(command)
+    key = [command, tool_version(command[0])]
+    return run_cached(key, infile, lambda infile: _runinplace(list(command), infile))
 
+
+def _runinplace(command, infile):
+    """Run a command (a list) in-place on a file."""
     tmpdir = None
 
     if "%2" in command:
@@ -128,21 +264,18 @@ def runinplace(command, infile):
 
 def yui_compressor(infile):
     """Run YUI Compressor on a file."""
-    yuicompressor = False
-    try:
-        subprocess.call('yui-compressor', stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'))
-        yuicompressor = 'yui-compressor'
-    except Exception:
-        pass
-    if not yuicompressor:
-        try:
-            subprocess.call('yuicompressor', stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'))
-            yuicompressor = 'yuicompressor'
-        except:
+    if 'yui_compressor' not in _executables:
+        for yuicompressor in ('yui-compressor', 'yuicompressor'):
+            try:
+                subprocess.call(yuicompressor, stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'))
+                _executables['yui_compressor'] = yuicompressor
+                break
+            except Exception:
+                pass
+        else:
             raise Exception("yui-compressor is not installed.")
-            return False
 
-    return runinplace('{} --nomunge %1 -o %2'.format(yuicompressor), infile)
+    return runinplace('{} --nomunge %1 -o %2'.format(_executables['yui_compressor']), infile)
 
 
 def closure_compiler(infile):
@@ -226,6 +359,178 @@ def html5lib_xmllike(data):
     return data
 
 
+# Elements whose contents are left alone by minify_html_document
+HTML_PRESERVE_WHITESPACE = frozenset(('pre', 'textarea', 'script', 'style'))
+# Elements around which (and in which) whitespace is not rendered
+HTML_BLOCKS = frozenset((
+    'address', 'article', 'aside', 'base', 'blockquote', 'body', 'caption', 'col',
+    'colgroup', 'dd', 'details', 'dialog', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5',
+    'h6', 'head', 'header', 'hgroup', 'hr', 'html', 'li', 'link', 'main',
+    'meta', 'nav', 'ol', 'optgroup', 'option', 'p', 'pre', 'script', 'section',
+    'style', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'title', 'tr', 'ul'))
+# Elements in which whitespace between children is never rendered
+HTML_CONTAINERS = frozenset((
+    'colgroup', 'dl', 'head', 'html', 'ol', 'optgroup', 'select', 'table',
+    'tbody', 'tfoot', 'thead', 'tr', 'ul'))
+HTML_VOID = frozenset((
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'embed', 'frame', 'hr',
+    'img', 'input', 'keygen', 'link', 'meta', 'param', 'source', 'track', 'wbr'))
+HTML_BOOLEAN_ATTRIBUTES = frozenset((
+    'allowfullscreen', 'async', 'autofocus', 'autoplay', 'checked', 'controls',
+    'default', 'defer', 'disabled', 'formnovalidate', 'hidden', 'ismap',
+    'itemscope', 'loop', 'multiple', 'muted', 'nomodule', 'novalidate', 'open',
+    'readonly', 'required', 'reversed', 'selected'))
+# Elements after which the end tag of a p element may be omitted
+_P_CLOSERS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'header', 'hgroup', 'hr', 'main', 'menu', 'nav', 'ol',
+    'p', 'pre', 'section', 'table', 'ul'))
+# For elements with optional end tags, the elements that may follow them
+# (None: the end of the parent) when the end tag is omitted
+_OPTIONAL_END_TAGS = {
+    'body': (None,),
+    'dd': ('dd', 'dt', None),
+    'dt': ('dd', 'dt'),
+    'head': ('body',),
+    'html': (None,),
+    'li': ('li', None),
+    'optgroup': ('optgroup', None),
+    'option': ('option', 'optgroup', None),
+    'p': _P_CLOSERS | frozenset((None,)),
+    'tbody': ('tbody', 'tfoot', None),
+    'td': ('td', 'th', None),
+    'tfoot': (None,),
+    'th': ('td', 'th', None),
+    'thead': ('tbody', 'tfoot'),
+    'tr': ('tr', None),
+}
+# Parents in which a p element must keep its end tag when it is the last child
+_P_KEEP_END_IN = frozenset(('a', 'audio', 'del', 'ins', 'map', 'noscript', 'video'))
+_HTML_WHITESPACE_RE = re.compile('[ \t\n\r\f]+')
+_UNQUOTED_ATTRIBUTE_RE = re.compile('^[^ \t\n\r\f"\'=<>`]+$')
+
+
+def _is_conditional_comment(node):
+    """Check if a node is a comment used by Internet Explorer."""
+    return node.text.startswith('[if') or node.text.startswith('<![endif]')
+
+
+def _remove_keeping_tail(node):
+    """Remove a node from its parent, keeping its tail."""
+    parent = node.getparent()
+    if node.tail:
+        previous = node.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + node.tail
+        else:
+            parent.text = (parent.text or '') + node.tail
+    parent.remove(node)
+
+
+def _minify_tree(node):
+    """Drop comments and collapse whitespace in node (an element not preserving whitespace)."""
+    for child in list(node):
+        if child.tag is lxml.etree.Comment and not _is_conditional_comment(child):
+            _remove_keeping_tail(child)
+        elif child.tag is lxml.etree.ProcessingInstruction:
+            _remove_keeping_tail(child)
+    tag = node.tag
+    if node.text:
+        text = _HTML_WHITESPACE_RE.sub(' ', node.text)
+        if text == ' ' and (tag in HTML_CONTAINERS or (len(node) and node[0].tag in HTML_BLOCKS) or
+                            (not len(node) and tag in HTML_BLOCKS)):
+            text = ''
+        node.text = text
+    for child in node:
+        if not callable(child.tag) and child.tag not in HTML_PRESERVE_WHITESPACE:
+            _minify_tree(child)
+        if child.tail:
+            tail = _HTML_WHITESPACE_RE.sub(' ', child.tail)
+            if tail == ' ':
+                following = child.getnext()
+                if tag in HTML_CONTAINERS or (child.tag in HTML_BLOCKS and (following is None or following.tag in HTML_BLOCKS)):
+                    tail = ''
+            child.tail = tail
+
+
+def _escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _serialize_attribute(name, value):
+    if name in HTML_BOOLEAN_ATTRIBUTES and value.lower() in ('', name):
+        return ' ' + name
+    value = value.replace('&', '&amp;')
+    if _UNQUOTED_ATTRIBUTE_RE.match(value) and not value.endswith('/'):
+        return ' {0}={1}'.format(name, value)
+    return ' {0}="{1}"'.format(name, value.replace('"', '&quot;'))
+
+
+def _end_tag_is_optional(node):
+    """Check if the end tag of node can be left out."""
+    allowed = _OPTIONAL_END_TAGS.get(node.tag)
+    if allowed is None or node.tail:
+        return False
+    following = node.getnext()
+    if following is None:
+        if node.tag == 'p' and node.getparent() is not None and node.getparent().tag in _P_KEEP_END_IN:
+            return False
+        return None in allowed
+    return following.tag in allowed
+
+
+def _serialize(node, out):
+    """Serialize node (without its tail) into the list out."""
+    tag = node.tag
+    if tag is lxml.etree.Comment:
+        out.append('<!--{0}-->'.format(node.text))
+        return
+    if tag is lxml.etree.Entity:
+        out.append(node.text)
+        return
+    out.append('<' + tag)
+    for name, value in node.items():
+        out.append(_serialize_attribute(name, value))
+    out.append('>')
+    if tag in HTML_VOID:
+        return
+    if node.text:
+        out.append(node.text if tag in ('script', 'style') else _escape_text(node.text))
+    for child in node:
+        _serialize(child, out)
+        if child.tail:
+            out.append(_escape_text(child.tail))
+    if not _end_tag_is_optional(node):
+        out.append('</{0}>'.format(tag))
+
+
+def minify_html_document(doc):
+    """Minify an lxml HTML document (changing it), and return it as a string.
+
+    Collapses whitespace (except in ``pre``, ``textarea``, ``script`` and
+    ``style``), drops comments (except conditional comments) and
+    whitespace that is not rendered, leaves out optional end tags, and
+    minimizes attributes.  The doctype is not included.
+    """
+    _minify_tree(doc)
+    out = []
+    _serialize(doc, out)
+    return ''.join(out)
+
+
+@apply_to_text_file
+def lxml_minify(data):
+    """Minify HTML with lxml (like html5lib_minify, but much faster)."""
+    try:
+        doc = lxml.html.document_fromstring(data)
+    except lxml.etree.ParserError:
+        return data
+    doctype = doc.getroottree().docinfo.doctype
+    return (doctype + '\n' if doctype else '') + minify_html_document(doc)
+
+
 @apply_to_text_file
 def minify_lines(data):
     """Do nothing -- deprecated filter."""
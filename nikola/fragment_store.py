@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""A content-addressed store of compiled post fragments.
+
+Enabled with the ``COMPILE_CACHE_FOLDER`` option.  Fragments are found by
+what went into compiling them, not by where they were compiled, so the
+store can be shared between checkouts (or restored from a CI cache) and
+survives ``nikola clean``.
+
+The store contains two kinds of files, named by SHA-1 digests:
+
+``manifests/<key>.json``
+    For a key computed from the source, metadata, compiler and
+    configuration of a post, the dependencies recorded by the last
+    compilation of the post (the contents of its ``.dep`` file).
+
+``fragments/<key>.html``
+    A compiled fragment, for a key computed from the manifest key and the
+    current contents of those dependencies.
+"""
+
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from . import __version__, utils
+from .shortcodes import shortcode_version
+
+__all__ = ('FragmentStore',)
+
+
+def _write_atomically(path, data):
+    """Write bytes to path, so readers never see a partial file."""
+    utils.makedirs(os.path.dirname(path))
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as outf:
+        outf.write(data)
+    shutil.move(outf.name, path)
+
+
+class FragmentStore(object):
+    """Keep compiled fragments in a folder, addressed by their inputs."""
+
+    def __init__(self, folder, site):
+        """Use folder for the store."""
+        self.folder = folder
+        self.site = site
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.folder, kind, key[:2], key[2:] + ext)
+
+    @staticmethod
+    def _file_digest(digest, path):
+        """Feed the name and contents of a file (if it exists) into digest."""
+        digest.update(path.encode('utf-8') + b'\0')
+        try:
+            with open(path, 'rb') as inf:
+                digest.update(hashlib.sha1(inf.read()).hexdigest().encode('ascii'))
+        except (IOError, OSError):
+            digest.update(b'(missing)')
+        digest.update(b'\0')
+
+    def manifest_key(self, post, lang):
+        """Return the key of a post's manifest.
+
+        It covers the post source and metadata, the compiler (and the
+        version of its library) and its configuration, the Nikola version
+        and configuration file, and the
+        file and ``uptodate`` dependencies registered for the fragment.
+        """
+        compiler = post.compiler
+        digest = hashlib.sha1()
+        digest.update(json.dumps([
+            __version__, compiler.name, getattr(compiler, 'library_version', ''),
+            sorted(compiler.config_dependencies),
+            lang, post.is_two_file,
+        ]).encode('utf-8'))
+        for path in (post.translated_source_path(lang), post.metadata_path,
+                     utils.get_translation_candidate(post.config, post.metadata_path, lang)):
+            self._file_digest(digest, path)
+        if self.site.configuration_filename:
+            self._file_digest(digest, self.site.configuration_filename)
+        # Dependencies added by plugins; callables (like the one reading the
+        # .dep file) describe the previous compilation, and are left out.
+        for is_callable, dep in post._dependency_file_fragment[lang] + post._dependency_file_fragment[None]:
+            if not is_callable:
+                for path in (dep if isinstance(dep, list) else [dep]):
+                    self._file_digest(digest, path)
+        for is_callable, dep in post._dependency_uptodate_fragment[lang] + post._dependency_uptodate_fragment[None]:
+            if not is_callable:
+                for uptodate in (dep if isinstance(dep, list) else [dep]):
+                    if isinstance(uptodate, utils.config_changed):
+                        digest.update('{0}={1}\0'.format(uptodate.identifier, uptodate._calc_digest()).encode('utf-8'))
+        return digest.hexdigest()
+
+    def fragment_key(self, manifest_key, deps):
+        """Return the key of the fragment for a manifest and its recorded dependencies.
+
+        Returns None if the fragment cannot be stored, because it depends
+        on the timeline.
+        """
+        digest = hashlib.sha1(manifest_key.encode('ascii'))
+        for dep in deps:
+            if dep == '####MAGIC####TIMELINE':
+                return None
+            elif dep.startswith('####MAGIC####CONFIG:'):
+                value = self.site.config.get(dep.split('####MAGIC####CONFIG:', 1)[-1])
+                digest.update('{0}={1}\0'.format(dep, json.dumps(value, cls=utils.CustomEncoder, sort_keys=True)).encode('utf-8'))
+            elif dep.startswith('####MAGIC####SHORTCODE:'):
+                name = dep.split('####MAGIC####SHORTCODE:', 1)[-1]
+                digest.update('{0}={1}\0'.format(dep, shortcode_version(self.site.shortcode_registry.get(name))).encode('utf-8'))
+            else:
+                self._file_digest(digest, dep)
+        return digest.hexdigest()
+
+    def fetch(self, manifest_key, dest):
+        """Copy a stored fragment for manifest_key to dest.
+
+        Returns the dependencies recorded when the fragment was compiled,
+        or None if there is no usable fragment in the store.
+        """
+        try:
+            with io.open(self._path('manifests', manifest_key, '.json'), 'r', encoding='utf-8') as inf:
+                deps = json.load(inf)['deps']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        fragment_key = self.fragment_key(manifest_key, deps)
+        if fragment_key is None:
+            return None
+        fragment = self._path('fragments', fragment_key, '.html')
+        if not os.path.isfile(fragment):
+            return None
+        utils.makedirs(os.path.dirname(dest))
+        shutil.copyfile(fragment, dest)
+        return deps
+
+    def save(self, manifest_key, dest, deps):
+        """Store the fragment in dest, compiled with the given dependencies."""
+        deps = [p for p in deps if p != dest]
+        fragment_key = self.fragment_key(manifest_key, deps)
+        if fragment_key is None or not os.path.isfile(dest):
+            return
+        with open(dest, 'rb') as inf:
+            _write_atomically(self._path('fragments', fragment_key, '.html'), inf.read())
+        _write_atomically(self._path('manifests', manifest_key, '.json'),
+                          json.dumps({'deps': deps}, indent=2, sort_keys=True).encode('utf-8'))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Highlight code with Pygments, reusing lexers, formatters and results.
+
+Highlighted code is kept in ``CACHE_FOLDER/pygments``, addressed by the
+code, the lexer, the formatter options and the version of Pygments, so
+listings and code blocks are only highlighted again when they change.
+"""
+
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import pygments
+from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+from .utils import LocaleBorg, NikolaPygmentsHTML, makedirs, slugify
+
+__all__ = ('Highlighter',)
+
+# Line anchors are highlighted with this placeholder, which is replaced by
+# the real anchor, so code highlighted with random anchors can be cached.
+ANCHOR_PLACEHOLDER = 'nikolahighlightanchorplaceholder'
+
+
+class _Instances(threading.local):
+    """Lexers and formatters used by this thread."""
+
+    def __init__(self):
+        self.lexers = {}
+        self.formatters = {}
+
+
+class Highlighter(object):
+    """Highlight code as HTML, with a cache in ``cache_folder`` if one is given."""
+
+    def __init__(self, cache_folder=None):
+        """Create a highlighter, optionally backed by cache_folder."""
+        self.cache_folder = cache_folder
+        self.instances = _Instances()
+
+    def _lexer(self, key, factory, arg):
+        lexers = self.instances.lexers
+        if key not in lexers:
+            try:
+                lexers[key] = factory(arg)
+            except ClassNotFound:
+                lexers[key] = None
+        if lexers[key] is None:
+            raise ClassNotFound('no lexer for {0!r}'.format(arg))
+        return lexers[key]
+
+    def lexer_by_name(self, name):
+        """Return a lexer for a language name, like ``get_lexer_by_name``."""
+        return self._lexer(('name', name), get_lexer_by_name, name)
+
+    def lexer_for_filename(self, filename):
+        """Return a lexer for a file name, like ``get_lexer_for_filename``."""
+        name = os.path.basename(filename)
+        return self._lexer(('filename', name), get_lexer_for_filename, name)
+
+    def formatter(self, classes=None, linenos='table', linenostart=1):
+        """Return a NikolaPygmentsHTML formatter using the anchor placeholder."""
+        key = (tuple(classes) if classes is not None else None, linenos, linenostart)
+        formatters = self.instances.formatters
+        if key not in formatters:
+            formatters[key] = NikolaPygmentsHTML(ANCHOR_PLACEHOLDER, classes, linenos, linenostart)
+        return formatters[key]
+
+    def _path(self, code, lexer, options):
+        lexer_key = [type(lexer).__module__, type(lexer).__name__, sorted(lexer.options.items())]
+        key = hashlib.sha1(json.dumps([pygments.__version__, lexer_key, options, code], default=repr).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_folder, key[:2], key[2:] + '.html')
+
+    def highlight(self, code, lexer, anchor_ref, classes=None, linenos='table', linenostart=1):
+        """Highlight code with lexer, like ``NikolaPygmentsHTML`` does."""
+        anchor = slugify(anchor_ref, lang=LocaleBorg().current_lang, force=True)
+        if ANCHOR_PLACEHOLDER in code:
+            return pygments.highlight(code, lexer, NikolaPygmentsHTML(anchor_ref, classes, linenos, linenostart))
+        path = None
+        if self.cache_folder:
+            path = self._path(code, lexer, [classes, linenos, linenostart])
+            try:
+                with io.open(path, 'r', encoding='utf-8', newline='') as inf:
+                    return inf.read().replace(ANCHOR_PLACEHOLDER, anchor)
+            except (IOError, OSError):
+                pass
+        output = pygments.highlight(code, lexer, self.formatter(classes, linenos, linenostart))
+        if path:
+            makedirs(os.path.dirname(path))
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as outf:
+                outf.write(output.encode('utf-8'))
+            shutil.move(outf.name, path)
+        return output.replace(ANCHOR_PLACEHOLDER, anchor)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Build manifest: the targets owned by the last generated task graph.
+
+Generating every task of a site just to know which files it produces
+is expensive.  Whenever Nikola generates its tasks, it stores their
+targets and dependencies in the manifest, which commands such as
+``nikola check -f`` and ``nikola orphans`` can use instead.
+
+The manifest also holds the reverse dependency index (which tasks use
+each file), used by ``nikola build --affected-by`` to generate and run
+only the tasks affected by some changed files.
+
+Many tasks (archives, indexes, tag pages, feeds, the sitemap) depend on
+the metadata of all posts through the timeline, which is not a file
+dependency.  The manifest lists the source and metadata files of all
+posts, and changes to those are never handled by ``--affected-by``.
+
+The manifest describes the tasks as they were generated: doit tasks
+can't change their targets while running.  A full task generation
+rewrites it, and ``--affected-by`` replaces the tasks of the plugins it
+asked for tasks again.
+"""
+
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from doit.loader import generate_tasks
+
+from . import __version__, utils
+
+MANIFEST_VERSION = 3
+
+__all__ = ('affected_tasks', 'changed_files', 'generate_site_tasks', 'get_manifest', 'load_affected_tasks',
+           'load_manifest', 'manifest_path', 'read_manifest', 'update_manifest', 'write_manifest')
+
+
+def manifest_path(site):
+    """Return the path of the build manifest for a site."""
+    return os.path.join(site.config['CACHE_FOLDER'], 'build_manifest.json')
+
+
+def generate_site_tasks(site, plugins=None):
+    """Generate the render_site and post_render tasks of a site, as doit Task objects.
+
+    If ``plugins`` is given, only the tasks of the plugins with those names
+    are generated.  The targets of the other plugins' tasks are then taken
+    from the manifest, so ``site.task_targets`` covers the whole site.
+    """
+    site.task_targets = {}
+    if plugins is not None:
+        manifest = read_manifest(site)
+        for name, entry in (manifest or {}).get('tasks', {}).items():
+            if entry.get('plugin') not in plugins:
+                for target in entry['targets']:
+                    site.task_targets[target] = name
+    tasks = generate_tasks(
+        'render_site',
+        site.gen_tasks('render_site', "Task", 'Group of tasks to render the site.', plugins))
+    latetasks = generate_tasks(
+        'post_render',
+        site.gen_tasks('post_render', "LateTask", 'Group of tasks to be executed after site is rendered.', plugins))
+    return tasks + latetasks
+
+
+def _config_digest(site):
+    """Return a digest of the configuration file, or None if there is none."""
+    try:
+        with open(site.configuration_filename, 'rb') as inf:
+            return hashlib.md5(inf.read()).hexdigest()
+    except (IOError, OSError, TypeError):
+        return None
+
+
+def write_manifest(site, tasks, generated=None):
+    """Store the targets and file dependencies of tasks in the manifest.
+
+    ``generated`` is the time at which task generation started; sources
+    modified after that make the manifest stale.
+    """
+    if generated is None:
+        generated = time.time()
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'nikola': __version__,
+        'generated': generated,
+        'config': _config_digest(site),
+        'post_sources': _post_sources(site),
+        'tasks': dict((task.name, _task_entry(site, task)) for task in tasks),
+    }
+    return _save_manifest(site, manifest)
+
+
+def _post_sources(site):
+    """Return the source and metadata files of all posts, and of their translations."""
+    paths = set()
+    for post in site.timeline:
+        for path in (post.source_path, post.metadata_path):
+            paths.add(os.path.normpath(path))
+            for lang in site.config['TRANSLATIONS']:
+                paths.add(os.path.normpath(utils.get_translation_candidate(site.config, path, lang)))
+    return sorted(paths)
+
+
+def update_manifest(site, manifest, tasks, plugins):
+    """Replace the tasks of some plugins in the manifest by the newly generated tasks.
+
+    ``tasks`` must be all the tasks those plugins generate.  The time of
+    generation is kept, so the manifest does not look fresher than the
+    sources of the other tasks.
+    """
+    manifest['tasks'] = dict((name, entry) for name, entry in manifest['tasks'].items()
+                             if entry.get('plugin') is None or entry['plugin'] not in plugins)
+    for task in tasks:
+        manifest['tasks'][task.name] = _task_entry(site, task)
+    return _save_manifest(site, manifest)
+
+
+def _task_entry(site, task):
+    """Return the manifest entry of a task."""
+    entry = {
+        'targets': list(task.targets),
+        'file_dep': sorted(task.file_dep),
+    }
+    # Only what is needed to pick tasks for --affected-by
+    if task.task_dep:
+        entry['task_dep'] = list(task.task_dep)
+    if task.calc_dep:
+        entry['calc_dep'] = sorted(task.calc_dep)
+    if not task.actions:
+        entry['group'] = True
+    if task.name in site.task_plugins:
+        entry['plugin'] = site.task_plugins[task.name]
+    return entry
+
+
+def _save_manifest(site, manifest):
+    """Compute the reverse dependency index of the manifest, and write it."""
+    dependents = manifest['dependents'] = {}
+    for name, entry in sorted(manifest['tasks'].items()):
+        for dep in entry['file_dep']:
+            dependents.setdefault(dep, []).append(name)
+    path = manifest_path(site)
+    dname = os.path.dirname(path)
+    utils.makedirs(dname)
+    data = json.dumps(manifest, sort_keys=True, separators=(',', ':'))
+    with tempfile.NamedTemporaryFile(dir=dname, delete=False) as outf:
+        tname = outf.name
+        outf.write(data.encode('utf-8'))
+    shutil.move(tname, path)
+    return manifest
+
+
+def read_manifest(site):
+    """Read the manifest, if it exists and was written by this version of Nikola."""
+    try:
+        with io.open(manifest_path(site), 'r', encoding='utf-8') as inf:
+            manifest = json.load(inf)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('nikola') != __version__:
+        return None
+    return manifest
+
+
+def load_manifest(site):
+    """Load the manifest, if it exists and is still valid. Return None otherwise.
+
+    The manifest is stale if the configuration, or any file dependency
+    which is not itself generated by a task, changed after it was written.
+    Directories containing those dependencies (and the POSTS/PAGES folders)
+    are checked too, to notice new and deleted files.
+    """
+    manifest = read_manifest(site)
+    if manifest is None:
+        return None
+
+    targets = set()
+    sources = set()
+    for task in manifest['tasks'].values():
+        targets.update(task['targets'])
+        sources.update(task['file_dep'])
+    sources -= targets
+    watched = set(os.path.dirname(p) or '.' for p in sources)
+    watched.update(sources)
+    if site.configuration_filename:
+        watched.add(site.configuration_filename)
+    # Those may legitimately not exist
+    optional = set(os.path.dirname(p[0]) or '.' for p in site.config['post_pages']) - watched
+
+    generated = manifest['generated']
+    for path in watched | optional:
+        try:
+            if os.stat(path).st_mtime > generated:
+                return None
+        except OSError:
+            if path not in optional:
+                return None
+    return manifest
+
+
+def get_manifest(site):
+    """Return a valid manifest, generating all tasks to rebuild it if needed."""
+    manifest = load_manifest(site)
+    if manifest is None:
+        generated = time.time()
+        manifest = write_manifest(site, generate_site_tasks(site), generated)
+    return manifest
+
+
+def affected_tasks(manifest, paths):
+    """Return the names of the tasks to run after some files changed.
+
+    Those are the tasks depending on the files (directly, or through the
+    targets of other affected tasks), and the tasks they need to run
+    first.  Groups of tasks are not followed, their affected members are
+    selected anyway.  Returns None if the changes cannot be handled that
+    way: new or deleted files, files the manifest knows nothing about, or
+    post sources and metadata (which the timeline, and so the tasks using
+    it, depend on).
+    """
+    tasks = manifest['tasks']
+    dependents = manifest['dependents']
+    post_sources = set(manifest['post_sources'])
+    producers = {}
+    for name, task in tasks.items():
+        for target in task['targets']:
+            producers[target] = name
+
+    selected = set()
+    queue = []
+    for path in paths:
+        path = os.path.normpath(path)
+        if not os.path.exists(path) or path in post_sources:
+            return None
+        if path in producers:
+            selected.add(producers[path])
+            queue.append(path)
+        elif path in dependents:
+            queue.append(path)
+        else:
+            return None
+    while queue:
+        for name in dependents.get(queue.pop(), ()):
+            if name not in selected:
+                selected.add(name)
+                queue.extend(tasks[name]['targets'])
+
+    queue = list(selected)
+    while queue:
+        task = tasks[queue.pop()]
+        for name in task.get('task_dep', []) + task.get('calc_dep', []):
+            if name in tasks and name not in selected and not tasks[name].get('group'):
+                selected.add(name)
+                queue.append(name)
+    return selected
+
+
+def load_affected_tasks(site, paths):
+    """Generate only the tasks affected by changes to paths, as doit Task objects.
+
+    Only the plugins which generated those tasks in the last full task
+    generation are asked for tasks, and dependencies on other tasks are
+    dropped; their targets are assumed to be up to date.  Returns None if
+    that is not possible (no manifest, configuration changed, or see
+    ``affected_tasks``), in which case all tasks should be loaded.
+    """
+    manifest = read_manifest(site)
+    if manifest is None or manifest.get('config') != _config_digest(site):
+        return None
+    if site.configuration_filename and any(
+            os.path.normpath(p) == os.path.normpath(site.configuration_filename) for p in paths):
+        return None
+    names = affected_tasks(manifest, paths)
+    if names is None:
+        return None
+    plugins = set(manifest['tasks'][name].get('plugin') for name in names)
+    plugin_tasks = generate_site_tasks(site, plugins)
+    # Those plugins may now make different targets
+    update_manifest(site, manifest, [task for task in plugin_tasks if task.name in site.task_plugins], plugins)
+    tasks = [task for task in plugin_tasks if task.name in names]
+    for task in tasks:
+        task.task_dep = [name for name in task.task_dep if name in names]
+        task.setup_tasks = [name for name in task.setup_tasks if name in names]
+    return tasks
+
+
+def changed_files(revision):
+    """Return the files changed in the git working tree since a revision, or None on errors.
+
+    Paths are relative to the current directory; untracked files are
+    included.
+    """
+    try:
+        diff = subprocess.check_output(['git', 'diff', '--name-only', '--relative', revision, '--'])
+        untracked = subprocess.check_output(['git', 'ls-files', '--others', '--exclude-standard'])
+    except (OSError, subprocess.CalledProcessError) as exc:
+        utils.LOGGER.error('Cannot get the changes since {0} from git: {1}'.format(revision, exc))
+        return None
+    return [utils.sys_decode(line) for line in (diff + untracked).splitlines() if line.strip()]
@@ -28,6 +28,7 @@
 
 from __future__ import print_function, unicode_literals
 import io
+import hashlib
 from collections import defaultdict
 from copy import copy
 from pkg_resources import resource_filename
@@ -53,12 +54,15 @@ import logging
 import PyRSS2Gen as rss
 import lxml.etree
 import lxml.html
-from yapsy.PluginManager import PluginManager
 from blinker import signal
 
+from .plugin_manager import NikolaPluginManager
 from .post import Post  # NOQA
+from .startup_profile import PROFILER
+from .fragment_store import FragmentStore
+from .highlight import Highlighter
 from .state import Persistor
-from . import DEBUG, utils, shortcodes
+from . import DEBUG, filters, utils, shortcodes
 from .plugin_categories import (
     Command,
     LateTask,
@@ -366,6 +370,7 @@ class Nikola(object):
         self._template_system = None
         self._THEMES = None
         self._MESSAGES = None
+        self.asset_fingerprints = {}
         self.debug = DEBUG
         self.loghandlers = utils.STDERR_HANDLER  # TODO remove on v8
         self.colorful = config.pop('__colorful__', False)
@@ -376,7 +381,12 @@ class Nikola(object):
         self.configuration_filename = config.pop('__configuration_filename__', False)
         self.configured = bool(config)
         self.injected_deps = defaultdict(list)
+        # Name of the plugin that generated each task, by task name
+        self.task_plugins = {}
+        # Name of the task making each target, for all tasks of the site
+        self.task_targets = {}
         self.shortcode_registry = {}
+        self.post_per_input_file = {}
 
         self.rst_transforms = []
         self.template_hooks = {
@@ -417,6 +427,8 @@ class Nikola(object):
             'COMMENT_SYSTEM': 'disqus',
             'COMMENTS_IN_GALLERIES': False,
             'COMMENTS_IN_STORIES': False,
+            'COMPILE_CACHE_FOLDER': None,
+            'COMPILE_WORKERS': 1,
             'COMPILERS': {
                 "rest": ('.txt', '.rst'),
                 "markdown": ('.md', '.mdown', '.markdown'),
@@ -429,6 +441,7 @@ class Nikola(object):
             },
             'CONTENT_FOOTER': '',
             'CONTENT_FOOTER_FORMATS': {},
+            'COPY_FILES_MODE': 'copy',
             'COPY_SOURCES': True,
             'CREATE_MONTHLY_ARCHIVE': False,
             'CREATE_SINGLE_ARCHIVE': False,
@@ -438,6 +451,7 @@ class Nikola(object):
             'JS_DATE_FORMAT': 'YYYY-MM-DD HH:mm',
             'DATE_FANCINESS': 0,
             'DEFAULT_LANG': "en",
+            'DEPENDENCY_CHECKER': {},
             'DEPLOY_COMMANDS': {'default': []},
             'DISABLED_PLUGINS': [],
             'EXTRA_PLUGINS_DIRS': [],
@@ -451,6 +465,8 @@ class Nikola(object):
             'ADDITIONAL_METADATA': {},
             'FILES_FOLDERS': {'files': ''},
             'FILTERS': {},
+            'FILTER_CACHE_FOLDER': None,
+            'FINGERPRINT_BUNDLES': False,
             'FORCE_ISO8601': False,
             'FRONT_INDEX_HEADER': '',
             'GALLERY_FOLDERS': {'galleries': 'galleries'},
@@ -479,11 +495,16 @@ class Nikola(object):
             'LESS_OPTIONS': [],
             'LICENSE': '',
             'LINK_CHECK_WHITELIST': [],
+            'LINK_CHECK_PROCESSES': None,
+            'LINK_CHECK_REMOTE_CACHE_TTL': 86400,
+            'LINK_CHECK_REMOTE_THREADS': 16,
+            'LINK_CHECK_REMOTE_THREADS_PER_HOST': 2,
             'LISTINGS_FOLDERS': {'listings': 'listings'},
             'LOGO_URL': '',
             'NAVIGATION_LINKS': {},
             'MARKDOWN_EXTENSIONS': ['fenced_code', 'codehilite'],  # FIXME: Add 'extras' in v8
             'MAX_IMAGE_SIZE': 1280,
+            'MINIFY_HTML': False,
             'MATHJAX_CONFIG': '',
             'OLD_THEME_SUPPORT': True,
             'OUTPUT_FOLDER': 'output',
@@ -515,6 +536,7 @@ class Nikola(object):
             'SASS_COMPILER': 'sass',
             'SASS_OPTIONS': [],
             'SEARCH_FORM': '',
+            'SHORTCODE_CACHE': False,
             'SHOW_BLOG_TITLE': True,
             'SHOW_SOURCELINK': True,
             'SHOW_UNTRANSLATED_POSTS': True,
@@ -665,6 +687,13 @@ class Nikola(object):
         # propagate USE_SLUGIFY
         utils.USE_SLUGIFY = self.config['USE_SLUGIFY']
 
+        # Keep the output of filter commands
+        filters.CACHE_FOLDER = self.config['FILTER_CACHE_FOLDER']
+
+        if self.config['COPY_FILES_MODE'] not in utils.COPY_FILES_MODES:
+            utils.LOGGER.warn('COPY_FILES_MODE must be one of {0}, using "copy".'.format(', '.join(utils.COPY_FILES_MODES)))
+            self.config['COPY_FILES_MODE'] = 'copy'
+
         # Make sure we have pyphen installed if we are using it
         if self.config.get('HYPHENATE') and pyphen is None:
             utils.LOGGER.warn('To use the hyphenation, you have to install '
@@ -798,11 +827,12 @@ class Nikola(object):
         self.default_lang = self.config['DEFAULT_LANG']
         self.translations = self.config['TRANSLATIONS']
 
-        locale_fallback, locale_default, locales = sanitized_locales(
-            self.config.get('LOCALE_FALLBACK', None),
-            self.config.get('LOCALE_DEFAULT', None),
-            self.config.get('LOCALES', {}), self.translations)
-        utils.LocaleBorg.initialize(locales, self.default_lang)
+        with PROFILER.timed('phase', 'Nikola.__init__: locales'):
+            locale_fallback, locale_default, locales = sanitized_locales(
+                self.config.get('LOCALE_FALLBACK', None),
+                self.config.get('LOCALE_DEFAULT', None),
+                self.config.get('LOCALES', {}), self.translations)
+            utils.LocaleBorg.initialize(locales, self.default_lang)
 
         # BASE_URL defaults to SITE_URL
         if 'BASE_URL' not in self.config:
@@ -871,7 +901,8 @@ class Nikola(object):
             else:
                 self.bad_compilers.add(k)
 
-        self._set_global_context()
+        with PROFILER.timed('phase', 'Nikola.__init__: global context'):
+            self._set_global_context()
 
         # Set persistent state facility
         self.state = Persistor('state_data.json')
@@ -884,9 +915,37 @@ class Nikola(object):
             self.state._set_site(self)
             self.cache._set_site(self)
 
+        # Compiled fragments, optionally kept in a content-addressed store
+        if self.configured and self.config['COMPILE_CACHE_FOLDER']:
+            self.fragment_store = FragmentStore(self.config['COMPILE_CACHE_FOLDER'], self)
+        else:
+            self.fragment_store = None
+
+        # Output of pure shortcodes, optionally kept between builds
+        if self.configured and self.config['SHORTCODE_CACHE']:
+            self.shortcode_cache = shortcodes.ShortcodeCache(os.path.join(self.config['CACHE_FOLDER'], 'shortcodes'))
+        else:
+            self.shortcode_cache = shortcodes.ShortcodeCache()
+
+        # Highlighted listings and code blocks, kept between builds
+        if self.configured:
+            self.highlighter = Highlighter(os.path.join(self.config['CACHE_FOLDER'], 'pygments'))
+        else:
+            self.highlighter = Highlighter()
+
     def init_plugins(self, commands_only=False, load_all=False):
-        """Load plugins as needed."""
-        self.plugin_manager = PluginManager(categories_filter={
+        """Load plugins as needed.
+
+        Plugins are imported and activated when first needed: signal
+        handlers and configuration plugins right away, commands one by one,
+        compilers (with their extensions and shortcodes) when a compiler is
+        needed, and everything else needed to build the site when tasks,
+        post scanners or path handlers are needed.
+        """
+        index_path = None
+        if self.configured:
+            index_path = os.path.join(self.config['CACHE_FOLDER'], 'plugin_index.json')
+        self.plugin_manager = NikolaPluginManager(categories_filter={
             "Command": Command,
             "Task": Task,
             "LateTask": LateTask,
@@ -900,7 +959,7 @@ class Nikola(object):
             "SignalHandler": SignalHandler,
             "ConfigPlugin": ConfigPlugin,
             "PostScanner": PostScanner,
-        })
+        }, index_path=index_path)
         self.plugin_manager.getPluginLocator().setPluginInfoExtension('plugin')
         extra_plugins_dirs = self.config['EXTRA_PLUGINS_DIRS']
         if sys.version_info[0] == 3:
@@ -917,7 +976,8 @@ class Nikola(object):
             ] + [utils.sys_encode(path) for path in extra_plugins_dirs if path]
 
         self.plugin_manager.getPluginLocator().setPluginPlaces(self._plugin_places)
-        self.plugin_manager.locatePlugins()
+        with PROFILER.timed('phase', 'init_plugins: locate plugins'):
+            self.plugin_manager.locatePlugins()
         bad_candidates = set([])
         if not load_all:
             for p in self.plugin_manager._candidates:
@@ -969,47 +1029,83 @@ class Nikola(object):
                     plugins[-1][2].name, plugins[-1][0]))
             self.plugin_manager._candidates.append(plugins[-1])
 
-        self.plugin_manager.loadPlugins()
+        with PROFILER.timed('phase', 'init_plugins: load plugins'):
+            self.plugin_manager.loadPlugins()
+
+        self._commands = {}
+        self._compilers = None
+        self.inverse_compilers = {}
+        self._site_plugins_activated = False
+        hooks = {"Command": self._activate_command}
+        for category in ("PostScanner", "Task", "LateTask", "TaskMultiplier"):
+            hooks[category] = self._activate_site_plugins
+        for category in ("CompilerExtension", "PageCompiler", "ShortcodePlugin"):
+            hooks[category] = self._activate_compilers
+        self.plugin_manager.activation_hooks = hooks
 
         self._activate_plugins_of_category("SignalHandler")
 
         # Emit signal for SignalHandlers which need to start running immediately.
         signal('sighandlers_loaded').send(self)
 
-        self._commands = {}
+        if self.plugin_manager.getPluginsOfCategory("ConfigPlugin") or signal('configured').has_receivers_for(self):
+            # Config plugins and handlers of the configured signal may
+            # change or need anything, so they get everything, as before.
+            self.plugin_manager.getPluginsOfCategory("Command")
+            self._activate_site_plugins()
+        self._activate_plugins_of_category("ConfigPlugin")
+        signal('configured').send(self)
 
-        command_plugins = self._activate_plugins_of_category("Command")
-        for plugin_info in command_plugins:
-            plugin_info.plugin_object.short_help = plugin_info.description
-            self._commands[plugin_info.name] = plugin_info.plugin_object
+    def _activate_command(self, plugin_info):
+        """Activate a command plugin."""
+        plugin_info.plugin_object.short_help = plugin_info.description
+        self.plugin_manager.activatePluginByName(plugin_info.name, "Command")
+        with PROFILER.timed('set_site', plugin_info.name):
+            plugin_info.plugin_object.set_site(self)
+        self._commands[plugin_info.name] = plugin_info.plugin_object
 
+    def _activate_site_plugins(self, plugin_info=None):
+        """Activate the plugins needed to build the site, once."""
+        if self._site_plugins_activated:
+            return
+        self._site_plugins_activated = True
         self._activate_plugins_of_category("PostScanner")
         self._activate_plugins_of_category("Task")
         self._activate_plugins_of_category("LateTask")
         self._activate_plugins_of_category("TaskMultiplier")
+        self._activate_compilers()
+
+    def _activate_compilers(self, plugin_info=None):
+        """Activate the compiler plugins, their extensions and shortcodes, once."""
+        if self._compilers is not None:
+            return
+        self._compilers = {}
 
         # Activate all required compiler plugins
         self.compiler_extensions = self._activate_plugins_of_category("CompilerExtension")
         for plugin_info in self.plugin_manager.getPluginsOfCategory("PageCompiler"):
             if plugin_info.name in self.config["COMPILERS"].keys():
-                self.plugin_manager.activatePluginByName(plugin_info.name)
-                plugin_info.plugin_object.set_site(self)
+                self.plugin_manager.activatePluginByName(plugin_info.name, "PageCompiler")
+                with PROFILER.timed('set_site', plugin_info.name):
+                    plugin_info.plugin_object.set_site(self)
 
         # Activate shortcode plugins
         self._activate_plugins_of_category("ShortcodePlugin")
 
         # Load compiler plugins
-        self.compilers = {}
-        self.inverse_compilers = {}
-
         for plugin_info in self.plugin_manager.getPluginsOfCategory(
                 "PageCompiler"):
-            self.compilers[plugin_info.name] = \
+            self._compilers[plugin_info.name] = \
                 plugin_info.plugin_object
 
-        self._activate_plugins_of_category("ConfigPlugin")
-        self._register_templated_shortcodes()
-        signal('configured').send(self)
+        with PROFILER.timed('phase', 'templated shortcodes'):
+            self._register_templated_shortcodes()
+
+    def _get_compilers(self):
+        self._activate_compilers()
+        return self._compilers
+
+    compilers = property(_get_compilers)
 
     def _set_global_context(self):
         """Create global context from configuration."""
@@ -1031,7 +1127,9 @@ class Nikola(object):
         self._GLOBAL_CONTEXT['index_file'] = self.config['INDEX_FILE']
         self._GLOBAL_CONTEXT['use_base_tag'] = self.config['USE_BASE_TAG']
         self._GLOBAL_CONTEXT['use_bundles'] = self.config['USE_BUNDLES']
+        self._GLOBAL_CONTEXT['asset_fingerprints'] = self.asset_fingerprints
         self._GLOBAL_CONTEXT['use_cdn'] = self.config.get("USE_CDN")
+        self._GLOBAL_CONTEXT['minify_html'] = self.config['MINIFY_HTML']
         self._GLOBAL_CONTEXT['theme_color'] = self.config.get("THEME_COLOR")
         self._GLOBAL_CONTEXT['favicons'] = self.config['FAVICONS']
         self._GLOBAL_CONTEXT['date_format'] = self.config.get('DATE_FORMAT')
@@ -1108,15 +1206,17 @@ class Nikola(object):
         # this code duplicated in tests/base.py
         plugins = []
         for plugin_info in self.plugin_manager.getPluginsOfCategory(category):
-            self.plugin_manager.activatePluginByName(plugin_info.name)
-            plugin_info.plugin_object.set_site(self)
+            self.plugin_manager.activatePluginByName(plugin_info.name, category)
+            with PROFILER.timed('set_site', plugin_info.name):
+                plugin_info.plugin_object.set_site(self)
             plugins.append(plugin_info)
         return plugins
 
     def _get_themes(self):
         if self._THEMES is None:
             try:
-                self._THEMES = utils.get_theme_chain(self.config['THEME'])
+                with PROFILER.timed('phase', 'theme chain'):
+                    self._THEMES = utils.get_theme_chain(self.config['THEME'])
             except Exception:
                 if self.config['THEME'] != 'bootstrap3':
                     utils.LOGGER.warn('''Cannot load theme "{0}", using 'bootstrap3' instead.'''.format(self.config['THEME']))
@@ -1137,9 +1237,10 @@ class Nikola(object):
     def _get_messages(self):
         try:
             if self._MESSAGES is None:
-                self._MESSAGES = utils.load_messages(self.THEMES,
-                                                     self.translations,
-                                                     self.default_lang)
+                with PROFILER.timed('phase', 'load messages'):
+                    self._MESSAGES = utils.load_messages(self.THEMES,
+                                                         self.translations,
+                                                         self.default_lang)
             return self._MESSAGES
         except utils.LanguageNotFoundError as e:
             utils.LOGGER.error('''Cannot load language "{0}".  Please make sure it is supported by Nikola itself, or that you have the appropriate messages files in your themes.'''.format(e.lang))
@@ -1182,7 +1283,8 @@ class Nikola(object):
                                            for name in self.THEMES]
             self._template_system.set_directories(lookup_dirs,
                                                   self.config['CACHE_FOLDER'])
-            self._template_system.set_site(self)
+            with PROFILER.timed('set_site', pi.name):
+                self._template_system.set_site(self)
         return self._template_system
 
     template_system = property(_get_template_system)
@@ -1268,14 +1370,18 @@ class Nikola(object):
         parser = lxml.html.HTMLParser(remove_blank_text=True)
         doc = lxml.html.document_fromstring(data, parser)
         self.rewrite_links(doc, src, context['lang'])
-        data = b'<!DOCTYPE html>\n' + lxml.html.tostring(doc, encoding='utf8', method='html', pretty_print=True)
+        if self.config['MINIFY_HTML']:
+            data = b'<!DOCTYPE html>\n' + filters.minify_html_document(doc).encode('utf8')
+        else:
+            data = b'<!DOCTYPE html>\n' + lxml.html.tostring(doc, encoding='utf8', method='html', pretty_print=True)
         with open(output_name, "wb+") as post_file:
             post_file.write(data)
 
     def rewrite_links(self, doc, src, lang):
         """Replace links in document to point to the right places."""
-        # First let lxml replace most of them
-        doc.rewrite_links(lambda dst: self.url_replacer(src, dst, lang), resolve_base_href=False)
+        # First let lxml replace most of them, pointing fingerprinted
+        # bundles to their current names
+        doc.rewrite_links(lambda dst: self.url_replacer(src, self.asset_fingerprints.get(dst, dst), lang), resolve_base_href=False)
 
         # lxml ignores srcset in img and source elements, so do that by hand
         objs = list(doc.xpath('(*//img|*//source)'))
@@ -1400,7 +1506,7 @@ class Nikola(object):
 
         return result
 
-    def _make_renderfunc(self, t_data):
+    def _make_renderfunc(self, t_data, pure=False):
         """Return a function that can be registered as a template shortcode.
 
         The returned function has access to the passed template data and
@@ -1409,10 +1515,15 @@ class Nikola(object):
         keyword argument dict and then the latter provides the template
         context.
 
+        If ``pure`` is True, the template is known to only depend on its
+        arguments, so its output can be reused (see ``shortcode_version``).
         """
         def render_shortcode(*args, **kw):
             kw['_args'] = args
             return self.template_system.render_template_to_string(t_data, kw)
+        if pure:
+            render_shortcode.nikola_shortcode_pure = '{0}:{1}'.format(
+                self.template_system.name, hashlib.sha1(t_data.encode('utf-8')).hexdigest()[:16])
         return render_shortcode
 
     def _register_templated_shortcodes(self):
@@ -1432,7 +1543,9 @@ class Nikola(object):
                     continue
 
                 with open(os.path.join(sc_dir, fname)) as fd:
-                    self.register_shortcode(name, self._make_renderfunc(fd.read()))
+                    # Nikola's own templates only use their arguments; the
+                    # site's may use anything (like the timeline)
+                    self.register_shortcode(name, self._make_renderfunc(fd.read(), pure=sc_dir == builtin_sc_dir))
 
     def register_shortcode(self, name, f):
         """Register function f to handle shortcode "name"."""
@@ -1443,9 +1556,19 @@ class Nikola(object):
 
     def apply_shortcodes(self, data, filename=None, lang=None):
         """Apply shortcodes from the registry on data."""
+        # Any plugin may register shortcodes
+        self._activate_site_plugins()
         if lang is None:
             lang = utils.LocaleBorg().current_lang
-        return shortcodes.apply_shortcodes(data, self.shortcode_registry, self, filename, lang=lang)
+        pure_used = set()
+        output = shortcodes.apply_shortcodes(data, self.shortcode_registry, self, filename, lang=lang,
+                                             cache=self.shortcode_cache, pure_used=pure_used)
+        # Rebuild the post if the implementation of a cached shortcode changes
+        post = self.post_per_input_file.get(filename) if filename and pure_used else None
+        if post:
+            for name in sorted(pure_used):
+                post.register_depfile('####MAGIC####SHORTCODE:' + name, lang=lang)
+        return output
 
     def generic_rss_renderer(self, lang, title, link, description, timeline, output_path,
                              rss_teasers, rss_plain, feed_length=10, feed_url=None,
@@ -1568,6 +1691,9 @@ class Nikola(object):
         if lang is None:
             lang = utils.LocaleBorg().current_lang
 
+        if kind not in self.path_handlers:
+            # Most path handlers are registered by task plugins
+            self._activate_site_plugins()
         try:
             path = self.path_handlers[kind](name, lang)
             path = [os.path.normpath(p) for p in path if p != '.']  # Fix Issue #1028
@@ -1708,8 +1834,12 @@ class Nikola(object):
             task['targets'] = [os.path.normpath(t) for t in targets]
         return task
 
-    def gen_tasks(self, name, plugin_category, doc=''):
-        """Generate tasks."""
+    def gen_tasks(self, name, plugin_category, doc='', plugins=None):
+        """Generate tasks.
+
+        If ``plugins`` is given, only the plugins with those names are asked
+        for their tasks.
+        """
         def flatten(task):
             """Flatten lists of tasks."""
             if isinstance(task, dict):
@@ -1719,20 +1849,35 @@ class Nikola(object):
                     for ft in flatten(t):
                         yield ft
 
+        def task_name(task):
+            """Return the full doit name of a task."""
+            if 'name' in task:
+                return '{0}:{1}'.format(task['basename'], task['name'])
+            return task['basename']
+
         task_dep = []
         for pluginInfo in self.plugin_manager.getPluginsOfCategory(plugin_category):
+            if plugins is not None and pluginInfo.name not in plugins:
+                continue
             for task in flatten(pluginInfo.plugin_object.gen_tasks()):
                 assert 'basename' in task
                 task = self.clean_task_paths(task)
                 if 'task_dep' not in task:
                     task['task_dep'] = []
                 task['task_dep'].extend(self.injected_deps[task['basename']])
+                self.task_plugins[task_name(task)] = pluginInfo.name
+                for target in task.get('targets', []):
+                    self.task_targets[target] = task_name(task)
                 yield task
                 for multi in self.plugin_manager.getPluginsOfCategory("TaskMultiplier"):
                     flag = False
                     for task in multi.plugin_object.process(task, name):
                         flag = True
-                        yield self.clean_task_paths(task)
+                        task = self.clean_task_paths(task)
+                        self.task_plugins[task_name(task)] = pluginInfo.name
+                        for target in task.get('targets', []):
+                            self.task_targets[target] = task_name(task)
+                        yield task
                     if flag:
                         task_dep.append('{0}_{1}'.format(name, multi.plugin_object.name))
             if pluginInfo.plugin_object.is_default:
@@ -220,6 +220,10 @@ class TemplateSystem(BasePlugin):
         """Get the path to a template or return None."""
         raise NotImplementedError()
 
+    def reset_caches(self):
+        """Forget cached templates and dependencies, after templates changed on disk."""
+        pass
+
 
 class TaskMultiplier(BasePlugin):
     """Take a task and return *more* tasks."""
@@ -249,6 +253,9 @@ class PageCompiler(BasePlugin):
         'type': 'text',
     }
     config_dependencies = []
+    # Version of the library doing the compiling; compiled fragments kept
+    # in COMPILE_CACHE_FOLDER are not reused once it changes.
+    library_version = ''
 
     def _read_extra_deps(self, post):
         """Read contents of .dep file and return them as a list."""
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""A yapsy plugin manager with a persistent plugin index and lazy loading."""
+
+from __future__ import unicode_literals
+import io
+import os
+import sys
+import time
+
+from yapsy.PluginInfo import PluginInfo
+from yapsy.PluginManager import PluginManager
+from yapsy.compat import ConfigParser
+
+from . import __version__, utils
+from .startup_profile import PROFILER
+from .state import Persistor
+
+__all__ = ['NikolaPluginManager']
+
+
+class NikolaPluginManager(PluginManager):
+    """Plugin manager which remembers its plugins, and imports them when needed.
+
+    Locating plugins means walking all the plugin places and parsing every
+    ``.plugin`` file.  If ``index_path`` is set, the result is stored there,
+    along with the categories each plugin turned out to belong to, and reused
+    as long as the plugin folders and ``.plugin`` files keep their mtimes.
+
+    Plugins whose categories are known from the index are not imported by
+    ``loadPlugins``, but when their category, or they by name, are first
+    requested.  ``activation_hooks`` maps categories to functions, which are
+    called once with each plugin of that category before it is handed out.
+    """
+
+    def __init__(self, categories_filter, index_path=None):
+        """Create a plugin manager, with an optional index file."""
+        super(NikolaPluginManager, self).__init__(categories_filter=categories_filter)
+        self.activation_hooks = {}
+        self._index = Persistor(index_path) if index_path else None
+        self._entries = {}
+        self._pending = []
+        self._activated = set()
+        self._index_stale = False
+
+    def locatePlugins(self):
+        """Locate plugins, using the index if it is still valid."""
+        entries = self._read_index()
+        if entries is None:
+            super(NikolaPluginManager, self).locatePlugins()
+            self._entries = {}
+            for infofile, filepath, plugin_info in self._candidates:
+                with io.open(infofile, 'r', encoding='utf-8') as inf:
+                    info = inf.read()
+                self._entries[infofile] = {
+                    'name': plugin_info.name,
+                    'path': plugin_info.path,
+                    'filepath': filepath,
+                    'info': info,
+                    'categories': [],
+                }
+            self._index_stale = True
+        else:
+            self._entries = entries
+            self._candidates = [self._candidate_from_entry(infofile, entry) for infofile, entry in sorted(entries.items())]
+
+    def loadPlugins(self, callback=None, callback_after=None):
+        """Load plugins of unknown category now, and the rest when they are requested."""
+        if not hasattr(self, '_candidates'):
+            raise ValueError("locatePlugins must be called before loadPlugins")
+        seen = set(candidate[0] for candidate, categories in self._pending)
+        for files in self._category_file_mapping.values():
+            seen.update(files)
+        eager = []
+        for candidate in self._candidates:
+            if candidate[0] in seen:
+                continue
+            categories = self._entries.get(candidate[0], {}).get('categories')
+            if categories:
+                self._pending.append((candidate, categories))
+            else:
+                eager.append(candidate)
+        return self._load(eager, callback, callback_after)
+
+    def getPluginsOfCategory(self, category_name):
+        """Return the plugins of a category, loading and activating them if needed."""
+        self._load_pending(lambda plugin_info, categories: category_name in categories)
+        plugins = super(NikolaPluginManager, self).getPluginsOfCategory(category_name)
+        for plugin_info in plugins:
+            self._run_hook(category_name, plugin_info)
+        return plugins
+
+    def getPluginByName(self, name, category="Default"):
+        """Return a plugin by name, loading and activating it if needed."""
+        self._load_pending(lambda plugin_info, categories: plugin_info.name == name and category in categories)
+        plugin_info = super(NikolaPluginManager, self).getPluginByName(name, category)
+        if plugin_info is not None:
+            self._run_hook(category, plugin_info)
+        return plugin_info
+
+    def getAllPlugins(self):
+        """Return all plugins, loading them if needed (but not activating them)."""
+        self._load_pending(lambda plugin_info, categories: True)
+        return super(NikolaPluginManager, self).getAllPlugins()
+
+    def _load_pending(self, wanted):
+        """Load the pending plugins for which wanted(plugin_info, categories) is true."""
+        load = []
+        pending = []
+        for candidate, categories in self._pending:
+            if wanted(candidate[2], categories):
+                load.append(candidate)
+            else:
+                pending.append((candidate, categories))
+        if load:
+            self._pending = pending
+            self._load(load)
+
+    def _load(self, candidates, callback=None, callback_after=None):
+        """Import candidates and remember their categories."""
+        self._candidates = candidates
+        if PROFILER.enabled:
+            callback, callback_after = self._profiled(callback, callback_after)
+        loaded = super(NikolaPluginManager, self).loadPlugins(callback, callback_after)
+        changed = self._index_stale
+        for infofile, filepath, plugin_info in candidates:
+            entry = self._entries.get(infofile)
+            if entry is not None and plugin_info.categories and entry['categories'] != plugin_info.categories:
+                entry['categories'] = list(plugin_info.categories)
+                changed = True
+        if changed:
+            self._write_index()
+            self._index_stale = False
+        return loaded
+
+    def _profiled(self, callback, callback_after):
+        """Wrap load callbacks to record how long importing each plugin takes."""
+        started = {}
+
+        def before(plugin_info):
+            started[plugin_info.name] = time.time()
+            if callback is not None:
+                callback(plugin_info)
+
+        def after(plugin_info):
+            if plugin_info.name in started:
+                PROFILER.record('import', plugin_info.name, time.time() - started.pop(plugin_info.name))
+            if callback_after is not None:
+                callback_after(plugin_info)
+
+        return before, after
+
+    def _run_hook(self, category, plugin_info):
+        """Call the activation hook of a category for a plugin, once."""
+        key = (category, plugin_info.name)
+        if key in self._activated or category not in self.activation_hooks:
+            return
+        self._activated.add(key)
+        self.activation_hooks[category](plugin_info)
+
+    def _places(self):
+        """Return the absolute paths of the plugin places."""
+        return [os.path.abspath(place) for place in self.getPluginLocator().plugins_places]
+
+    def _mtimes(self):
+        """Return the mtimes of the plugin places, their folders and .plugin files."""
+        mtimes = {}
+        for place in self._places():
+            mtimes[place] = None
+            for root, dirs, files in os.walk(place, followlinks=True):
+                dirs[:] = [d for d in dirs if d != '__pycache__' and not d.startswith('.')]
+                mtimes[root] = os.stat(root).st_mtime
+        for infofile in self._entries:
+            mtimes[infofile] = os.stat(infofile).st_mtime
+        return mtimes
+
+    def _read_index(self):
+        """Return the index entries, or None if there is no valid index."""
+        if self._index is None:
+            return None
+        try:
+            index = self._index.get('plugins')
+        except ValueError:
+            return None
+        if not index or index['nikola'] != __version__ or index['places'] != self._places():
+            return None
+        for path, mtime in index['mtimes'].items():
+            try:
+                current = os.stat(path).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                return None
+        return index['entries']
+
+    def _write_index(self):
+        """Store the located plugins and their known categories in the index."""
+        if self._index is None:
+            return
+        utils.makedirs(os.path.dirname(self._index._path))
+        self._index.set('plugins', {
+            'nikola': __version__,
+            'places': self._places(),
+            'mtimes': self._mtimes(),
+            'entries': self._entries,
+        })
+
+    def _candidate_from_entry(self, infofile, entry):
+        """Rebuild a located plugin candidate from an index entry."""
+        details = ConfigParser()
+        if sys.version_info[0] == 2:
+            details.readfp(io.StringIO(entry['info']))
+        else:
+            details.read_string(entry['info'])
+        plugin_info = PluginInfo(entry['name'], entry['path'])
+        plugin_info.details = details
+        return (infofile, entry['filepath'], plugin_info)
@@ -32,8 +32,8 @@ import json
 import mimetypes
 import os
 import re
-import subprocess
 import sys
+import threading
 import time
 try:
     from urlparse import urlparse
@@ -46,6 +46,8 @@ import wsgiref.util
 import pkg_resources
 
 from blinker import signal
+from doit.doit_cmd import DoitMain
+import logbook
 try:
     from ws4py.websocket import WebSocket
     from ws4py.server.wsgirefserver import WSGIServer, WebSocketWSGIRequestHandler, WebSocketWSGIHandler
@@ -78,6 +80,28 @@ ERROR {}
 '''
 
 
+class TeeStream(object):
+    """A stream that writes to another one and keeps a copy of the output."""
+
+    def __init__(self, stream):
+        """Initialize the stream."""
+        self.stream = stream
+        self.chunks = []
+
+    def write(self, data):
+        """Write data to the stream and remember it."""
+        self.chunks.append(data)
+        return self.stream.write(data)
+
+    def getvalue(self):
+        """Return everything written so far."""
+        return ''.join(c.decode('utf-8', 'replace') if isinstance(c, bytes) else c for c in self.chunks)
+
+    def __getattr__(self, name):
+        """Delegate everything else to the real stream."""
+        return getattr(self.stream, name)
+
+
 class CommandAuto(Command):
     """Automatic rebuilds for Nikola."""
 
@@ -86,6 +110,10 @@ class CommandAuto(Command):
     has_server = True
     doc_purpose = "builds and serves a site; automatically detects site changes, rebuilds, and optionally refreshes a browser"
     dns_sd = None
+    server = None
+    # Seconds without file system events to wait for before rebuilding, so
+    # that a burst of saves results in a single rebuild.
+    rebuild_delay = 0.2
 
     cmd_options = [
         {
@@ -141,12 +169,14 @@ class CommandAuto(Command):
         elif watchdog is None:
             req_missing(['watchdog'], 'use the "auto" command')
 
-        self.cmd_arguments = ['nikola', 'build']
-        if self.site.configuration_filename != 'conf.py':
-            self.cmd_arguments.append('--conf=' + self.site.configuration_filename)
+        # Rebuilds happen in this process, using the site object that is
+        # already set up, in a thread that batches file system events.
+        self._changed = set()
+        self._last_event = 0
+        self._wakeup = threading.Condition()
 
         # Run an initial build so we are up-to-date
-        subprocess.call(self.cmd_arguments)
+        self.build()
 
         port = options and options.get('port')
         self.snippet = '''<script>document.write('<script src="http://'
@@ -172,6 +202,14 @@ class CommandAuto(Command):
         # Nikola itself (useful for developers)
         watched.add(pkg_resources.resource_filename('nikola', ''))
 
+        # Changes to code need a fresh process, everything else is rebuilt
+        # in-process.
+        self._conf_fn = os.path.abspath(self.site.configuration_filename or 'conf.py')
+        self._restart_places = [os.path.abspath(p) for p in self.site._plugin_places]
+        self._restart_places.append(os.path.abspath(pkg_resources.resource_filename('nikola', '')))
+        self._template_places = [os.path.abspath(p) for p in watched
+                                 if p == 'templates/' or p in [get_theme_path(name) for name in self.site.THEMES]]
+
         out_folder = self.site.config['OUTPUT_FOLDER']
         if options and options.get('browser'):
             browser = True
@@ -200,9 +238,12 @@ class CommandAuto(Command):
                 observer.schedule(OurWatchHandler(self.do_rebuild), p, recursive=True)
 
         # Watch config file (a bit of a hack, but we need a directory)
-        _conf_fn = os.path.abspath(self.site.configuration_filename or 'conf.py')
-        _conf_dn = os.path.dirname(_conf_fn)
-        observer.schedule(ConfigWatchHandler(_conf_fn, self.do_rebuild), _conf_dn, recursive=False)
+        _conf_dn = os.path.dirname(self._conf_fn)
+        observer.schedule(ConfigWatchHandler(self._conf_fn, self.do_rebuild), _conf_dn, recursive=False)
+
+        rebuilder = threading.Thread(target=self.rebuild_loop)
+        rebuilder.daemon = True
+        rebuilder.start()
 
         try:
             self.logger.info("Watching files for changes...")
@@ -227,6 +268,7 @@ class CommandAuto(Command):
                 app=Mixed(handler_cls=LRSocket)
             )
             ws.initialize_websockets_manager()
+            self.server = ws
             self.logger.info("Serving HTTP on {0} port {1}...".format(host, port))
             if browser:
                 if options['ipv6'] or '::' in host:
@@ -262,7 +304,7 @@ class CommandAuto(Command):
                 os.kill(os.getpid(), 15)
 
     def do_rebuild(self, event):
-        """Rebuild the site."""
+        """Queue a rebuild of the site."""
         # Move events have a dest_path, some editors like gedit use a
         # move on larger save operations for write protection
         event_path = event.dest_path if hasattr(event, 'dest_path') else event.src_path
@@ -273,15 +315,122 @@ class CommandAuto(Command):
                 event_path.endswith(('.pyc', '.pyo', '.pyd')) or
                 os.path.isdir(event_path)):  # Skip on folders, these are usually duplicates
             return
-        self.logger.info('REBUILDING SITE (from {0})'.format(event_path))
-        p = subprocess.Popen(self.cmd_arguments, stderr=subprocess.PIPE)
-        error = p.stderr.read()
-        errord = error.decode('utf-8')
-        if p.wait() != 0:
-            self.logger.error(errord)
-            error_signal.send(error=errord)
+        with self._wakeup:
+            self._changed.add(os.path.abspath(event_path))
+            self._last_event = time.time()
+            self._wakeup.notify()
+
+    def rebuild_loop(self):
+        """Wait for changes and rebuild the site, one batch of changes at a time."""
+        while True:
+            with self._wakeup:
+                while not self._changed:
+                    self._wakeup.wait()
+                # Wait until things are quiet for a moment
+                while True:
+                    delay = self._last_event + self.rebuild_delay - time.time()
+                    if delay <= 0:
+                        break
+                    self._wakeup.wait(delay)
+                changed = self._changed
+                self._changed = set()
+            # Changes made while building are collected for the next batch
+            self.rebuild(changed)
+
+    def needs_restart(self, path):
+        """Check if a change to path needs a new process (config, plugins, Nikola itself)."""
+        if path == self._conf_fn:
+            return True
+        if path.endswith('.py') or path.endswith('.plugin'):
+            return any(path.startswith(place + os.sep) for place in self._restart_places)
+        # Theme messages are loaded when the site is created
+        return any(path.startswith(place + os.sep) and os.sep + 'messages' + os.sep in path[len(place):]
+                   for place in self._template_places)
+
+    def rebuild(self, changed):
+        """Rebuild the site after the given files changed."""
+        changed = sorted(changed)
+        for path in changed:
+            if self.needs_restart(path):
+                self.restart(path)
+                return
+        if len(changed) > 3:
+            self.logger.info('REBUILDING SITE (from {0} and {1} more)'.format(', '.join(changed[:3]), len(changed) - 3))
         else:
-            print(errord)
+            self.logger.info('REBUILDING SITE (from {0})'.format(', '.join(changed)))
+        if any(path.startswith(place + os.sep) for path in changed for place in self._template_places):
+            self.site.template_system.reset_caches()
+        self.build(changed)
+
+    def build(self, changed=None):
+        """Build the site in this process, re-using the site object.
+
+        Posts are rescanned (unchanged posts are not re-read).  If the
+        changed files are given, and no post or page changed, only the
+        tasks affected by them are generated and run, as ``nikola build
+        --affected-by`` would, unless that is not possible (new or deleted
+        files, for example).  Otherwise all tasks are generated again and
+        doit runs them as ``nikola build`` would, as many pages depend on
+        the metadata of posts.  Returns True on success.
+        """
+        start = time.time()
+        # Keep the build output and log messages, to show them in the
+        # browser if the build fails
+        output = TeeStream(sys.stderr)
+        messages = logbook.TestHandler(level='WARNING', bubble=True)
+        loader = self.site.doit.task_loader
+        loader.outstream = output
+        try:
+            with messages.threadbound():
+                timeline = list(self.site.timeline)
+                self.site.scan_posts(really=True)
+                args = ['build']
+                if changed and not self.posts_changed(timeline, changed):
+                    cwd = os.getcwd()
+                    paths = [os.path.relpath(p, cwd) if p.startswith(cwd + os.sep) else p for p in changed]
+                    # The option is a comma-separated list
+                    if not any(',' in p for p in paths):
+                        args += ['--affected-by', ','.join(paths)]
+                # Skip DoitNikola.run, which would initialize plugins again
+                result = DoitMain.run(self.site.doit, args)
+        except (Exception, SystemExit) as exc:
+            self.logger.error('{0}: {1}'.format(exc.__class__.__name__, exc))
+            messages.formatted_records.append('{0}: {1}'.format(exc.__class__.__name__, exc))
+            result = 3
+        finally:
+            loader.outstream = None
+        if result:
+            self.logger.error('Build failed.')
+            error = '\n'.join(messages.formatted_records + [output.getvalue()]).strip()
+            error_signal.send(error=error or 'Build failed.')
+            return False
+        self.logger.info('Build done in {0:.2f}s.'.format(time.time() - start))
+        return True
+
+    def posts_changed(self, timeline, changed):
+        """Check if posts changed: a changed path is the source or metadata of one, or the timeline is different."""
+        if len(timeline) != len(self.site.timeline) or any(a is not b for a, b in zip(timeline, self.site.timeline)):
+            return True
+        sources = set()
+        for post in timeline:
+            sources.add(os.path.abspath(post.source_path))
+            sources.add(os.path.abspath(post.metadata_path))
+        return any(path in sources for path in changed)
+
+    def restart(self, reason):
+        """Replace this process with a fresh ``nikola auto``, to reload config and code."""
+        self.logger.info('RESTARTING (from {0})'.format(reason))
+        if self.server is not None:
+            self.server.server_close()
+        if self.dns_sd:
+            self.dns_sd.Reset()
+        if self.site.original_cwd:
+            os.chdir(self.site.original_cwd)
+        # sys.argv[0] may be a console script wrapper, not Python code
+        args = [sys.executable, '-m', 'nikola'] + sys.argv[1:]
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, args)
 
     def do_refresh(self, event):
         """Refresh the page."""
@@ -28,9 +28,13 @@
 
 from __future__ import print_function
 from collections import defaultdict
+from multiprocessing import cpu_count, Pool
+from multiprocessing.pool import ThreadPool
+import hashlib
 import os
 import re
 import sys
+import threading
 import time
 import logbook
 try:
@@ -39,12 +43,13 @@ try:
 except ImportError:
     from urllib.parse import unquote, urlparse, urljoin, urldefrag  # NOQA
 
-from doit.loader import generate_tasks
 import lxml.html
 import requests
 
+from nikola.manifest import get_manifest
 from nikola.plugin_categories import Command
-from nikola.utils import get_logger, STDERR_HANDLER
+from nikola.state import Persistor
+from nikola.utils import get_logger, makedirs, STDERR_HANDLER
 
 
 def _call_nikola_list(site, cache=None):
@@ -53,14 +58,11 @@ def _call_nikola_list(site, cache=None):
             return cache['files'], cache['deps']
     files = []
     deps = defaultdict(list)
-    for task in generate_tasks('render_site', site.gen_tasks('render_site', "Task", '')):
-        files.extend(task.targets)
-        for target in task.targets:
-            deps[target].extend(task.file_dep)
-    for task in generate_tasks('post_render', site.gen_tasks('render_site', "LateTask", '')):
-        files.extend(task.targets)
-        for target in task.targets:
-            deps[target].extend(task.file_dep)
+    # The build manifest is only regenerated if missing or stale
+    for task in get_manifest(site)['tasks'].values():
+        files.extend(task['targets'])
+        for target in task['targets']:
+            deps[target].extend(task['file_dep'])
     if cache is not None:
         cache['files'] = files
         cache['deps'] = deps
@@ -90,6 +92,68 @@ def real_scan_files(site, cache=None):
     return (only_on_output, only_on_input)
 
 
+def is_link_source(fname):
+    """Tell if links in this file can be checked."""
+    return fname.endswith('.html') or fname.endswith('.atom') or \
+        fname.endswith('sitemap.xml') or fname.endswith('sitemapindex.xml')
+
+
+def extract_links(fname, data=None):
+    """Extract the links from a HTML, Atom or sitemap file.
+
+    Returns a list of link targets, or None if the file type is not supported.
+    """
+    if data is None:
+        with open(fname, 'rb') as inf:
+            data = inf.read()
+    if '.html' == fname[-5:]:
+        d = lxml.html.fromstring(data)
+        extra_objs = lxml.html.fromstring('<html/>')
+
+        # Turn elements with a srcset attribute into individual img elements with src attributes
+        for obj in list(d.xpath('(*//img|*//source)')):
+            if 'srcset' in obj.attrib:
+                for srcset_item in obj.attrib['srcset'].split(','):
+                    extra_objs.append(lxml.etree.Element('img', src=srcset_item.strip().split(' ')[0]))
+        link_elements = list(d.iterlinks()) + list(extra_objs.iterlinks())
+    # Extract links from XML formats to minimal HTML, allowing those to go through the link checks
+    elif '.atom' == fname[-5:]:
+        d = lxml.etree.fromstring(data)
+        link_elements = lxml.html.fromstring('<html/>')
+        for elm in d.findall('*//{http://www.w3.org/2005/Atom}link'):
+            feed_link = elm.attrib['href'].split('?')[0].strip()  # strip FEED_LINKS_APPEND_QUERY
+            link_elements.append(lxml.etree.Element('a', href=feed_link))
+        link_elements = list(link_elements.iterlinks())
+    elif fname.endswith('sitemap.xml') or fname.endswith('sitemapindex.xml'):
+        d = lxml.etree.fromstring(data)
+        link_elements = lxml.html.fromstring('<html/>')
+        for elm in d.findall("*//{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
+            link_elements.append(lxml.etree.Element('a', href=elm.text.strip()))
+        link_elements = list(link_elements.iterlinks())
+    else:  # unsupported file type
+        return None
+    return [l[2] for l in link_elements]
+
+
+def _extract_links_if_changed(args):
+    """Hash a file and extract its links, unless the hash is known (used by worker processes).
+
+    Returns ``(fname, digest, links, error)``; ``links`` is None if the file
+    did not change, and ``error`` is set if the file could not be parsed.
+    """
+    fname, known_digest = args
+    try:
+        with open(fname, 'rb') as inf:
+            data = inf.read()
+        digest = hashlib.md5(data).hexdigest()
+        if digest == known_digest:
+            return fname, digest, None, None
+        # Unsupported files have no links to check
+        return fname, digest, extract_links(fname, data) or [], None
+    except Exception as exc:
+        return fname, None, None, u"{0}".format(exc)
+
+
 def fs_relpath_from_url_path(url_path):
     """Create a filesystem relative path from an URL path."""
     # Expects as input an urlparse(s).path
@@ -100,6 +164,127 @@ def fs_relpath_from_url_path(url_path):
     return url_path
 
 
+class RemoteLinkChecker(object):
+    """Check remote links concurrently.
+
+    Requests go through a thread pool, with one ``requests.Session`` (and
+    thus one connection pool) and a concurrency limit per host.  Results
+    are kept in a persistent cache for ``ttl`` seconds, so repeated checks
+    of the same site do not hit the network again.
+    """
+
+    # I’m a real boy!
+    headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:45.0) Gecko/20100101 Firefox/45.0 (Nikola)'}
+    timeout = 30
+    retry_delay = 0.5
+
+    def __init__(self, cache_path=None, ttl=0, threads=1, threads_per_host=1):
+        """Initialize the checker."""
+        self.ttl = ttl
+        self.threads = max(1, threads)
+        self.threads_per_host = max(1, threads_per_host)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._semaphores = {}
+        if cache_path and ttl > 0:
+            makedirs(os.path.dirname(cache_path))
+            self._persistor = Persistor(cache_path)
+        else:
+            self._persistor = None
+
+    def _get_host(self, netloc):
+        """Return the session and semaphore for a host."""
+        with self._lock:
+            if netloc not in self._sessions:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                self._sessions[netloc] = session
+                self._semaphores[netloc] = threading.BoundedSemaphore(self.threads_per_host)
+            return self._sessions[netloc], self._semaphores[netloc]
+
+    def _get(self, session, target, allow_redirects):
+        # Only the status matters, do not download the body
+        resp = session.get(target, allow_redirects=allow_redirects, stream=True, timeout=self.timeout)
+        resp.close()
+        return resp
+
+    def check(self, target):
+        """Check a single remote link.
+
+        Returns a dict with the final HTTP ``status``, the ``redirect``
+        status code (if the first response was a redirection), the final
+        ``url`` and the time it was ``checked``.  If the link could not be
+        checked at all, ``status`` is None and ``error`` explains why.
+        """
+        session, semaphore = self._get_host(urlparse(target).netloc)
+        redir_status_code = None
+        try:
+            with semaphore:
+                resp = session.head(target, allow_redirects=False, timeout=self.timeout)
+
+                # Retry client errors (4xx) as GET requests because many servers are broken
+                if resp.status_code >= 400 and resp.status_code <= 499:
+                    time.sleep(self.retry_delay)
+                    resp = self._get(session, target, False)
+
+                # Follow redirects and see where they lead, redirects to errors will be reported twice
+                if resp.status_code in [301, 302, 307, 308]:
+                    redir_status_code = resp.status_code
+                    time.sleep(self.retry_delay)
+                    # Known redirects are retested using GET because IIS servers otherwise get HEADaches
+                    resp = self._get(session, target, True)
+        except requests.exceptions.RequestException as exc:
+            return {'status': None, 'redirect': None, 'url': target, 'checked': time.time(), 'error': str(exc)}
+        return {'status': resp.status_code, 'redirect': redir_status_code, 'url': resp.url, 'checked': time.time()}
+
+    def _check_with_target(self, target):
+        return target, self.check(target)
+
+    def _interleave_hosts(self, targets):
+        """Order targets round-robin by host, so workers do not all wait on one host."""
+        per_host = defaultdict(list)
+        for target in sorted(targets):
+            per_host[urlparse(target).netloc].append(target)
+        queues = [per_host[host] for host in sorted(per_host)]
+        ordered = []
+        while queues:
+            ordered.extend(q.pop(0) for q in queues)
+            queues = [q for q in queues if q]
+        return ordered
+
+    def check_all(self, targets):
+        """Check all targets, returning a dict of target → result (see ``check``)."""
+        now = time.time()
+        results = {}
+        cached = {}
+        if self._persistor is not None:
+            cached = self._persistor.get('remote_links') or {}
+            cached = dict((k, v) for k, v in cached.items() if now - v['checked'] < self.ttl)
+
+        todo = []
+        for target in set(targets):
+            if target in cached:
+                results[target] = cached[target]
+            else:
+                todo.append(target)
+
+        if todo:
+            pool = ThreadPool(min(self.threads, len(todo)))
+            try:
+                for target, result in pool.imap_unordered(self._check_with_target, self._interleave_hosts(todo)):
+                    results[target] = result
+                    # Network failures are often transient, do not remember them
+                    if result['status'] is not None:
+                        cached[target] = result
+            finally:
+                pool.close()
+                pool.join()
+
+        if self._persistor is not None and todo:
+            self._persistor.set('remote_links', cached)
+        return results
+
+
 class CommandCheck(Command):
     """Check the generated site."""
 
@@ -160,6 +345,8 @@ class CommandCheck(Command):
     def _execute(self, options, args):
         """Check the generated site."""
         self.logger = get_logger('check', STDERR_HANDLER)
+        # The site may have changed since the last run (in the same process)
+        self._analysis_ready = False
 
         if not options['links'] and not options['files'] and not options['clean']:
             print(self.help())
@@ -180,16 +367,32 @@ class CommandCheck(Command):
 
     existing_targets = set([])
     checked_remote_targets = {}
+    _analysis_ready = False
+    remote_links = defaultdict(set)
     cache = {}
 
-    def analyze(self, fname, find_sources=False, check_remote=False):
-        """Analyze links on a page."""
-        rv = False
+    def _prepare_analysis(self):
+        """Compute the state shared by all analyze calls."""
+        if self._analysis_ready:
+            return
+        self.existing_targets = set([])
+        self.checked_remote_targets = {}
+        self.remote_links = defaultdict(set)
         self.whitelist = [re.compile(x) for x in self.site.config['LINK_CHECK_WHITELIST']]
         self.internal_redirects = [urljoin('/', _[0]) for _ in self.site.config['REDIRECTIONS']]
-        base_url = urlparse(self.site.config['BASE_URL'])
         self.existing_targets.add(self.site.config['SITE_URL'])
         self.existing_targets.add(self.site.config['BASE_URL'])
+        self._analysis_ready = True
+
+    def analyze(self, fname, find_sources=False, check_remote=False, links=None):
+        """Analyze links on a page.
+
+        ``links`` can be the list of link targets found in the page (see
+        ``extract_links``), if it was extracted beforehand.
+        """
+        rv = False
+        self._prepare_analysis()
+        base_url = urlparse(self.site.config['BASE_URL'])
         url_type = self.site.config['URL_TYPE']
 
         deps = {}
@@ -208,39 +411,15 @@ class CommandCheck(Command):
                 self.logger.notice("Ignoring {0} (in cache, links may be incorrect)".format(filename))
                 return False
 
-            if not os.path.exists(fname):
-                # Quietly ignore files that don’t exist; use `nikola check -f` instead (Issue #1831)
-                return False
-
-            if '.html' == fname[-5:]:
-                d = lxml.html.fromstring(open(filename, 'rb').read())
-                extra_objs = lxml.html.fromstring('<html/>')
-
-                # Turn elements with a srcset attribute into individual img elements with src attributes
-                for obj in list(d.xpath('(*//img|*//source)')):
-                    if 'srcset' in obj.attrib:
-                        for srcset_item in obj.attrib['srcset'].split(','):
-                            extra_objs.append(lxml.etree.Element('img', src=srcset_item.strip().split(' ')[0]))
-                link_elements = list(d.iterlinks()) + list(extra_objs.iterlinks())
-            # Extract links from XML formats to minimal HTML, allowing those to go through the link checks
-            elif '.atom' == filename[-5:]:
-                d = lxml.etree.parse(filename)
-                link_elements = lxml.html.fromstring('<html/>')
-                for elm in d.findall('*//{http://www.w3.org/2005/Atom}link'):
-                    feed_link = elm.attrib['href'].split('?')[0].strip()  # strip FEED_LINKS_APPEND_QUERY
-                    link_elements.append(lxml.etree.Element('a', href=feed_link))
-                link_elements = list(link_elements.iterlinks())
-            elif filename.endswith('sitemap.xml') or filename.endswith('sitemapindex.xml'):
-                d = lxml.etree.parse(filename)
-                link_elements = lxml.html.fromstring('<html/>')
-                for elm in d.getroot().findall("*//{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
-                    link_elements.append(lxml.etree.Element('a', href=elm.text.strip()))
-                link_elements = list(link_elements.iterlinks())
-            else:  # unsupported file type
-                return False
+            if links is None:
+                if not os.path.exists(fname):
+                    # Quietly ignore files that don’t exist; use `nikola check -f` instead (Issue #1831)
+                    return False
+                links = extract_links(filename)
+                if links is None:  # unsupported file type
+                    return False
 
-            for l in link_elements:
-                target = l[2]
+            for target in links:
                 if target == "#":
                     continue
                 target = urldefrag(target)[0]
@@ -261,7 +440,6 @@ class CommandCheck(Command):
 
                 # Link to an internal REDIRECTIONS page
                 if target in self.internal_redirects:
-                    redir_status_code = 301
                     redir_target = [_dest for _target, _dest in self.site.config['REDIRECTIONS'] if urljoin('/', _target) == target][0]
                     self.logger.warn("Remote link moved PERMANENTLY to \"{0}\" and should be updated in {1}: {2} [HTTP: 301]".format(redir_target, filename, target))
 
@@ -271,51 +449,12 @@ class CommandCheck(Command):
                         ((parsed.scheme or target.startswith('//')) and url_type in ('rel_path', 'full_path')):
                     if not check_remote or parsed.scheme not in ["http", "https"]:
                         continue
-                    if target in self.checked_remote_targets:  # already checked this exact target
-                        if self.checked_remote_targets[target] in [301, 308]:
-                            self.logger.warn("Remote link PERMANENTLY redirected in {0}: {1} [Error {2}]".format(filename, target, self.checked_remote_targets[target]))
-                        elif self.checked_remote_targets[target] in [302, 307]:
-                            self.logger.debug("Remote link temporarily redirected in {0}: {1} [HTTP: {2}]".format(filename, target, self.checked_remote_targets[target]))
-                        elif self.checked_remote_targets[target] > 399:
-                            self.logger.error("Broken link in {0}: {1} [Error {2}]".format(filename, target, self.checked_remote_targets[target]))
-                        continue
-
                     # Skip whitelisted targets
                     if any(re.search(_, target) for _ in self.whitelist):
                         continue
 
-                    # Check the remote link works
-                    req_headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:45.0) Gecko/20100101 Firefox/45.0 (Nikola)'}  # I’m a real boy!
-                    resp = requests.head(target, headers=req_headers, allow_redirects=False)
-
-                    # Retry client errors (4xx) as GET requests because many servers are broken
-                    if resp.status_code >= 400 and resp.status_code <= 499:
-                        time.sleep(0.5)
-                        resp = requests.get(target, headers=req_headers, allow_redirects=False)
-
-                    # Follow redirects and see where they lead, redirects to errors will be reported twice
-                    if resp.status_code in [301, 302, 307, 308]:
-                        redir_status_code = resp.status_code
-                        time.sleep(0.5)
-                        # Known redirects are retested using GET because IIS servers otherwise get HEADaches
-                        resp = requests.get(target, headers=req_headers, allow_redirects=True)
-                        # Permanent redirects should be updated
-                        if redir_status_code in [301, 308]:
-                            self.logger.warn("Remote link moved PERMANENTLY to \"{0}\" and should be updated in {1}: {2} [HTTP: {3}]".format(resp.url, filename, target, redir_status_code))
-                        if redir_status_code in [302, 307]:
-                            self.logger.debug("Remote link temporarily redirected to \"{0}\" in {1}: {2} [HTTP: {3}]".format(resp.url, filename, target, redir_status_code))
-                        self.checked_remote_targets[resp.url] = resp.status_code
-                        self.checked_remote_targets[target] = redir_status_code
-                    else:
-                        self.checked_remote_targets[target] = resp.status_code
-
-                    if resp.status_code > 399:  # Error
-                        self.logger.error("Broken link in {0}: {1} [Error {2}]".format(filename, target, resp.status_code))
-                        continue
-                    elif resp.status_code <= 399:  # The address leads *somewhere* that is not an error
-                        self.logger.debug("Successfully checked remote link in {0}: {1} [HTTP: {2}]".format(filename, target, resp.status_code))
-                        continue
-                    self.logger.warn("Could not check remote link in {0}: {1} [Unknown problem]".format(filename, target))
+                    # Remote links are checked all at once, see check_remote_links
+                    self.remote_links[target].add(filename)
                     continue
 
                 if url_type == 'rel_path':
@@ -369,21 +508,100 @@ class CommandCheck(Command):
         if urlparse(self.site.config['BASE_URL']).netloc == 'example.com':
             self.logger.error("You've not changed the SITE_URL (or BASE_URL) setting from \"example.com\"!")
 
-        for fname in _call_nikola_list(self.site, self.cache)[0]:
-            if fname.startswith(output_folder):
-                if '.html' == fname[-5:]:
-                    if self.analyze(fname, find_sources, check_remote):
-                        failure = True
-                if '.atom' == fname[-5:]:
-                    if self.analyze(fname, find_sources, False):
-                        failure = True
-                if fname.endswith('sitemap.xml') or fname.endswith('sitemapindex.xml'):
-                    if self.analyze(fname, find_sources, False):
-                        failure = True
+        fnames = [fname for fname in _call_nikola_list(self.site, self.cache)[0]
+                  if fname.startswith(output_folder) and is_link_source(fname)]
+        links = self.extract_all_links(fnames)
+        for fname in fnames:
+            if fname not in links:
+                continue
+            # Remote links are only checked in HTML files
+            if self.analyze(fname, find_sources, check_remote and '.html' == fname[-5:], links[fname]):
+                failure = True
+        if check_remote and self.remote_links:
+            self.check_remote_links()
         if not failure:
             self.logger.debug("All links checked.")
         return failure
 
+    def extract_all_links(self, fnames):
+        """Extract links from files, in parallel, skipping files that did not change.
+
+        The hash and links of every file are kept in CACHE_FOLDER, so that
+        only files whose contents changed since the last check are parsed.
+        Returns a dict of file name → list of link targets.
+        """
+        cache_folder = self.site.config['CACHE_FOLDER']
+        makedirs(cache_folder)
+        persistor = Persistor(os.path.join(cache_folder, 'check_links.json'))
+        known = persistor.get('files') or {}
+        jobs = []
+        for fname in fnames:
+            if fname.startswith(cache_folder) or not os.path.exists(fname):
+                # analyze() takes care of those
+                continue
+            jobs.append((fname, known.get(fname, {}).get('hash')))
+
+        processes = self.site.config['LINK_CHECK_PROCESSES'] or cpu_count()
+        if processes > 1 and len(jobs) > 1:
+            pool = Pool(processes)
+            try:
+                results = pool.imap_unordered(_extract_links_if_changed, jobs, 16)
+                results = list(results)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_extract_links_if_changed(job) for job in jobs]
+
+        links = {}
+        files = {}
+        changed = 0
+        for fname, digest, file_links, error in results:
+            if error is not None:
+                self.logger.error(u"Error with: {0} {1}".format(fname, error))
+                continue
+            if file_links is None:  # unchanged
+                file_links = known[fname]['links']
+            else:
+                changed += 1
+            links[fname] = file_links
+            files[fname] = {'hash': digest, 'links': file_links}
+        self.logger.debug("Extracted links from {0} changed files, {1} unchanged".format(changed, len(links) - changed))
+        persistor.set('files', files)
+        return links
+
+    def check_remote_links(self):
+        """Check the remote links found by analyze, and report problems."""
+        checker = RemoteLinkChecker(
+            os.path.join(self.site.config['CACHE_FOLDER'], 'check_remote_links.json'),
+            self.site.config['LINK_CHECK_REMOTE_CACHE_TTL'],
+            self.site.config['LINK_CHECK_REMOTE_THREADS'],
+            self.site.config['LINK_CHECK_REMOTE_THREADS_PER_HOST'])
+        self.logger.debug("Checking {0} remote links".format(len(self.remote_links)))
+        results = checker.check_all(self.remote_links.keys())
+        for target in sorted(self.remote_links):
+            result = results[target]
+            status = result['status']
+            redir_status_code = result['redirect']
+            if redir_status_code is not None:
+                self.checked_remote_targets[result['url']] = status
+                self.checked_remote_targets[target] = redir_status_code
+            else:
+                self.checked_remote_targets[target] = status
+            for filename in sorted(self.remote_links[target]):
+                if status is None:
+                    self.logger.warn("Could not check remote link in {0}: {1} [{2}]".format(filename, target, result.get('error', 'Unknown problem')))
+                    continue
+                # Permanent redirects should be updated
+                if redir_status_code in [301, 308]:
+                    self.logger.warn("Remote link moved PERMANENTLY to \"{0}\" and should be updated in {1}: {2} [HTTP: {3}]".format(result['url'], filename, target, redir_status_code))
+                elif redir_status_code in [302, 307]:
+                    self.logger.debug("Remote link temporarily redirected to \"{0}\" in {1}: {2} [HTTP: {3}]".format(result['url'], filename, target, redir_status_code))
+                if status > 399:  # Error
+                    self.logger.error("Broken link in {0}: {1} [Error {2}]".format(filename, target, status))
+                else:  # The address leads *somewhere* that is not an error
+                    self.logger.debug("Successfully checked remote link in {0}: {1} [HTTP: {2}]".format(filename, target, status))
+
     def scan_files(self):
         """Check files in the site, find missing and orphaned files."""
         failure = False
@@ -312,9 +312,12 @@ class CommandNewPost(Command):
         # Calculate the date to use for the content
         schedule = options['schedule'] or self.site.config['SCHEDULE_ALL']
         rule = self.site.config['SCHEDULE_RULE']
-        self.site.scan_posts()
-        timeline = self.site.timeline
-        last_date = None if not timeline else timeline[0].date
+        last_date = None
+        if schedule:
+            # Only scheduling needs the date of the last post
+            self.site.scan_posts()
+            timeline = self.site.timeline
+            last_date = None if not timeline else timeline[0].date
         date = get_date(schedule, rule, last_date, self.site.tzinfo, self.site.config['FORCE_ISO8601'])
         data = {
             'title': title,
@@ -27,6 +27,7 @@
 """Start test server."""
 
 from __future__ import print_function
+from email.utils import formatdate, mktime_tz, parsedate_tz
 import os
 import re
 import socket
@@ -34,9 +35,11 @@ import webbrowser
 try:
     from BaseHTTPServer import HTTPServer
     from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
 except ImportError:
     from http.server import HTTPServer  # NOQA
     from http.server import SimpleHTTPRequestHandler  # NOQA
+    from socketserver import ThreadingMixIn  # NOQA
 
 try:
     from StringIO import StringIO
@@ -48,7 +51,14 @@ from nikola.plugin_categories import Command
 from nikola.utils import dns_sd, get_logger, STDERR_HANDLER
 
 
-class IPv6Server(HTTPServer):
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    """An HTTPServer which handles each request in a new thread."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class IPv6Server(ThreadedHTTPServer):
     """An IPv6 HTTPServer."""
 
     address_family = socket.AF_INET6
@@ -123,7 +133,7 @@ class CommandServe(Command):
                 OurHTTP = IPv6Server
             else:
                 ipv6 = False
-                OurHTTP = HTTPServer
+                OurHTTP = ThreadedHTTPServer
 
             httpd = OurHTTP((options['address'], options['port']),
                             OurHTTPRequestHandler)
@@ -166,6 +176,20 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
     extensions_map = dict(SimpleHTTPRequestHandler.extensions_map)
     extensions_map[""] = "text/plain"
     quiet = False
+    # HTTP/1.1 allows clients to reuse connections
+    protocol_version = "HTTP/1.1"
+    # Headers and bodies are written separately, do not wait for ACKs
+    disable_nagle_algorithm = True
+    # Precompressed variants created by the gzip task (or by hand), best first
+    precompressed = (('br', '.br'), ('gzip', '.gz'))
+    range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+    def setup(self):
+        """Set up the connection."""
+        SimpleHTTPRequestHandler.setup(self)
+        # Python 2.7 ignores disable_nagle_algorithm
+        if self.disable_nagle_algorithm:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
 
     def log_message(self, *args):
         """Log messages.  Or not, depending on a setting."""
@@ -175,9 +199,76 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
             # Old-style class in Python 2.7, cannot use super()
             return SimpleHTTPRequestHandler.log_message(self, *args)
 
-    # NOTICE: this is a patched version of send_head() to disable all sorts of
-    # caching.  `nikola serve` is a development server, hence caching should
-    # not happen to have access to the newest resources.
+    def send_no_cache_headers(self):
+        """Ask clients to revalidate everything, so they always get the newest resources.
+
+        `nikola serve` is a development server, so resources must not be
+        cached without checking with the server first.  Revalidation is
+        cheap thanks to ETag and Last-Modified.
+        """
+        self.send_header("Cache-Control", "no-cache, must-revalidate")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Expires", "0")
+
+    def accepted_encodings(self):
+        """Return the content codings accepted by the client."""
+        accepted = set()
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            parts = coding.strip().split(';')
+            if len(parts) > 1 and parts[1].strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(parts[0].strip().lower())
+        return accepted
+
+    def is_not_modified(self, etag, mtime):
+        """Check If-None-Match and If-Modified-Since headers."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or etag.lstrip('W/') in [t.lstrip('W/') for t in tags]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            parsed = parsedate_tz(if_modified_since)
+            if parsed is not None:
+                return int(mtime) <= mktime_tz(parsed)
+        return False
+
+    def parse_range(self, size, etag, mtime):
+        """Parse the Range header.
+
+        Returns None to send the whole file, a ``(start, end)`` tuple
+        (inclusive) for a single satisfiable range, or False if the range
+        cannot be satisfied.  Multiple ranges are not supported, the whole
+        file is sent instead.
+        """
+        header = self.headers.get('Range')
+        if header is None:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range != etag and if_range != formatdate(mtime, usegmt=True):
+            return None
+        m = self.range_re.match(header.strip())
+        if not m:
+            return None
+        start, end = m.groups()
+        if not start and not end:
+            return None
+        if not start:  # suffix range: last N bytes
+            length = int(end)
+            if length == 0:
+                return False
+            start = max(0, size - length)
+            end = size - 1
+        else:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    # NOTICE: this is a patched version of send_head() with support for
+    # conditional requests, byte ranges and precompressed files, which
+    # also keeps clients from caching anything without revalidating.
     #
     # The original code was copy-pasted from Python 2.7.  Python 3.3 contains
     # the same code, missing the binary mode comment.
@@ -195,6 +286,7 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
         None, in which case the caller has nothing further to do.
 
         """
+        self._byte_range = None
         path = self.translate_path(self.path)
         f = None
         if os.path.isdir(path):
@@ -202,7 +294,7 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
                 # redirect browser - doing basically what apache does
                 self.send_response(301)
                 self.send_header("Location", self.path + "/")
-                # begin no-cache patch
+                self.send_header("Content-Length", "0")
                 # For redirects.  With redirects, caching is even worse and can
                 # break more.  Especially with 301 Moved Permanently redirects,
                 # like this one.
@@ -210,7 +302,6 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
                                  "must-revalidate")
                 self.send_header("Pragma", "no-cache")
                 self.send_header("Expires", "0")
-                # end no-cache patch
                 self.end_headers()
                 return None
             for index in "index.html", "index.htm":
@@ -221,6 +312,22 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
             else:
                 return self.list_directory(path)
         ctype = self.guess_type(path)
+
+        # Comment out any <base> in HTML to allow local resolution of
+        # relative URLs.  Compressed variants cannot be rewritten.
+        rewrite_html = ctype == 'text/html'
+        content_encoding = None
+        if os.path.splitext(path)[1] == '.svgz':
+            # Special handling for svgz to make it work nice with browsers.
+            content_encoding = 'gzip'
+        elif not rewrite_html:
+            accepted = self.accepted_encodings()
+            for coding, ext in self.precompressed:
+                if coding in accepted and os.path.isfile(path + ext):
+                    path += ext
+                    content_encoding = coding
+                    break
+
         try:
             # Always read in binary mode. Opening files in text mode may cause
             # newline translations, making the actual size of the content
@@ -230,39 +337,100 @@ class OurHTTPRequestHandler(SimpleHTTPRequestHandler):
             self.send_error(404, "File not found")
             return None
 
-        filtered_bytes = None
-        if ctype == 'text/html':
-            # Comment out any <base> to allow local resolution of relative URLs.
+        fs = os.fstat(f.fileno())
+        mtime = fs.st_mtime
+        etag = '"{0:x}-{1:x}{2}"'.format(
+            int(mtime * 1000000), fs.st_size, '-' + content_encoding if content_encoding else '')
+
+        if self.is_not_modified(etag, mtime):
+            f.close()
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_no_cache_headers()
+            self.end_headers()
+            return None
+
+        size = fs.st_size
+        if rewrite_html:
             data = f.read().decode('utf8')
             f.close()
             data = re.sub(r'<base\s([^>]*)>', '<!--base \g<1>-->', data, re.IGNORECASE)
             data = data.encode('utf8')
             f = StringIO()
             f.write(data)
-            filtered_bytes = len(data)
+            size = len(data)
             f.seek(0)
 
-        self.send_response(200)
+        byte_range = self.parse_range(size, etag, mtime)
+        if byte_range is False:
+            f.close()
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */{0}".format(size))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        if byte_range is None:
+            self.send_response(200)
+        else:
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(byte_range[0], byte_range[1], size))
+            self._byte_range = byte_range
+            f.seek(byte_range[0])
+            size = byte_range[1] - byte_range[0] + 1
         if ctype.startswith('text/') or ctype.endswith('+xml'):
             self.send_header("Content-Type", "{0}; charset=UTF-8".format(ctype))
         else:
             self.send_header("Content-Type", ctype)
-        if os.path.splitext(path)[1] == '.svgz':
-            # Special handling for svgz to make it work nice with browsers.
-            self.send_header("Content-Encoding", 'gzip')
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        self.send_header("Content-Length", str(size))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_no_cache_headers()
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        """Copy the file (or the requested range) to the client.
 
-        if filtered_bytes is None:
-            fs = os.fstat(f.fileno())
-            self.send_header('Content-Length', str(fs[6]))
+        Real files are sent with os.sendfile, when available, so the data
+        does not go through Python.
+        """
+        if self._byte_range is None:
+            offset = source.tell()
+            count = None
         else:
-            self.send_header('Content-Length', filtered_bytes)
+            offset = self._byte_range[0]
+            count = self._byte_range[1] - self._byte_range[0] + 1
 
-        # begin no-cache patch
-        # For standard requests.
-        self.send_header("Cache-Control", "no-cache, no-store, "
-                         "must-revalidate")
-        self.send_header("Pragma", "no-cache")
-        self.send_header("Expires", "0")
-        # end no-cache patch
-        self.end_headers()
-        return f
+        sendfile = getattr(os, 'sendfile', None)
+        try:
+            fileno = source.fileno()
+        except (AttributeError, IOError, ValueError):  # in-memory file
+            fileno = None
+        if sendfile is not None and fileno is not None:
+            outputfile.flush()
+            if count is None:
+                count = os.fstat(fileno).st_size - offset
+            sock = self.connection.fileno()
+            while count > 0:
+                sent = sendfile(sock, fileno, offset, count)
+                if sent == 0:
+                    break
+                offset += sent
+                count -= sent
+            return
+
+        if count is None:
+            return SimpleHTTPRequestHandler.copyfile(self, source, outputfile)
+        while count > 0:
+            buf = source.read(min(count, 64 * 1024))
+            if not buf:
+                break
+            outputfile.write(buf)
+            count -= len(buf)
@@ -27,12 +27,19 @@
 """Implementation of compile_html based on nbconvert."""
 
 from __future__ import unicode_literals, print_function
+import hashlib
 import io
+import json
 import os
+import shutil
 import sys
+import tempfile
+import threading
 
 try:
+    import nbconvert
     from nbconvert.exporters import HTMLExporter
+    exporter_version = nbconvert.__version__
     import nbformat
     current_nbformat = nbformat.current_nbformat
     from jupyter_client import kernelspec
@@ -43,6 +50,7 @@ except ImportError:
     try:
         import IPython
         from IPython.nbconvert.exporters import HTMLExporter
+        exporter_version = IPython.__version__
         if IPython.version_info[0] >= 3:     # API changed with 3.0.0
             from IPython import nbformat
             current_nbformat = nbformat.current_nbformat
@@ -59,33 +67,99 @@ except ImportError:
     except ImportError:
         flag = None
         ipy_modern = None
+        exporter_version = None
 
 from nikola.plugin_categories import PageCompiler
 from nikola.utils import makedirs, req_missing, get_logger, STDERR_HANDLER
 
+# Top-level keys of notebooks written by nbformat (indented by one space)
+TOP_LEVEL_METADATA = '\n "metadata": '
+
+
+class ThreadLocalExporter(threading.local):
+    """Export notebooks to HTML using one exporter per thread.
+
+    Setting up an exporter (and its Jinja environment) is slow, so each
+    thread keeps its own.
+    """
+
+    def __init__(self, config):
+        """Create an HTML exporter for this thread."""
+        self.exporter = HTMLExporter(config=Config(config))
+
+    def export(self, nb):
+        """Export a notebook node to HTML."""
+        return self.exporter.from_notebook_node(nb)[0]
+
+
+def read_notebook_metadata(source):
+    """Read the top-level metadata of a notebook file.
+
+    Notebooks written by nbformat have their top-level keys on lines of
+    their own, so the metadata (which comes after all the cells) is found
+    and decoded without decoding the cells.  Other notebooks are decoded
+    as plain JSON.
+    """
+    with io.open(source, "r", encoding="utf8") as in_file:
+        data = in_file.read()
+    pos = data.rfind(TOP_LEVEL_METADATA)
+    if data.startswith('{\n') and pos != -1:
+        try:
+            return json.JSONDecoder().raw_decode(data, pos + len(TOP_LEVEL_METADATA))[0]
+        except ValueError:
+            pass
+    return json.loads(data).get('metadata', {})
+
 
 class CompileIPynb(PageCompiler):
     """Compile IPynb into HTML."""
 
     name = "ipynb"
     friendly_name = "Jupyter/IPython Notebook"
+    library_version = exporter_version or ''
     demote_headers = True
     default_kernel = 'python2' if sys.version_info[0] == 2 else 'python3'
 
+    exporter = None
+
     def set_site(self, site):
         """Set Nikola site."""
         self.logger = get_logger('compile_ipynb', STDERR_HANDLER)
         super(CompileIPynb, self).set_site(site)
 
+    def _cache_path(self, data):
+        """Return where the HTML for notebook data is cached."""
+        key = hashlib.sha1(data)
+        key.update(json.dumps([exporter_version, self.site.config['IPYNB_CONFIG']],
+                              sort_keys=True, default=repr).encode('utf-8'))
+        key = key.hexdigest()
+        return os.path.join(self.site.config['CACHE_FOLDER'], 'ipynb', key[:2], key[2:] + '.html')
+
     def compile_html_string(self, source, is_two_file=True):
-        """Export notebooks as HTML strings."""
+        """Export notebooks as HTML strings.
+
+        The HTML is cached in ``CACHE_FOLDER`` by the contents of the
+        notebook, so notebooks used as both posts and listings, or
+        compiled again after ``nikola clean``, are only exported once.
+        """
         if flag is None:
             req_missing(['ipython[notebook]>=2.0.0'], 'build this site (compile ipynb)')
-        c = Config(self.site.config['IPYNB_CONFIG'])
-        exportHtml = HTMLExporter(config=c)
-        with io.open(source, "r", encoding="utf8") as in_file:
-            nb_json = nbformat.read(in_file, current_nbformat)
-        (body, resources) = exportHtml.from_notebook_node(nb_json)
+        with io.open(source, "rb") as in_file:
+            data = in_file.read()
+        cache_path = self._cache_path(data)
+        try:
+            with io.open(cache_path, "r", encoding="utf8", newline='') as in_file:
+                return in_file.read()
+        except (IOError, OSError):
+            pass
+        if self.exporter is None:
+            self.exporter = ThreadLocalExporter(self.site.config['IPYNB_CONFIG'])
+        nb_json = nbformat.reads(data.decode('utf8'), current_nbformat)
+        body = self.exporter.export(nb_json)
+        makedirs(os.path.dirname(cache_path))
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), delete=False) as out_file:
+            out_file.write(body.encode('utf8'))
+        shutil.move(out_file.name, cache_path)
         return body
 
     def compile_html(self, source, dest, is_two_file=True):
@@ -102,14 +176,9 @@ class CompileIPynb(PageCompiler):
         As ipynb file support arbitrary metadata as json, the metadata used by Nikola
         will be assume to be in the 'nikola' subfield.
         """
-        if flag is None:
-            req_missing(['ipython[notebook]>=2.0.0'], 'build this site (compile ipynb)')
-        source = post.source_path
-        with io.open(source, "r", encoding="utf8") as in_file:
-            nb_json = nbformat.read(in_file, current_nbformat)
         # Metadata might not exist in two-file posts or in hand-crafted
         # .ipynb files.
-        return nb_json.get('metadata', {}).get('nikola', {})
+        return read_notebook_metadata(post.source_path).get('nikola', {})
 
     def create_post(self, path, **kw):
         """Create a new post."""
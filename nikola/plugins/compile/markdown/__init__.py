@@ -30,11 +30,16 @@ from __future__ import unicode_literals
 
 import io
 import os
+import threading
 
 try:
-    from markdown import markdown
+    import markdown
+    from markdown import Markdown
+    # Before Markdown 3.0, markdown.__version__ is a module
+    markdown_version = getattr(markdown.__version__, 'version', markdown.__version__)
 except ImportError:
-    markdown = None  # NOQA
+    Markdown = None  # NOQA
+    markdown_version = ''
     nikola_extension = None
     gist_extension = None
     podcast_extension = None
@@ -43,38 +48,63 @@ from nikola.plugin_categories import PageCompiler
 from nikola.utils import makedirs, req_missing, write_metadata
 
 
+class ThreadLocalMarkdown(threading.local):
+    """Convert Markdown to HTML using one converter per thread.
+
+    Setting up a converter (and all its extensions) is slow, so each
+    thread keeps its own, and resets it between documents.
+    """
+
+    def __init__(self, extensions):
+        """Create a Markdown converter for this thread."""
+        self.markdown = Markdown(extensions=extensions)
+
+    def convert(self, data):
+        """Convert data to HTML."""
+        try:
+            return self.markdown.convert(data)
+        finally:
+            # Don't leak references, footnotes or TOC into the next document
+            self.markdown.reset()
+
+
 class CompileMarkdown(PageCompiler):
     """Compile Markdown into HTML."""
 
     name = "markdown"
     friendly_name = "Markdown"
+    library_version = markdown_version
     demote_headers = True
-    extensions = []
     site = None
+    converter = None
 
     def set_site(self, site):
         """Set Nikola site."""
         super(CompileMarkdown, self).set_site(site)
         self.config_dependencies = []
+        self.extensions = []
         for plugin_info in self.get_compiler_extensions():
             self.config_dependencies.append(plugin_info.name)
             self.extensions.append(plugin_info.plugin_object)
             plugin_info.plugin_object.short_help = plugin_info.description
 
+        self.extensions += site.config.get("MARKDOWN_EXTENSIONS")
         self.config_dependencies.append(str(sorted(site.config.get("MARKDOWN_EXTENSIONS"))))
+        self.converter = None
 
     def compile_html(self, source, dest, is_two_file=True):
         """Compile source file into HTML and save as dest."""
-        if markdown is None:
+        if Markdown is None:
             req_missing(['markdown'], 'build this site (compile Markdown)')
+        if self.converter is None:
+            self.converter = ThreadLocalMarkdown(self.extensions)
         makedirs(os.path.dirname(dest))
-        self.extensions += self.site.config.get("MARKDOWN_EXTENSIONS")
         with io.open(dest, "w+", encoding="utf8") as out_file:
             with io.open(source, "r", encoding="utf8") as in_file:
                 data = in_file.read()
             if not is_two_file:
                 _, data = self.split_metadata(data)
-            output = markdown(data, self.extensions)
+            output = self.converter.convert(data)
             output = self.site.apply_shortcodes(output, filename=source)
             out_file.write(output)
 
@@ -29,6 +29,7 @@
 from __future__ import unicode_literals
 import io
 import os
+import threading
 
 import docutils.core
 import docutils.nodes
@@ -55,6 +56,7 @@ class CompileRest(PageCompiler):
 
     name = "rest"
     friendly_name = "reStructuredText"
+    library_version = docutils.__version__
     demote_headers = True
     logger = None
 
@@ -241,6 +243,50 @@ def add_node(node, visit_function=None, depart_function=None):
         setattr(docutils.writers.html4css1.HTMLTranslator, 'depart_' + node.__name__, depart_function)
 
 
+class PublisherContext(threading.local):
+    """Docutils components reused between documents, one set per thread.
+
+    Processing the settings (which reads the docutils configuration files
+    and sets up an option parser for every component) and creating the
+    parser and writer are a fixed cost for every document, so they are
+    kept here, and only the per-document state is created for each one.
+    """
+
+    def __init__(self):
+        """Start without any components."""
+        self.parsers = {}
+        self.writers = {}
+        self.settings = {}
+
+    def parser(self, parser_name):
+        """Return a parser for parser_name."""
+        if parser_name not in self.parsers:
+            self.parsers[parser_name] = docutils.parsers.get_parser_class(parser_name)()
+        return self.parsers[parser_name]
+
+    def writer(self, writer_name):
+        """Return a writer for writer_name."""
+        if writer_name not in self.writers:
+            self.writers[writer_name] = docutils.writers.get_writer_class(writer_name)()
+        return self.writers[writer_name]
+
+    def get_settings(self, pub, settings_spec, settings_overrides, config_section):
+        """Return fresh settings for a document published by pub."""
+        # Settings depend on the settings_spec of every component
+        key = repr((type(pub.reader), type(pub.parser), type(pub.writer), settings_spec, sorted((settings_overrides or {}).items()), config_section))
+        if key not in self.settings:
+            pub.process_programmatic_settings(settings_spec, settings_overrides, config_section)
+            self.settings[key] = pub.settings
+        settings = self.settings[key].copy()
+        # The only mutable setting: collects dependencies of the document
+        if isinstance(settings.record_dependencies, docutils.utils.DependencyList) and settings.record_dependencies.file is None:
+            settings.record_dependencies = docutils.utils.DependencyList()
+        return settings
+
+
+_publisher_context = PublisherContext()
+
+
 def rst2html(source, source_path=None, source_class=docutils.io.StringInput,
              destination_path=None, reader=None,
              parser=None, parser_name='restructuredtext', writer=None,
@@ -273,12 +319,17 @@ def rst2html(source, source_path=None, source_class=docutils.io.StringInput,
         reader.l_settings = {'logger': logger, 'source': source_path,
                              'add_ln': l_add_ln}
 
+    if parser is None:
+        parser = _publisher_context.parser(parser_name)
+    if writer is None:
+        writer = _publisher_context.writer(writer_name)
+
     pub = docutils.core.Publisher(reader, parser, writer, settings=settings,
                                   source_class=source_class,
                                   destination_class=docutils.io.StringOutput)
-    pub.set_components(None, parser_name, writer_name)
-    pub.process_programmatic_settings(
-        settings_spec, settings_overrides, config_section)
+    if pub.settings is None:
+        pub.settings = _publisher_context.get_settings(
+            pub, settings_spec, settings_overrides, config_section)
     pub.set_source(source, None)
     pub.settings._nikola_source_path = source_path
     pub.set_destination(None, destination_path)
@@ -194,3 +194,8 @@ def _gen_chart(chart_type, **_options):
             label, series = literal_eval('({0})'.format(line))
             chart.add(label, series)
     return chart.render().decode('utf8')
+
+
+# Output only depends on the arguments (once pygal is installed)
+if pygal is not None:
+    _gen_chart.nikola_shortcode_pure = True
@@ -45,11 +45,8 @@ from docutils.parsers.rst import Directive, directives
 from docutils.parsers.rst.roles import set_classes
 from docutils.parsers.rst.directives.misc import Include
 
-from pygments.lexers import get_lexer_by_name
-import pygments
 import pygments.util
 
-from nikola import utils
 from nikola.plugin_categories import RestExtension
 
 
@@ -88,7 +85,7 @@ class CodeBlock(Directive):
         code = '\n'.join(self.content)
 
         try:
-            lexer = get_lexer_by_name(language)
+            lexer = self.site.highlighter.lexer_by_name(language)
         except pygments.util.ClassNotFound:
             raise self.error('Cannot find pygments lexer for language "{0}"'.format(language))
 
@@ -108,8 +105,7 @@ class CodeBlock(Directive):
         else:
             anchor_ref = 'rest_code_' + uuid.uuid4().hex
 
-        formatter = utils.NikolaPygmentsHTML(anchor_ref=anchor_ref, classes=classes, linenos=linenos, linenostart=linenostart)
-        out = pygments.highlight(code, lexer, formatter)
+        out = self.site.highlighter.highlight(code, lexer, anchor_ref, classes=classes, linenos=linenos, linenostart=linenostart)
         node = nodes.raw('', out, format='html')
 
         self.add_name(node)
@@ -40,10 +40,50 @@ class ScanPosts(PostScanner):
     """Scan posts in the site."""
 
     name = "scan_posts"
+    # Posts from the previous scan, by source path, with the stat data of
+    # the files they were read from.
+    _posts_by_source = {}
+
+    def _source_signature(self, source_path):
+        """Return the stat data of every file a post is read from."""
+        signature = []
+        for path in (source_path, os.path.splitext(source_path)[0] + '.meta'):
+            for lang in self.site.config['TRANSLATIONS'].keys():
+                candidate = utils.get_translation_candidate(self.site.config, path, lang)
+                try:
+                    st = os.stat(candidate)
+                    signature.append((candidate, st.st_mtime, st.st_size))
+                except OSError:
+                    signature.append((candidate, None, None))
+        return signature
+
+    def _reuse_post(self, base_path, signature, dest_dir, use_in_feeds, template_name):
+        """Return the post from the previous scan, if none of its files changed."""
+        cached = self._posts_by_source.get(base_path)
+        if cached is None or cached[0] != signature:
+            return None
+        post = cached[1]
+        # Posts scheduled for later have to be re-read, they may be due now.
+        if (post.publish_later or post.folder != dest_dir or post.is_post != use_in_feeds or
+                post._template_name != template_name):
+            return None
+        post.prev_post = None
+        post.next_post = None
+        post._reading_time = None
+        post._remaining_reading_time = None
+        post._paragraph_count = None
+        post._remaining_paragraph_count = None
+        post.reset_dependencies()
+        return post
 
     def scan(self):
-        """Create list of posts from POSTS and PAGES options."""
+        """Create list of posts from POSTS and PAGES options.
+
+        Posts whose files did not change since the previous scan are reused,
+        which makes rescans (as done by ``nikola auto``) cheap.
+        """
         seen = set([])
+        posts_by_source = {}
         if not self.site.quiet:
             print("Scanning posts", end='', file=sys.stderr)
 
@@ -87,15 +127,20 @@ class ScanPosts(PostScanner):
                         continue
                     else:
                         seen.add(base_path)
-                    post = Post(
-                        base_path,
-                        self.site.config,
-                        dest_dir,
-                        use_in_feeds,
-                        self.site.MESSAGES,
-                        template_name,
-                        self.site.get_compiler(base_path)
-                    )
+                    signature = self._source_signature(base_path)
+                    post = self._reuse_post(base_path, signature, dest_dir, use_in_feeds, template_name)
+                    if post is None:
+                        post = Post(
+                            base_path,
+                            self.site.config,
+                            dest_dir,
+                            use_in_feeds,
+                            self.site.MESSAGES,
+                            template_name,
+                            self.site.get_compiler(base_path)
+                        )
+                    posts_by_source[base_path] = (signature, post)
                     timeline.append(post)
 
+        self._posts_by_source = posts_by_source
         return timeline
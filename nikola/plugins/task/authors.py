@@ -60,6 +60,7 @@ class RenderAuthors(Task):
 
     def posts_scanned(self, event):
         """Called after posts are scanned via signal."""
+        self.posts_per_author = None
         self.generate_author_pages = self.site.config["ENABLE_AUTHOR_PAGES"] and len(self._posts_per_author()) > 1
         self.site.GLOBAL_CONTEXT["author_pages_generated"] = self.generate_author_pages
 
@@ -24,80 +24,116 @@
 # OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-"""Bundle assets using WebAssets."""
+"""Bundle assets."""
 
 from __future__ import unicode_literals
 
+import hashlib
+import io
+import json
 import os
+import re
 
-try:
-    import webassets
-except ImportError:
-    webassets = None  # NOQA
+import pygments
 
 from nikola.plugin_categories import LateTask
 from nikola import utils
 
 
 class BuildBundles(LateTask):
-    """Bundle assets using WebAssets."""
+    """Bundle assets."""
 
     name = "create_bundles"
 
     def set_site(self, site):
         """Set Nikola site."""
         self.logger = utils.get_logger('bundles', utils.STDERR_HANDLER)
-        if webassets is None and site.config['USE_BUNDLES']:
-            utils.req_missing(['webassets'], 'USE_BUNDLES', optional=True)
-            self.logger.warn('Setting USE_BUNDLES to False.')
-            site.config['USE_BUNDLES'] = False
-            site._GLOBAL_CONTEXT['use_bundles'] = False
         super(BuildBundles, self).set_site(site)
+        self.fingerprints = {}
+        self.update_fingerprints()
+
+    def update_fingerprints(self):
+        """Compute the fingerprints of the bundles, and tell the site to link to them.
+
+        This is done whenever tasks are generated, so pages link to the
+        bundles built from the current sources.
+        """
+        site = self.site
+        site.asset_fingerprints.clear()
+        if site.config['USE_BUNDLES'] and site.config['FINGERPRINT_BUNDLES']:
+            self.fingerprints = self.get_fingerprints()
+        else:
+            self.fingerprints = {}
+        for name, fingerprinted in self.fingerprints.items():
+            path = name.replace(os.sep, '/')
+            target = fingerprinted.replace(os.sep, '/')
+            site.asset_fingerprints['/' + path] = '/' + target
+            site.asset_fingerprints[site.config['BASE_URL'] + path] = site.config['BASE_URL'] + target
+
+    def get_bundle_files(self, name, files):
+        """Return the paths of the files of a bundle, relative to the output folder."""
+        dname = os.path.dirname(name)
+        # paths are relative to dirname
+        return [os.path.join(dname, fname) for fname in files]
+
+    def get_fingerprints(self):
+        """Return a map of bundle names to their fingerprinted names.
+
+        The fingerprint is a hash of the source files of the bundle (and of
+        everything else that decides its contents), so that it is known
+        before the bundles (and the pages using them) are built.  Bundles
+        including files that other tasks generate in the output folder
+        (from Sass, for example) can't be known in advance, so they are not
+        fingerprinted.  Which files those are is known from the targets of
+        the tasks generated before, never from the output folder, so the
+        fingerprints are the same on clean and incremental builds.
+        """
+        fingerprints = {}
+        code_css = os.path.join('assets', 'css', 'code.css')
+        filters = self.site.config['FILTERS']
+        output_folder = self.site.config['OUTPUT_FOLDER']
+        for name, files in get_theme_bundles(self.site.THEMES).items():
+            digest = hashlib.sha1()
+            root, ext = os.path.splitext(name)
+            for fname in self.get_bundle_files(name, files):
+                digest.update(fname.encode('utf-8'))
+                source = utils.get_asset_path(
+                    fname, self.site.THEMES, self.site.config['FILES_FOLDERS'], output_dir=None)
+                if source is not None:
+                    with io.open(source, 'rb') as inf:
+                        digest.update(inf.read())
+                elif fname == code_css:
+                    # code.css is generated from the color scheme
+                    digest.update(self.site.config['CODE_COLOR_SCHEME'].encode('utf-8'))
+                    digest.update(pygments.__version__.encode('utf-8'))
+                elif os.path.normpath(os.path.join(output_folder, fname)) in self.site.task_targets:
+                    self.logger.info('Not fingerprinting {0}: {1} is generated by another task.'.format(name, fname))
+                    break
+                # Files that don't exist anywhere are skipped by the bundle
+                digest.update(json.dumps(filters.get(os.path.splitext(fname)[1]), cls=utils.CustomEncoder).encode('utf-8'))
+            else:
+                digest.update(json.dumps(filters.get(ext), cls=utils.CustomEncoder).encode('utf-8'))
+                fingerprints[name] = '{0}.{1}{2}'.format(root, digest.hexdigest()[:8], ext)
+        return fingerprints
 
     def gen_tasks(self):
-        """Bundle assets using WebAssets."""
+        """Bundle assets."""
+        self.update_fingerprints()
         kw = {
             'filters': self.site.config['FILTERS'],
             'output_folder': self.site.config['OUTPUT_FOLDER'],
-            'cache_folder': self.site.config['CACHE_FOLDER'],
             'theme_bundles': get_theme_bundles(self.site.THEMES),
             'themes': self.site.THEMES,
             'files_folders': self.site.config['FILES_FOLDERS'],
             'code_color_scheme': self.site.config['CODE_COLOR_SCHEME'],
+            'fingerprints': self.fingerprints,
         }
 
-        def build_bundle(output, inputs):
-            out_dir = os.path.join(kw['output_folder'],
-                                   os.path.dirname(output))
-            inputs = [os.path.relpath(i, out_dir) for i in inputs if os.path.isfile(i)]
-            cache_dir = os.path.join(kw['cache_folder'], 'webassets')
-            utils.makedirs(cache_dir)
-            env = webassets.Environment(out_dir, os.path.dirname(output),
-                                        cache=cache_dir)
-            if inputs:
-                bundle = webassets.Bundle(*inputs, output=os.path.basename(output))
-                env.register(output, bundle)
-                # This generates the file
-                try:
-                    env[output].urls()
-                except Exception as e:
-                    self.logger.error("Failed to build bundles.")
-                    self.logger.exception(e)
-                    self.logger.notice("Try running ``nikola clean`` and building again.")
-            else:
-                with open(os.path.join(out_dir, os.path.basename(output)), 'wb+'):
-                    pass  # Create empty file
-
         yield self.group_task()
-        if (webassets is not None and self.site.config['USE_BUNDLES'] is not
-                False):
+        if self.site.config['USE_BUNDLES'] is not False:
             for name, _files in kw['theme_bundles'].items():
                 output_path = os.path.join(kw['output_folder'], name)
-                dname = os.path.dirname(name)
-                files = []
-                for fname in _files:
-                    # paths are relative to dirname
-                    files.append(os.path.join(dname, fname))
+                files = self.get_bundle_files(name, _files)
                 file_dep = [os.path.join(kw['output_folder'], fname)
                             for fname in files if
                             utils.get_asset_path(
@@ -113,7 +149,7 @@ class BuildBundles(LateTask):
                     'task_dep': ['copy_assets', 'copy_files'],
                     'basename': str(self.name),
                     'name': str(output_path),
-                    'actions': [(build_bundle, (name, file_dep))],
+                    'actions': [(build_bundle, (output_path, file_dep))],
                     'targets': [output_path],
                     'uptodate': [
                         utils.config_changed({
@@ -122,7 +158,36 @@ class BuildBundles(LateTask):
                         }, 'nikola.plugins.task.bundles')],
                     'clean': True,
                 }
-                yield utils.apply_filters(task, kw['filters'])
+                task = utils.apply_filters(task, kw['filters'])
+                if name in kw['fingerprints']:
+                    # Copy the (filtered) bundle to its fingerprinted name
+                    fingerprinted_path = os.path.join(kw['output_folder'], kw['fingerprints'][name])
+                    task['actions'].append((utils.copy_file, (output_path, fingerprinted_path)))
+                    task['actions'].append((remove_old_fingerprints, (output_path, fingerprinted_path)))
+                    task['targets'].append(fingerprinted_path)
+                yield task
+
+
+def build_bundle(output, inputs):
+    """Concatenate the inputs of a bundle into output."""
+    utils.makedirs(os.path.dirname(output))
+    with io.open(output, 'wb+') as outf:
+        for i, fname in enumerate(f for f in inputs if os.path.isfile(f)):
+            if i:
+                outf.write(b'\n')
+            with io.open(fname, 'rb') as inf:
+                outf.write(inf.read())
+
+
+def remove_old_fingerprints(output, fingerprinted):
+    """Remove the copies of a bundle with other fingerprints than the current one."""
+    dname = os.path.dirname(output)
+    root, ext = os.path.splitext(os.path.basename(output))
+    pattern = re.compile(re.escape(root) + r'\.[0-9a-f]{8}' + re.escape(ext) + '$')
+    for fname in os.listdir(dname):
+        path = os.path.join(dname, fname)
+        if pattern.match(fname) and path != fingerprinted:
+            os.unlink(path)
 
 
 def get_theme_bundles(themes):
@@ -51,6 +51,7 @@ class CopyAssets(Task):
             "files_folders": self.site.config['FILES_FOLDERS'],
             "output_folder": self.site.config['OUTPUT_FOLDER'],
             "filters": self.site.config['FILTERS'],
+            "copy_files_mode": self.site.config['COPY_FILES_MODE'],
             "code_color_scheme": self.site.config['CODE_COLOR_SCHEME'],
             "code.css_selectors": 'pre.code',
             "code.css_head": '/* code.css file generated by Nikola */\n',
@@ -66,7 +67,7 @@ class CopyAssets(Task):
         for theme_name in kw['themes']:
             src = os.path.join(utils.get_theme_path(theme_name), 'assets')
             dst = os.path.join(kw['output_folder'], 'assets')
-            for task in utils.copy_tree(src, dst):
+            for task in utils.copy_tree(src, dst, mode=kw['copy_files_mode']):
                 if task['name'] in tasks:
                     continue
                 tasks[task['name']] = task
@@ -43,6 +43,7 @@ class CopyFiles(Task):
             'files_folders': self.site.config['FILES_FOLDERS'],
             'output_folder': self.site.config['OUTPUT_FOLDER'],
             'filters': self.site.config['FILTERS'],
+            'copy_files_mode': self.site.config['COPY_FILES_MODE'],
         }
 
         yield self.group_task()
@@ -50,7 +51,7 @@ class CopyFiles(Task):
             dst = kw['output_folder']
             filters = kw['filters']
             real_dst = os.path.join(dst, kw['files_folders'][src])
-            for task in utils.copy_tree(src, real_dst, link_cutoff=dst):
+            for task in utils.copy_tree(src, real_dst, link_cutoff=dst, mode=kw['copy_files_mode']):
                 task['basename'] = self.name
                 task['uptodate'] = [utils.config_changed(kw, 'nikola.plugins.task.copy_files')]
                 yield utils.apply_filters(task, filters, skip_ext=['.html'])
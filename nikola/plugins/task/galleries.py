@@ -271,7 +271,7 @@ class Galleries(Task, ImageProcessor):
                         'basename': self.name,
                         'name': post.translated_base_path(lang),
                         'targets': [post.translated_base_path(lang)],
-                        'file_dep': post.fragment_deps(lang),
+                        'file_dep': [p for p in post.fragment_deps(lang) if not p.startswith("####MAGIC####")],
                         'actions': [(post.compile, [lang])],
                         'uptodate': [utils.config_changed(self.kw.copy(), 'nikola.plugins.task.galleries:post')] + post.fragment_deps_uptodate(lang)
                     }
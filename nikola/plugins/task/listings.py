@@ -32,8 +32,7 @@ from collections import defaultdict
 import os
 import lxml.html
 
-from pygments import highlight
-from pygments.lexers import get_lexer_for_filename, TextLexer
+from pygments.lexers import TextLexer
 import natsort
 
 from nikola.plugin_categories import Task
@@ -64,6 +63,7 @@ class Listings(Task):
             "index_file": site.config["INDEX_FILE"],
             "strip_indexes": site.config['STRIP_INDEXES'],
             "filters": site.config["FILTERS"],
+            "copy_files_mode": site.config["COPY_FILES_MODE"],
         }
 
         # Verify that no folder in LISTINGS_FOLDERS appears twice (on output side)
@@ -124,10 +124,10 @@ class Listings(Task):
             elif in_name:
                 with open(in_name, 'r') as fd:
                     try:
-                        lexer = get_lexer_for_filename(in_name)
+                        lexer = self.site.highlighter.lexer_for_filename(in_name)
                     except:
                         lexer = TextLexer()
-                    code = highlight(fd.read(), lexer, utils.NikolaPygmentsHTML(in_name))
+                    code = self.site.highlighter.highlight(fd.read(), lexer, in_name)
                 title = os.path.basename(in_name)
             else:
                 code = ''
@@ -247,7 +247,8 @@ class Listings(Task):
                             'name': out_name,
                             'file_dep': [in_name],
                             'targets': [out_name],
-                            'actions': [(utils.copy_file, [in_name, out_name])],
+                            'actions': [(utils.copy_file, [in_name, out_name, None, self.kw['copy_files_mode']])],
+                            'uptodate': [utils.config_changed({1: self.kw['copy_files_mode']}, 'nikola.plugins.task.listings:source')],
                             'clean': True,
                         }, self.kw["filters"])
 
@@ -26,12 +26,22 @@
 
 """Build HTML fragments from metadata and text."""
 
+import atexit
 from copy import copy
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+
+from doit.cmd_base import tasks_and_deps_iter
 
 from nikola.plugin_categories import Task
 from nikola import filters, utils
 
+# The batch being compiled, for worker processes (which inherit it by forking)
+_batch = None
+
 
 def update_deps(post, lang, task):
     """Update file dependencies as they might have been updated during compilation.
@@ -43,6 +53,114 @@ def update_deps(post, lang, task):
     task.file_dep.update([p for p in post.fragment_deps(lang) if not p.startswith("####MAGIC####")])
 
 
+def _compile_in_worker(index):
+    """Compile a fragment of the current batch to its temporary path."""
+    post, lang = _batch.pairs[index]
+    path = _batch.temporary_path(index)
+    try:
+        return path, post.compile_fragment(lang, path)
+    except Exception:
+        # Compiled again (and reported) in the main process
+        return None
+
+
+class CompileBatch(object):
+    """Compile outdated fragments in a pool of worker processes.
+
+    When the first fragment is needed, the fragments whose tasks doit
+    will run (selected, and not up to date) are compiled to temporary
+    files by forked workers, which already have the compilers set up.
+    Each task then only moves its fragment in place and writes its
+    depfile and sends the ``compiled`` signal in the main process.
+    Fragments depending on files other tasks build, which may not be
+    there yet, are compiled by their task as usual.
+    """
+
+    def __init__(self, site, workers):
+        """Prepare to compile fragments with some workers."""
+        self.site = site
+        self.pairs = []
+        self.task_names = []
+        self.workers = workers
+        self.results = None
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.tmpdir = None
+
+    def temporary_path(self, index):
+        """Return where a worker compiles fragment number index."""
+        post, lang = self.pairs[index]
+        return os.path.join(self.tmpdir, str(index), os.path.basename(post.translated_base_path(lang)))
+
+    def add(self, post, lang, task_name):
+        """Add the fragment of a post built by a task, and return its index."""
+        self.pairs.append((post, lang))
+        self.task_names.append(task_name)
+        return len(self.pairs) - 1
+
+    def outdated(self):
+        """Return the indexes of the fragments whose tasks doit is going to run."""
+        loader = getattr(getattr(self.site, 'doit', None), 'task_loader', None)
+        command = getattr(loader, 'command', None)
+        control = getattr(command, 'control', None)
+        if control is None or command.dep_manager is None:
+            return []
+        tasks = control.tasks
+        selected = set(task.name for task in tasks_and_deps_iter(tasks, control.selected_tasks))
+        targets = set()
+        for task in tasks.values():
+            targets.update(task.targets)
+        todo = []
+        for index, name in enumerate(self.task_names):
+            task = tasks.get(name)
+            if name not in selected or task is None or any(dep in targets for dep in task.file_dep):
+                continue
+            if command.dep_manager.get_status(task, tasks).status == 'run':
+                todo.append(index)
+        return todo
+
+    def start(self):
+        """Compile all outdated fragments."""
+        global _batch
+        self.results = {}
+        todo = self.outdated()
+        if len(todo) < 2:
+            return
+        self.tmpdir = tempfile.mkdtemp(prefix='nikola-compile-')
+        atexit.register(shutil.rmtree, self.tmpdir, True)
+        _batch = self
+        if hasattr(multiprocessing, 'get_context'):
+            pool = multiprocessing.get_context('fork').Pool(min(self.workers, len(todo)))
+        else:
+            pool = multiprocessing.Pool(min(self.workers, len(todo)))
+        try:
+            for index, result in zip(todo, pool.map(_compile_in_worker, todo)):
+                if result is not None:
+                    self.results[index] = result
+        finally:
+            pool.close()
+            pool.join()
+            _batch = None
+
+    def compile(self, index):
+        """Compile fragment number index, or use the one compiled by a worker."""
+        post, lang = self.pairs[index]
+        if os.getpid() != self.pid:
+            # Running in a doit worker process, compile here
+            return post.compile(lang)
+        with self.lock:
+            if self.results is None:
+                self.start()
+            result = self.results.pop(index, None)
+        if result is None:
+            return post.compile(lang)
+        path, deps = result
+        dest = post.translated_base_path(lang)
+        utils.makedirs(os.path.dirname(dest))
+        shutil.move(path, dest)
+        post.finish_compile(lang, deps)
+
+
 class RenderPosts(Task):
     """Build HTML fragments from metadata and text."""
 
@@ -72,6 +190,9 @@ class RenderPosts(Task):
             'uptodate': [utils.config_changed({1: kw['timeline']})],
         }
 
+        workers = self.site.config['COMPILE_WORKERS']
+        batch = CompileBatch(self.site, workers) if workers > 1 and hasattr(os, 'fork') else None
+
         for lang in kw["translations"]:
             deps_dict = copy(kw)
             deps_dict.pop('timeline')
@@ -85,12 +206,16 @@ class RenderPosts(Task):
                         deps_dict[k] = self.site.config.get(k)
                 dest = post.translated_base_path(lang)
                 file_dep = [p for p in post.fragment_deps(lang) if not p.startswith("####MAGIC####")]
+                if batch is not None:
+                    compile_action = (batch.compile, (batch.add(post, lang, '{0}:{1}'.format(self.name, dest)), ))
+                else:
+                    compile_action = (post.compile, (lang, ))
                 task = {
                     'basename': self.name,
                     'name': dest,
                     'file_dep': file_dep,
                     'targets': [dest],
-                    'actions': [(post.compile, (lang, )),
+                    'actions': [compile_action,
                                 (update_deps, (post, lang, )),
                                 ],
                     'clean': True,
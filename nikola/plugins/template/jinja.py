@@ -28,9 +28,12 @@
 """Jinja template handler."""
 
 from __future__ import unicode_literals
+import hashlib
 import os
 import io
 import json
+import shutil
+import tempfile
 from collections import deque
 try:
     import jinja2
@@ -48,6 +51,10 @@ class JinjaTemplates(TemplateSystem):
     name = "jinja"
     lookup = None
     dependency_cache = {}
+    references_file = None
+    references_cache = None
+    references_cache_changed = False
+    string_templates = {}
 
     def __init__(self):
         """Initialize Jinja2 environment with extended set of filters."""
@@ -60,6 +67,9 @@ class JinjaTemplates(TemplateSystem):
             req_missing(['jinja2'], 'use this theme')
         cache_folder = os.path.join(cache_folder, 'jinja')
         makedirs(cache_folder)
+        self.references_file = os.path.join(cache_folder, 'template_deps.json')
+        self.references_cache = None
+        self.references_cache_changed = False
         cache = jinja2.FileSystemBytecodeCache(cache_folder)
         self.lookup = jinja2.Environment(bytecode_cache=cache)
         self.lookup.trim_blocks = True
@@ -69,6 +79,7 @@ class JinjaTemplates(TemplateSystem):
         self.lookup.globals['isinstance'] = isinstance
         self.lookup.globals['tuple'] = tuple
         self.directories = directories
+        self.string_templates = {}
         self.create_lookup()
 
     def inject_directory(self, directory):
@@ -101,7 +112,12 @@ class JinjaTemplates(TemplateSystem):
 
     def render_template_to_string(self, template, context):
         """Render template to a string using context."""
-        return self.lookup.from_string(template).render(**context)
+        # Templated shortcodes call this with the same few templates over
+        # and over, so keep them compiled.
+        compiled = self.string_templates.get(template)
+        if compiled is None:
+            compiled = self.string_templates[template] = self.lookup.from_string(template)
+        return compiled.render(**context)
 
     def template_deps(self, template_name):
         """Generate list of dependencies for a template."""
@@ -117,15 +133,46 @@ class JinjaTemplates(TemplateSystem):
                 source, filename = self.lookup.loader.get_source(self.lookup,
                                                                  curr)[:2]
                 deps.append(filename)
-                ast = self.lookup.parse(source)
-                dep_names = meta.find_referenced_templates(ast)
+                dep_names = self.cached_references(filename, source)
                 for dep_name in dep_names:
                     if (dep_name not in visited_templates and dep_name is not None):
                         visited_templates.add(dep_name)
                         queue.append(dep_name)
             self.dependency_cache[template_name] = deps
+            if self.references_cache_changed:
+                self.save_references_cache()
         return self.dependency_cache[template_name]
 
+    def cached_references(self, filename, source):
+        """Find the templates a template refers to, using a cache kept between runs."""
+        if self.references_cache is None:
+            try:
+                with io.open(self.references_file, 'r', encoding='utf-8') as inf:
+                    self.references_cache = json.load(inf)
+            except (IOError, OSError, ValueError):
+                self.references_cache = {}
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        entry = self.references_cache.get(filename)
+        if entry is None or entry['digest'] != digest:
+            ast = self.lookup.parse(source)
+            entry = {'digest': digest, 'references': list(meta.find_referenced_templates(ast))}
+            self.references_cache[filename] = entry
+            self.references_cache_changed = True
+        return entry['references']
+
+    def save_references_cache(self):
+        """Write the reference cache, atomically."""
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.references_file), delete=False) as outf:
+            tname = outf.name
+            outf.write(json.dumps(self.references_cache, indent=2, sort_keys=True).encode('utf-8'))
+        shutil.move(tname, self.references_file)
+        self.references_cache_changed = False
+
+    def reset_caches(self):
+        """Forget cached templates and dependencies, after templates changed on disk."""
+        self.dependency_cache = {}
+        self.create_lookup()
+
     def get_template_path(self, template_name):
         """Get the path to a template or return None."""
         try:
@@ -27,8 +27,11 @@
 """Mako template handler."""
 
 from __future__ import unicode_literals, print_function, absolute_import
+import hashlib
 import io
+import json
 import os
+import re
 import shutil
 import sys
 import tempfile
@@ -54,6 +57,9 @@ class MakoTemplates(TemplateSystem):
     filters = {}
     directories = []
     cache_dir = None
+    deps_cache = None
+    deps_cache_changed = False
+    string_templates = {}
 
     def get_deps(self, filename):
         """Get dependencies for a template (internal function)."""
@@ -78,10 +84,11 @@ class MakoTemplates(TemplateSystem):
             except UnicodeEncodeError:
                 cache_dir = tempfile.mkdtemp()
                 LOGGER.warning('Because of a Mako bug, setting cache_dir to {0}'.format(cache_dir))
-        if os.path.exists(cache_dir):
-            shutil.rmtree(cache_dir)
         self.directories = directories
         self.cache_dir = cache_dir
+        self.deps_cache = None
+        self.deps_cache_changed = False
+        self.string_templates = {}
         self.create_lookup()
 
     def inject_directory(self, directory):
@@ -95,8 +102,39 @@ class MakoTemplates(TemplateSystem):
         self.lookup = TemplateLookup(
             directories=self.directories,
             module_directory=self.cache_dir,
+            modulename_callable=self.module_filename,
+            module_writer=self.write_module,
             output_encoding='utf-8')
 
+    def module_filename(self, filename, uri):
+        """Return where to keep the compiled module of a template.
+
+        Compiled modules are kept between runs.  Their names contain a hash
+        of the template path and source, so the same URI found in another
+        theme, or a template changed in a way its mtime does not show,
+        gets a new module.
+        """
+        with open(filename, 'rb') as inf:
+            digest = hashlib.sha1(inf.read())
+        digest.update(filename if isinstance(filename, bytes) else filename.encode('utf-8'))
+        return os.path.join(self.cache_dir, os.path.normpath(uri.lstrip('/')) + '.' + digest.hexdigest()[:16] + '.py')
+
+    def write_module(self, source, outputpath):
+        """Write a compiled template module, and remove older versions of it."""
+        dirname, basename = os.path.split(outputpath)
+        makedirs(dirname)
+        older = re.compile(re.escape(basename[:-len('.0123456789abcdef.py')]) + r'\.[0-9a-f]{16}\.py$')
+        for fname in os.listdir(dirname):
+            if fname != basename and older.match(fname):
+                try:
+                    os.unlink(os.path.join(dirname, fname))
+                except OSError:  # Removed by another process
+                    pass
+        dest, name = tempfile.mkstemp(dir=dirname)
+        os.write(dest, source)
+        os.close(dest)
+        shutil.move(name, outputpath)
+
     def set_site(self, site):
         """Set the Nikola site."""
         self.site = site
@@ -116,21 +154,67 @@ class MakoTemplates(TemplateSystem):
     def render_template_to_string(self, template, context):
         """Render template to a string using context."""
         context.update(self.filters)
-        return Template(template).render(**context)
+        # Templated shortcodes call this with the same few templates over
+        # and over, so keep them compiled.
+        compiled = self.string_templates.get(template)
+        if compiled is None:
+            compiled = self.string_templates[template] = Template(template)
+        return compiled.render(**context)
 
     def template_deps(self, template_name):
         """Generate list of dependencies for a template."""
+        deps = self._template_deps(template_name)
+        if self.deps_cache_changed:
+            self.save_deps_cache()
+        return deps
+
+    def _template_deps(self, template_name):
         # We can cache here because dependencies should
         # not change between runs
         if self.cache.get(template_name, None) is None:
             template = self.lookup.get_template(template_name)
-            dep_filenames = self.get_deps(template.filename)
+            dep_filenames = self.cached_deps(template.filename)
             deps = [template.filename]
             for fname in dep_filenames:
-                deps += self.template_deps(fname)
+                deps += self._template_deps(fname)
             self.cache[template_name] = tuple(deps)
         return list(self.cache[template_name])
 
+    def cached_deps(self, filename):
+        """Get dependencies for a template, from a cache kept between runs."""
+        if self.deps_cache is None:
+            try:
+                with io.open(self.deps_cache_file(), 'r', encoding='utf-8') as inf:
+                    self.deps_cache = json.load(inf)
+            except (IOError, OSError, ValueError):
+                self.deps_cache = {}
+        with open(filename, 'rb') as inf:
+            digest = hashlib.sha1(inf.read()).hexdigest()
+        entry = self.deps_cache.get(filename)
+        if entry is None or entry['digest'] != digest:
+            entry = {'digest': digest, 'deps': self.get_deps(filename)}
+            self.deps_cache[filename] = entry
+            self.deps_cache_changed = True
+        return entry['deps']
+
+    def deps_cache_file(self):
+        """Return the path of the dependency cache."""
+        return os.path.join(self.cache_dir, 'template_deps.json')
+
+    def save_deps_cache(self):
+        """Write the dependency cache, atomically."""
+        makedirs(self.cache_dir)
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as outf:
+            tname = outf.name
+            outf.write(json.dumps(self.deps_cache, indent=2, sort_keys=True).encode('utf-8'))
+        shutil.move(tname, self.deps_cache_file())
+        self.deps_cache_changed = False
+
+    def reset_caches(self):
+        """Forget cached templates and dependencies, after templates changed on disk."""
+        self.cache = {}
+        self.create_lookup()
+
     def get_template_path(self, template_name):
         """Get the path to a template or return None."""
         try:
@@ -69,6 +69,7 @@ from .utils import (
     unslugify,
 )
 from .rc4 import rc4
+from .shortcodes import shortcode_version
 
 __all__ = ('Post',)
 
@@ -137,6 +138,7 @@ class Post(object):
         self._dependency_uptodate_fragment = defaultdict(list)
         self._dependency_uptodate_page = defaultdict(list)
         self._depfile = defaultdict(list)
+        self._hyphenated_fragments = {}
 
         default_metadata, self.newstylemeta = get_meta(self, self.config['FILE_METADATA_REGEXP'], self.config['UNSLUGIFY_TITLES'])
 
@@ -373,6 +375,19 @@ class Post(object):
             lang = nikola.utils.LocaleBorg().current_lang
         return self.meta[lang]['description']
 
+    def reset_dependencies(self):
+        """Forget the dependencies added by plugins, keeping the ones of the compiler.
+
+        This is done when a post is reused by a new scan, as plugins add
+        their dependencies again.
+        """
+        self._dependency_file_fragment = defaultdict(list)
+        self._dependency_file_page = defaultdict(list)
+        self._dependency_uptodate_fragment = defaultdict(list)
+        self._dependency_uptodate_page = defaultdict(list)
+        self._depfile = defaultdict(list)
+        self.compiler.register_extra_dependencies(self)
+
     def add_dependency(self, dependency, add='both', lang=None):
         """Add a file dependency for tasks using that post.
 
@@ -493,6 +508,44 @@ class Post(object):
 
     def compile(self, lang):
         """Generate the cache/ file with the compiled post."""
+        if not self.is_translation_available(lang) and not self.config['SHOW_UNTRANSLATED_POSTS']:
+            return
+        self.finish_compile(lang, self.compile_fragment(lang))
+
+    def compile_fragment(self, lang, dest=None):
+        """Compile the post into its cache/ file (or dest), returning the dependencies found.
+
+        This only runs the compiler (or takes the fragment from the
+        ``COMPILE_CACHE_FOLDER`` store), so it can run in another process;
+        ``finish_compile`` does the rest.
+        """
+        base_path = self.translated_base_path(lang)
+        dest = dest or base_path
+        # Set the language to the right thing
+        LocaleBorg().set_locale(lang)
+        # Use a fragment compiled earlier from the same inputs, if any
+        store = getattr(self.compiler.site, 'fragment_store', None)
+        manifest_key = store.manifest_key(self, lang) if store else None
+        deps = store.fetch(manifest_key, dest) if store else None
+        if deps is not None:
+            return deps
+        # Forget dependencies found by a previous compilation of this post
+        # (compilers record them for dest, shortcodes for the cache/ file)
+        self._depfile[base_path] = []
+        self._depfile[dest] = []
+        self.compile_html(
+            self.translated_source_path(lang),
+            dest,
+            self.is_two_file)
+        deps = [p for p in self._depfile[dest] if p != dest]
+        if dest != base_path:
+            deps += self._depfile[base_path]
+        if store:
+            store.save(manifest_key, dest, deps)
+        return deps
+
+    def finish_compile(self, lang, deps):
+        """Write the depfile and send the signals for a fragment compiled with deps."""
         def wrap_encrypt(path, password):
             """Wrap a post with encryption."""
             with io.open(path, 'r+', encoding='utf8') as inf:
@@ -502,14 +555,7 @@ class Post(object):
                 outf.write(data)
 
         dest = self.translated_base_path(lang)
-        if not self.is_translation_available(lang) and not self.config['SHOW_UNTRANSLATED_POSTS']:
-            return
-        # Set the language to the right thing
-        LocaleBorg().set_locale(lang)
-        self.compile_html(
-            self.translated_source_path(lang),
-            dest,
-            self.is_two_file)
+        self._depfile[dest] = deps
         Post.write_depfile(dest, self._depfile[dest])
 
         signal('compiled').send({
@@ -554,6 +600,14 @@ class Post(object):
         deps += self._get_dependencies(self._dependency_uptodate_fragment[lang])
         deps += self._get_dependencies(self._dependency_uptodate_fragment[None])
         deps.append(utils.config_changed({1: sorted(self.compiler.config_dependencies)}, 'nikola.post.Post.deps_uptodate:compiler:' + self.source_path))
+        # Versions of the pure shortcodes used by the last compilation
+        versions = {}
+        for p in self.fragment_deps(lang):
+            if p.startswith('####MAGIC####SHORTCODE:'):
+                name = p.split('####MAGIC####SHORTCODE:', 1)[-1]
+                versions[name] = shortcode_version(self.compiler.site.shortcode_registry.get(name))
+        if versions:
+            deps.append(utils.config_changed({1: versions}, 'nikola.post.Post.fragment_deps_uptodate:shortcodes:' + self.source_path))
         return deps
 
     def is_translation_available(self, lang):
@@ -588,6 +642,27 @@ class Post(object):
         else:
             return get_translation_candidate(self.config, self.base_path, sorted(self.translated_to)[0])
 
+    def _absolute_fragment(self, data, lang):
+        """Return a fragment with absolute links, hyphenated if needed."""
+        try:
+            document = lxml.html.fragment_fromstring(data, "body")
+        except lxml.etree.ParserError as e:
+            # if we don't catch this, it breaks later (Issue #374)
+            if str(e) == "Document is empty":
+                return ""
+            # let other errors raise
+            raise(e)
+        base_url = self.permalink(lang=lang)
+        document.make_links_absolute(base_url)
+
+        if self.hyphenate:
+            hyphenate(document, lang)
+
+        try:
+            return lxml.html.tostring(document.body, encoding='unicode')
+        except:
+            return lxml.html.tostring(document, encoding='unicode')
+
     def text(self, lang=None, teaser_only=False, strip_html=False, show_read_more_link=True,
              feed_read_more_link=False, feed_links_append_query=None):
         """Read the post file for that language and return its contents.
@@ -616,24 +691,15 @@ class Post(object):
 
         if self.compiler.extension() == '.php':
             return data
-        try:
-            document = lxml.html.fragment_fromstring(data, "body")
-        except lxml.etree.ParserError as e:
-            # if we don't catch this, it breaks later (Issue #374)
-            if str(e) == "Document is empty":
-                return ""
-            # let other errors raise
-            raise(e)
-        base_url = self.permalink(lang=lang)
-        document.make_links_absolute(base_url)
-
         if self.hyphenate:
-            hyphenate(document, lang)
-
-        try:
-            data = lxml.html.tostring(document.body, encoding='unicode')
-        except:
-            data = lxml.html.tostring(document, encoding='unicode')
+            # Hyphenating is slow, so each fragment is only hyphenated once
+            fragment, hyphenated = self._hyphenated_fragments.get(lang, (None, None))
+            if fragment != data:
+                hyphenated = self._absolute_fragment(data, lang)
+                self._hyphenated_fragments[lang] = (data, hyphenated)
+            data = hyphenated
+        else:
+            data = self._absolute_fragment(data, lang)
 
         if teaser_only:
             teaser_regexp = self.config.get('TEASER_REGEXP', TEASER_REGEXP)
@@ -1108,40 +1174,96 @@ def get_meta(post, file_metadata_regexp=None, unslugify_titles=False, lang=None)
     return meta, newstylemeta
 
 
-def hyphenate(dom, _lang):
-    """Hyphenate a post."""
+# Elements whose text is hyphenated, and children that prevent it
+HYPHENATE_TAGS = ('p', 'li', 'span')
+HYPHENATE_SKIP_TAGS = ('kbd', 'code', 'samp', 'mark', 'math', 'data', 'ruby', 'svg')
+
+
+class CachingHyphenator(object):
+    """Hyphenate words with Pyphen, remembering the words already seen.
+
+    The same words appear over and over in a site (and each post is shown
+    in several places), so up to ``max_words`` hyphenated words are kept.
+    """
+
+    max_words = 100000
+
+    def __init__(self, lang):
+        """Create a hyphenator for a Pyphen language."""
+        self.pyphen = pyphen.Pyphen(lang=lang)
+        self.words = {}
+
+    def inserted(self, word, hyphen='\u00AD'):
+        """Return word with hyphens inserted, like ``Pyphen.inserted``."""
+        try:
+            return self.words[word, hyphen]
+        except KeyError:
+            if len(self.words) >= self.max_words:
+                self.words.clear()
+            result = self.words[word, hyphen] = self.pyphen.inserted(word, hyphen=hyphen)
+            return result
+
+
+# Hyphenators by Pyphen language (None if there is no dictionary)
+_hyphenators = {}
+
+
+def get_hyphenator(_lang):
+    """Return the (shared) hyphenator for a language, or None."""
     # circular import prevention
     from .nikola import LEGAL_VALUES
-    lang = None
-    if pyphen is not None:
-        lang = LEGAL_VALUES['PYPHEN_LOCALES'].get(_lang, pyphen.language_fallback(_lang))
-    else:
+    if pyphen is None:
         utils.req_missing(['pyphen'], 'hyphenate texts', optional=True)
-    hyphenator = None
-    if pyphen is not None and lang is not None:
+        return None
+    lang = LEGAL_VALUES['PYPHEN_LOCALES'].get(_lang, pyphen.language_fallback(_lang))
+    if lang is None:
         # If pyphen does exist, we tell the user when configuring the site.
         # If it does not support a language, we ignore it quietly.
+        return None
+    if lang not in _hyphenators:
         try:
-            hyphenator = pyphen.Pyphen(lang=lang)
+            _hyphenators[lang] = CachingHyphenator(lang)
         except KeyError:
             LOGGER.error("Cannot find hyphenation dictoniaries for {0} (from {1}).".format(lang, _lang))
             LOGGER.error("Pyphen cannot be installed to ~/.local (pip install --user).")
+            _hyphenators[lang] = None
+    return _hyphenators[lang]
+
+
+def hyphenate(dom, _lang):
+    """Hyphenate a post."""
+    hyphenator = get_hyphenator(_lang)
     if hyphenator is not None:
-        for tag in ('p', 'li', 'span'):
-            for node in dom.xpath("//%s[not(parent::pre)]" % tag):
-                skip_node = False
-                skippable_nodes = ['kbd', 'code', 'samp', 'mark', 'math', 'data', 'ruby', 'svg']
-                if node.getchildren():
-                    for child in node.getchildren():
-                        if child.tag in skippable_nodes or (child.tag == 'span' and 'math' in child.get('class', [])):
-                            skip_node = True
-                elif 'math' in node.get('class', []):
-                    skip_node = True
-                if not skip_node:
-                    insert_hyphens(node, hyphenator)
+        _hyphenate_tree(dom, hyphenator)
     return dom
 
 
+def _should_hyphenate(node):
+    """Check if a node (and everything in it) should be hyphenated."""
+    if node.tag not in HYPHENATE_TAGS:
+        return False
+    parent = node.getparent()
+    if parent is not None and parent.tag == 'pre':
+        return False
+    children = node.getchildren()
+    if children:
+        for child in children:
+            if child.tag in HYPHENATE_SKIP_TAGS or (child.tag == 'span' and 'math' in child.get('class', [])):
+                return False
+    elif 'math' in node.get('class', []):
+        return False
+    return True
+
+
+def _hyphenate_tree(node, hyphenator):
+    """Hyphenate the nodes which should be, walking the tree once."""
+    if _should_hyphenate(node):
+        insert_hyphens(node, hyphenator)
+    else:
+        for child in node.iterchildren():
+            _hyphenate_tree(child, hyphenator)
+
+
 def insert_hyphens(node, hyphenator):
     """Insert hyphens into a node."""
     textattrs = ('text', 'tail')
@@ -1152,13 +1274,9 @@ def insert_hyphens(node, hyphenator):
         text = getattr(node, attr)
         if not text:
             continue
+        # Splitting on spaces keeps them (as empty words)
         new_data = ' '.join([hyphenator.inserted(w, hyphen='\u00AD')
                              for w in text.split(' ')])
-        # Spaces are trimmed, we have to add them manually back
-        if text[0].isspace():
-            new_data = ' ' + new_data
-        if text[-1].isspace():
-            new_data += ' '
         setattr(node, attr, new_data)
 
     for child in node.iterchildren():
@@ -27,8 +27,14 @@
 """Support for Hugo-style shortcodes."""
 
 from __future__ import unicode_literals
-from .utils import LOGGER
+from .utils import LOGGER, makedirs
+import hashlib
+import io
+import json
+import os
+import shutil
 import sys
+import tempfile
 
 
 # Constants
@@ -43,6 +49,85 @@ class ParsingError(Exception):
     pass
 
 
+def _code_digest(code, digest):
+    """Feed what a code object does (but not where it is) into digest."""
+    digest.update(code.co_code)
+    digest.update(repr((code.co_names, code.co_varnames, code.co_freevars)).encode('utf-8'))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _code_digest(const, digest)
+        elif isinstance(const, frozenset):
+            digest.update(repr(sorted(const, key=repr)).encode('utf-8'))
+        else:
+            digest.update(repr(const).encode('utf-8'))
+
+
+def shortcode_version(f):
+    """Return a string identifying the implementation of a pure shortcode.
+
+    Shortcode functions that only depend on their arguments can be marked
+    with a ``nikola_shortcode_pure`` attribute. If it is a string, it is
+    used as the version; if it is ``True``, the version is derived from
+    the code of the function. Returns None for other shortcodes.
+    """
+    pure = getattr(f, 'nikola_shortcode_pure', None)
+    if not pure:
+        return None
+    if pure is not True:
+        return pure
+    code = getattr(f, '__code__', None)
+    if code is None:
+        return '{0}.{1}'.format(getattr(f, '__module__', ''), type(f).__name__)
+    digest = hashlib.sha1()
+    _code_digest(code, digest)
+    return digest.hexdigest()[:16]
+
+
+class ShortcodeCache(object):
+    """Cache for the output of pure shortcodes.
+
+    Output is kept in memory, and in ``cache_folder`` (one file per entry)
+    if one is given, so later builds can use it too.
+    """
+
+    def __init__(self, cache_folder=None):
+        """Create the cache, optionally backed by cache_folder."""
+        self.cache_folder = cache_folder
+        self.memory = {}
+
+    @staticmethod
+    def key(name, version, args, kw):
+        """Return the cache key for a shortcode call."""
+        kw = sorted((k, v) for k, v in kw.items() if k != 'site')
+        return hashlib.sha1(json.dumps([name, version, list(args), kw]).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_folder, key[:2], key[2:] + '.html')
+
+    def get(self, key):
+        """Return the cached output for key, or None."""
+        if key in self.memory:
+            return self.memory[key]
+        if self.cache_folder:
+            try:
+                with io.open(self._path(key), 'r', encoding='utf-8', newline='') as inf:
+                    value = self.memory[key] = inf.read()
+                return value
+            except (IOError, OSError):
+                pass
+        return None
+
+    def set(self, key, value):
+        """Store the output for key."""
+        self.memory[key] = value
+        if self.cache_folder:
+            path = self._path(key)
+            makedirs(os.path.dirname(path))
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as outf:
+                outf.write(value.encode('utf-8'))
+            shutil.move(outf.name, path)
+
+
 def _format_position(data, pos):
     """Return position formatted as line/column.
 
@@ -214,13 +299,12 @@ def _split_shortcodes(data):
 
     Returns a list of tuples of the following forms:
 
-        1. (_TEXT, text)
-        2. (_SHORTCODE_START, text, start, name, args)
-        3. (_SHORTCODE_END, text, start, name)
+        1. (_TEXT, start, end)
+        2. (_SHORTCODE_START, start, end, name, args)
+        3. (_SHORTCODE_END, start, end, name)
 
-    Here, text is the raw text represented by the token; start is the starting position in data
-    of the token; name is the name of the shortcode; and args is a tuple (args, kw) as returned
-    by _parse_shortcode_args.
+    Here, data[start:end] is the raw text represented by the token; name is the name of the
+    shortcode; and args is a tuple (args, kw) as returned by _parse_shortcode_args.
     """
     pos = 0
     result = []
@@ -228,9 +312,9 @@ def _split_shortcodes(data):
         # Search for shortcode start
         start = data.find('{{%', pos)
         if start < 0:
-            result.append((_TEXT, data[pos:]))
+            result.append((_TEXT, pos, len(data)))
             break
-        result.append((_TEXT, data[pos:start]))
+        result.append((_TEXT, pos, start))
         # Extract name
         name_start = _skip_whitespace(data, start + 3)
         name_end = _skip_nonwhitespace(data, name_start)
@@ -246,17 +330,44 @@ def _split_shortcodes(data):
             # Must be followed by '%}}'
             if pos > len(data) or data[end_start:pos] != '%}}':
                 raise ParsingError("Syntax error: '{{{{% /{0}' must be followed by ' %}}}}' ({1})!".format(name, _format_position(data, end_start)))
-            result.append((_SHORTCODE_END, data[start:pos], start, name))
+            result.append((_SHORTCODE_END, start, pos, name))
         elif name == '%}}':
             raise ParsingError("Syntax error: '{{{{%' must be followed by shortcode name ({0})!".format(_format_position(data, start)))
         else:
             # This is an opening shortcode
             pos, args = _parse_shortcode_args(data, name_end, shortcode_name=name, start_pos=start)
-            result.append((_SHORTCODE_START, data[start:pos], start, name, args))
+            result.append((_SHORTCODE_START, start, pos, name, args))
     return result
 
 
-def apply_shortcodes(data, registry, site=None, filename=None, raise_exceptions=False, lang=None):
+def _match_shortcodes(sc_data):
+    """Find the ending of each shortcode start in a list returned by _split_shortcodes.
+
+    The ending of a shortcode is the first ending with the same name after it.
+    Returns a list which has, for every shortcode start, the index of its
+    ending, or None, and the list of the indexes of the shortcode starts
+    whose data contains another start with the same name (nesting
+    shortcodes with the same name is not supported).  This is done in a
+    single pass from the end, remembering the last ending and start seen for
+    every name.
+    """
+    endings = [None] * len(sc_data)
+    nested = []
+    next_ending = {}
+    next_start = {}
+    for pos in range(len(sc_data) - 1, -1, -1):
+        current = sc_data[pos]
+        if current[0] == _SHORTCODE_END:
+            next_ending[current[3]] = pos
+        elif current[0] == _SHORTCODE_START:
+            ending = endings[pos] = next_ending.get(current[3])
+            if ending is not None and next_start.get(current[3], ending) < ending:
+                nested.append(pos)
+            next_start[current[3]] = pos
+    return endings, nested[::-1]
+
+
+def apply_shortcodes(data, registry, site=None, filename=None, raise_exceptions=False, lang=None, cache=None, pure_used=None):
     """Apply Hugo-style shortcodes on data.
 
     {{% name parameters %}} will end up calling the registered "name" function with the given parameters.
@@ -268,6 +379,10 @@ def apply_shortcodes(data, registry, site=None, filename=None, raise_exceptions=
 
     The site parameter is passed with the same name to the shortcodes so they can access Nikola state.
 
+    If a ShortcodeCache is given as cache, the output of pure shortcodes (see shortcode_version)
+    is taken from it, or stored in it. The names of the pure shortcodes found are added to the
+    pure_used set, if given.
+
     >>> print(apply_shortcodes('==> {{% foo bar=baz %}} <==', {'foo': lambda *a, **k: k['bar']}))
     ==> baz <==
     >>> print(apply_shortcodes('==> {{% foo bar=baz %}}some data{{% /foo %}} <==', {'foo': lambda *a, **k: k['bar']+k['data']}))
@@ -277,30 +392,26 @@ def apply_shortcodes(data, registry, site=None, filename=None, raise_exceptions=
     try:
         # Split input data into text, shortcodes and shortcode endings
         sc_data = _split_shortcodes(data)
+        endings, nested = _match_shortcodes(sc_data)
+        for pos in nested:
+            LOGGER.error("Shortcode '{0}' (started at {1}) contains another '{0}' shortcode, which is not supported: "
+                         "it ends at the first '{{{{% /{0} %}}}}'.", sc_data[pos][3], _format_position(data, sc_data[pos][1]))
         # Now process data
         result = []
         pos = 0
         while pos < len(sc_data):
             current = sc_data[pos]
             if current[0] == _TEXT:
-                result.append(current[1])
+                result.append(data[current[1]:current[2]])
                 pos += 1
             elif current[0] == _SHORTCODE_END:
-                raise ParsingError("Found shortcode ending '{{{{% /{0} %}}}}' which isn't closing a started shortcode ({1})!".format(current[3], _format_position(data, current[2])))
+                raise ParsingError("Found shortcode ending '{{{{% /{0} %}}}}' which isn't closing a started shortcode ({1})!".format(current[3], _format_position(data, current[1])))
             elif current[0] == _SHORTCODE_START:
                 name = current[3]
-                # Check if we can find corresponding ending
-                found = None
-                for p in range(pos + 1, len(sc_data)):
-                    if sc_data[p][0] == _SHORTCODE_END and sc_data[p][3] == name:
-                        found = p
-                        break
+                found = endings[pos]
                 if found:
                     # Found ending. Extract data argument:
-                    data_arg = []
-                    for p in range(pos + 1, found):
-                        data_arg.append(sc_data[p][1])
-                    data_arg = empty_string.join(data_arg)
+                    data_arg = data[current[2]:sc_data[found][1]]
                     pos = found + 1
                 else:
                     # Single shortcode
@@ -314,9 +425,20 @@ def apply_shortcodes(data, registry, site=None, filename=None, raise_exceptions=
                     f = registry[name]
                     if getattr(f, 'nikola_shortcode_pass_filename', None):
                         kw['filename'] = filename
-                    res = f(*args, **kw)
+                    version = shortcode_version(f) if cache is not None or pure_used is not None else None
+                    if version is None:
+                        res = f(*args, **kw)
+                    else:
+                        if pure_used is not None:
+                            pure_used.add(name)
+                        key = ShortcodeCache.key(name, version, args, kw)
+                        res = cache.get(key) if cache is not None else None
+                        if res is None:
+                            res = f(*args, **kw)
+                            if cache is not None and isinstance(res, type('')):
+                                cache.set(key, res)
                 else:
-                    LOGGER.error('Unknown shortcode {0} (started at {1})', name, _format_position(data, current[2]))
+                    LOGGER.error('Unknown shortcode {0} (started at {1})', name, _format_position(data, current[1]))
                     res = ''
                 result.append(res)
         return empty_string.join(result)
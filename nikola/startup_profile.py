@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2012-2016 Roberto Alsina and others.
+
+# Permission is hereby granted, free of charge, to any
+# person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the
+# Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the
+# Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice
+# shall be included in all copies or substantial portions of
+# the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY
+# KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE
+# WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS
+# OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+# OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+# OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Measure where the time goes while Nikola starts.
+
+Enabled with ``nikola --profile-startup`` (print a report) or
+``nikola --profile-startup=FILE.json`` (write the timings as JSON).
+"""
+
+from __future__ import print_function, unicode_literals
+from contextlib import contextmanager
+import json
+import sys
+import time
+
+__all__ = ['PROFILER', 'StartupProfiler']
+
+
+class StartupProfiler(object):
+    """Record how long startup phases, plugin imports and plugin activations take.
+
+    Records are (kind, name, seconds) tuples.  Phases may contain other
+    phases, imports and activations, so times do not add up to the total.
+    """
+
+    def __init__(self):
+        """Create a disabled profiler, remembering when Nikola started importing."""
+        self.enabled = False
+        self.started = time.time()
+        self.records = []
+
+    def record(self, kind, name, seconds):
+        """Record that something took some time."""
+        if self.enabled:
+            self.records.append((kind, name, seconds))
+
+    @contextmanager
+    def timed(self, kind, name):
+        """Record how long the block inside the with statement takes."""
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.records.append((kind, name, time.time() - start))
+
+    def total(self):
+        """Return the time since Nikola started importing."""
+        return time.time() - self.started
+
+    def report(self, stream=None):
+        """Print all records, slowest first."""
+        stream = stream or sys.stderr
+        print("Startup profile, {0:.3f}s in total:".format(self.total()), file=stream)
+        for kind, name, seconds in sorted(self.records, key=lambda r: -r[2]):
+            print("{0:9.3f}s  {1:<9} {2}".format(seconds, kind, name), file=stream)
+
+    def dump(self, path):
+        """Write all records, in the order they happened, to a JSON file."""
+        data = {
+            'total': self.total(),
+            'records': [{'kind': kind, 'name': name, 'seconds': seconds} for kind, name, seconds in self.records],
+        }
+        with open(path, 'wb') as outf:
+            outf.write(json.dumps(data, indent=2, sort_keys=True).encode('utf-8'))
+
+
+PROFILER = StartupProfiler()
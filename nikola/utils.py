@@ -43,6 +43,7 @@ import shutil
 import socket
 import subprocess
 import sys
+import tempfile
 import dateutil.parser
 import dateutil.tz
 import logbook
@@ -54,6 +55,10 @@ except ImportError:
     from urllib.parse import quote as urlquote  # NOQA
     from urllib.parse import unquote as urlunquote  # NOQA
     from urllib.parse import urlparse, urlunparse  # NOQA
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # NOQA
 import warnings
 import PyRSS2Gen as rss
 from collections import defaultdict, Callable, OrderedDict
@@ -70,7 +75,7 @@ from doit.cmdparse import CmdParse
 from nikola import DEBUG
 
 __all__ = ('CustomEncoder', 'get_theme_path', 'get_theme_chain', 'load_messages', 'copy_tree',
-           'copy_file', 'slugify', 'unslugify', 'to_datetime', 'apply_filters',
+           'copy_file', 'COPY_FILES_MODES', 'unshare_file', 'slugify', 'unslugify', 'to_datetime', 'apply_filters',
            'config_changed', 'get_crumbs', 'get_tzname', 'get_asset_path',
            '_reload', 'unicode_str', 'bytes_str', 'unichr', 'Functionary',
            'TranslatableSetting', 'TemplateHookRegistry', 'LocaleBorg',
@@ -138,10 +143,10 @@ USE_SLUGIFY = True
 
 redirect_logging()
 
-if DEBUG:
-    logging.basicConfig(level=logging.DEBUG)
-else:
-    logging.basicConfig(level=logging.INFO)
+# basicConfig() does nothing once logging is redirected, so set the level
+# directly. Otherwise every debug message (yapsy sends thousands while
+# loading plugins) is created and formatted, only to be dropped by logbook.
+logging.getLogger().setLevel(logging.DEBUG if DEBUG else logging.INFO)
 
 
 def showwarning(message, category, filename, lineno, file=None, line=None):
@@ -674,7 +679,7 @@ def load_messages(themes, translations, default_lang):
     return messages
 
 
-def copy_tree(src, dst, link_cutoff=None):
+def copy_tree(src, dst, link_cutoff=None, mode='copy'):
     """Copy a src tree to the dst folder.
 
     Example:
@@ -688,6 +693,8 @@ def copy_tree(src, dst, link_cutoff=None):
     if link_cutoff is set, then the links pointing at things
     *inside* that folder will stay as links, and links
     pointing *outside* that folder will be copied.
+
+    mode is one of COPY_FILES_MODES, see copy_file.
     """
     ignore = set(['.svn'])
     base_len = len(src.split(os.sep))
@@ -706,13 +713,32 @@ def copy_tree(src, dst, link_cutoff=None):
                 'name': dst_file,
                 'file_dep': [src_file],
                 'targets': [dst_file],
-                'actions': [(copy_file, (src_file, dst_file, link_cutoff))],
+                'actions': [(copy_file, (src_file, dst_file, link_cutoff, mode))],
                 'clean': True,
             }
 
 
-def copy_file(source, dest, cutoff=None):
-    """Copy a file from source to dest. If link target starts with `cutoff`, symlinks are used."""
+COPY_FILES_MODES = ('copy', 'hardlink', 'reflink', 'auto')
+
+# The FICLONE ioctl, from linux/fs.h
+FICLONE = 0x40049409
+
+
+def copy_file(source, dest, cutoff=None, mode='copy'):
+    """Copy a file from source to dest. If link target starts with `cutoff`, symlinks are used.
+
+    mode decides how the contents are copied:
+
+    * ``copy``: through ``shutil.copy2``
+    * ``hardlink``: make dest a hard link to source, if possible
+    * ``reflink``: make dest a copy-on-write clone of source, if the
+      file system supports it
+    * ``auto``: try a clone, then ``os.copy_file_range``, then a hard link
+
+    All of them copy the file as usual if they can't be used.  Except in
+    ``copy`` mode, which always copies, dest is kept if it already has the
+    size and modification time of source.
+    """
     dst_dir = os.path.dirname(dest)
     makedirs(dst_dir)
     if os.path.islink(source):
@@ -722,16 +748,103 @@ def copy_file(source, dest, cutoff=None):
         # link itself.
         if cutoff is None or not link_target.startswith(cutoff):
             # We copy
-            shutil.copy2(source, dest)
+            _copy_file_data(source, dest, mode)
         else:
             # We link
             if os.path.exists(dest) or os.path.islink(dest):
                 os.unlink(dest)
             os.symlink(os.readlink(source), dest)
+    else:
+        _copy_file_data(source, dest, mode)
+
+
+def _copy_file_data(source, dest, mode):
+    """Put the contents of source in dest, using the given copy mode."""
+    if _is_copy(source, dest, mode):
+        return
+    if os.path.lexists(dest):
+        os.unlink(dest)
+    if mode in ('reflink', 'auto') and _reflink(source, dest):
+        shutil.copystat(source, dest)
+    elif mode == 'auto' and _copy_file_range(source, dest):
+        shutil.copystat(source, dest)
+    elif mode in ('hardlink', 'auto') and _hardlink(source, dest):
+        pass
     else:
         shutil.copy2(source, dest)
 
 
+def _is_copy(source, dest, mode):
+    """Tell whether dest is already a copy of source, by size and modification time."""
+    if mode == 'copy':
+        # Contents may change without changing either
+        return False
+    try:
+        src_stat = os.stat(source)
+        dst_stat = os.lstat(dest)
+    except OSError:
+        return False
+    if os.path.samestat(src_stat, dst_stat):
+        # A hard link is only fine if we are allowed to make them
+        return mode in ('hardlink', 'auto')
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime == dst_stat.st_mtime
+
+
+def _reflink(source, dest):
+    """Clone source into dest, returning False if the file system can't."""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open(source, 'rb') as inf, open(dest, 'wb') as outf:
+            fcntl.ioctl(outf.fileno(), FICLONE, inf.fileno())
+    except (IOError, OSError):
+        if os.path.exists(dest):
+            os.unlink(dest)
+        return False
+    return True
+
+
+def _copy_file_range(source, dest):
+    """Copy source to dest inside the kernel, returning False if that can't be done."""
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    try:
+        with open(source, 'rb') as inf, open(dest, 'wb') as outf:
+            remaining = os.fstat(inf.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(inf.fileno(), outf.fileno(), remaining)
+                if not copied:
+                    break
+                remaining -= copied
+    except OSError:
+        if os.path.exists(dest):
+            os.unlink(dest)
+        return False
+    return True
+
+
+def _hardlink(source, dest):
+    """Hard link source to dest, returning False if that can't be done."""
+    if not hasattr(os, 'link'):
+        return False
+    try:
+        # Link to the file, not to a symlink pointing to it
+        os.link(os.path.realpath(source), dest)
+    except OSError:
+        return False
+    return True
+
+
+def unshare_file(path):
+    """Give a hard-linked file its own copy of the contents, before changing it in place."""
+    if os.stat(path).st_nlink > 1:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.' + os.path.basename(path))
+        os.close(fd)
+        shutil.copy2(path, tmp)
+        os.unlink(path)
+        os.rename(tmp, path)
+
+
 def remove_file(source):
     """Remove file or directory."""
     if os.path.isdir(source):
@@ -909,10 +1022,13 @@ def apply_filters(task, filters, skip_ext=None):
             for action in filter_:
                 def unlessLink(action, target):
                     if not os.path.islink(target):
+                        # Filters must not change the source of a hard link
+                        unshare_file(target)
                         if isinstance(action, Callable):
                             action(target)
                         else:
-                            subprocess.check_call(action % target, shell=True)
+                            key = [action, task_filters.tool_version(action.split()[0])]
+                            task_filters.run_cached(key, target, lambda target: subprocess.check_call(action % target, shell=True))
 
                 task['actions'].append((unlessLink, (action, target)))
     return task
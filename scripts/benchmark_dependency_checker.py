@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how long checking big file dependencies takes.
+
+Creates a tree of big files (by default, 40 files of 25 MB) and times
+doit's MD5 checker and Nikola's "stat" checker when saving their state,
+when checking unchanged files, and when checking files whose modification
+times changed (as after a checkout or a restore), in that build and in
+the next one.
+
+$ benchmark_dependency_checker.py [--files N] [--size MB] [--folder PATH]
+"""
+
+from __future__ import print_function, unicode_literals
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from nikola.dependency_checker import checker_class
+
+
+def timed(f, paths):
+    """Call f for each path, returning the results and the time it took."""
+    start = time.time()
+    results = [f(path) for path in paths]
+    return results, time.time() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--size', type=int, default=25, help='size of each file, in MB')
+    parser.add_argument('--folder', help='where to create the files (a temporary folder by default)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(dir=args.folder)
+    try:
+        paths = []
+        chunk = os.urandom(1024 * 1024)
+        for i in range(args.files):
+            path = os.path.join(tmpdir, 'video-{0}.bin'.format(i))
+            with io.open(path, 'wb') as outf:
+                for _ in range(args.size):
+                    outf.write(chunk)
+            paths.append(path)
+        print("{0} files of {1} MB".format(args.files, args.size))
+
+        for mode in ('md5', 'stat'):
+            make_checker = checker_class({'copy_files': mode}, [('copy_files:output', paths)], os.path.join(tmpdir, mode))
+            checker = make_checker()
+            states, save_time = timed(lambda path: checker.get_state(path, None), paths)
+            states = dict(zip(paths, states))
+            _, check_time = timed(lambda path: checker.check_modified(path, os.stat(path), states[path]), paths)
+            for path in paths:
+                os.utime(path, None)
+            _, touched_time = timed(lambda path: checker.check_modified(path, os.stat(path), states[path]), paths)
+            checker.hashes.save()
+            checker = make_checker()
+            _, next_time = timed(lambda path: checker.check_modified(path, os.stat(path), states[path]), paths)
+            print("{0:<5} save: {1:.3f}s  unchanged: {2:.3f}s  touched: {3:.3f}s  next build: {4:.3f}s".format(
+                mode, save_time, check_time, touched_time, next_time))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
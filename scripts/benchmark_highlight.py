@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how fast listings and code blocks are highlighted.
+
+Highlights many Python snippets (by default, 2000) like listings and reST
+code blocks are, first with an empty cache, then with the cache filled
+by the first run.
+
+$ benchmark_highlight.py [--snippets N]
+"""
+
+from __future__ import print_function, unicode_literals
+import argparse
+import inspect
+import shutil
+import tempfile
+import time
+import uuid
+
+from nikola import nikola as nikola_module
+from nikola.highlight import Highlighter
+from nikola.utils import LocaleBorg
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--snippets', type=int, default=2000)
+    args = parser.parse_args()
+
+    LocaleBorg.initialize({'en': ''}, 'en')
+    source = inspect.getsource(nikola_module).splitlines()
+    snippets = []
+    for i in range(args.snippets):
+        first = (i * 20) % (len(source) - 40)
+        snippets.append('# Snippet {0}\n'.format(i) + '\n'.join(source[first:first + 40]))
+    cache_folder = tempfile.mkdtemp()
+    try:
+        highlighter = Highlighter(cache_folder)
+        lexer = highlighter.lexer_by_name('python')
+        for run in ('cold', 'warm'):
+            start = time.time()
+            for snippet in snippets:
+                highlighter.highlight(snippet, lexer, 'rest_code_' + uuid.uuid4().hex, linenos=False)
+            print("{0} {1} snippets: {2:.3f}s".format(run, args.snippets, time.time() - start))
+    finally:
+        shutil.rmtree(cache_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how fast Markdown posts are compiled.
+
+Compiles many small Markdown posts (by default, 5000) with the Markdown
+compiler plugin, using the extensions from the default configuration.
+
+$ benchmark_markdown.py [--posts N] [--runs N]
+"""
+
+from __future__ import print_function, unicode_literals
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from nikola.nikola import Nikola
+
+POST = '''\
+Post {0}
+========
+
+Some *emphasis*, a [link][{0}] and `inline code`.
+
+* an item
+* another item
+
+```python
+def post_{0}():
+    return {0}
+```
+
+| Post | Number |
+|------|--------|
+| this | {0}    |
+
+[{0}]: https://example.com/{0}
+'''
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        sources = []
+        for i in range(args.posts):
+            source = os.path.join(tmpdir, 'post-{0}.md'.format(i))
+            with io.open(source, 'w', encoding='utf-8') as outf:
+                outf.write(POST.format(i))
+            sources.append(source)
+
+        site = Nikola()
+        site.config['COMPILERS'] = {'markdown': ['.md']}
+        site.config['MARKDOWN_EXTENSIONS'] = ['fenced_code', 'codehilite', 'extra']
+        site.init_plugins()
+        compiler = site.compilers['markdown']
+        times = []
+        for _ in range(args.runs):
+            start = time.time()
+            for source in sources:
+                compiler.compile_html(source, source[:-3] + '.html')
+            times.append(time.time() - start)
+        print("{0} posts: {1:.3f}s (best of {2})".format(args.posts, min(times), args.runs))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
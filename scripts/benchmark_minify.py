@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how fast HTML files are minified.
+
+Runs the lxml_minify and html5lib_minify filters on copies of all HTML
+files in a folder (by default, the output folder of the site in the
+current directory), and reports the time taken and the size of the
+results.
+
+$ benchmark_minify.py [--runs N] [folder]
+"""
+
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from nikola import filters
+
+MINIFIERS = ('lxml_minify', 'html5lib_minify')
+
+
+def html_files(folder):
+    """Return the paths of all HTML files in a folder."""
+    return [os.path.join(root, name)
+            for root, dirs, files in os.walk(folder)
+            for name in files if name.endswith('.html')]
+
+
+def run(minifier, sources, tmpdir):
+    """Minify copies of sources, returning the time taken and total size."""
+    copies = []
+    for i, source in enumerate(sources):
+        copies.append(os.path.join(tmpdir, '{0}.html'.format(i)))
+        shutil.copyfile(source, copies[-1])
+    start = time.time()
+    for path in copies:
+        minifier(path)
+    return time.time() - start, sum(os.stat(path).st_size for path in copies)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', nargs='?', default='output')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    sources = html_files(args.folder)
+    size = sum(os.stat(path).st_size for path in sources)
+    print("{0} files, {1} bytes".format(len(sources), size))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in MINIFIERS:
+            try:
+                results = [run(getattr(filters, name), sources, tmpdir) for _ in range(args.runs)]
+            except ImportError as e:
+                print("{0:<16} skipped ({1})".format(name, e))
+                continue
+            print("{0:<16} {1:>8.3f}s {2:>10} bytes (best of {3})".format(
+                name, min(t for t, _ in results), results[0][1], args.runs))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
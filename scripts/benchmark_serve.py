@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure the throughput of `nikola serve`.
+
+Serves a folder (by default, the `output` folder of the site in the
+current directory) in a background thread, and requests all of its files
+from several concurrent clients with keep-alive connections.
+
+$ benchmark_serve.py [folder] [--clients N] [--duration SECONDS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import threading
+import time
+
+import requests
+
+from nikola.plugins.command.serve import ThreadedHTTPServer, OurHTTPRequestHandler
+
+
+def client(base, paths, deadline, results, accept_encoding):
+    """Request paths in a loop until the deadline, recording requests and bytes."""
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = accept_encoding
+    count = 0
+    size = 0
+    errors = 0
+    while time.time() < deadline:
+        for path in paths:
+            resp = session.get(base + path)
+            if resp.status_code != 200:
+                errors += 1
+            count += 1
+            size += len(resp.content)
+            if time.time() >= deadline:
+                break
+    results.append((count, size, errors))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', nargs='?', default='output')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--accept-encoding', default='gzip, br')
+    args = parser.parse_args()
+
+    os.chdir(args.folder)
+    paths = []
+    for root, dirs, files in os.walk('.'):
+        for name in files:
+            if not name.endswith(('.gz', '.br')):
+                paths.append(os.path.relpath(os.path.join(root, name), '.').replace(os.sep, '/'))
+    paths.sort()
+    if not paths:
+        print("Nothing to serve in {0}".format(args.folder))
+        return 1
+
+    OurHTTPRequestHandler.quiet = True
+    httpd = ThreadedHTTPServer(('127.0.0.1', 0), OurHTTPRequestHandler)
+    server = threading.Thread(target=httpd.serve_forever)
+    server.daemon = True
+    server.start()
+    base = 'http://127.0.0.1:{0}/'.format(httpd.server_address[1])
+
+    results = []
+    deadline = time.time() + args.duration
+    start = time.time()
+    clients = [threading.Thread(target=client, args=(base, paths[i::args.clients] or paths, deadline, results, args.accept_encoding))
+               for i in range(args.clients)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    elapsed = time.time() - start
+    httpd.shutdown()
+
+    count = sum(r[0] for r in results)
+    size = sum(r[1] for r in results)
+    errors = sum(r[2] for r in results)
+    print("{0} files, {1} clients, {2:.1f}s".format(len(paths), args.clients, elapsed))
+    print("{0} requests ({1} errors), {2:.1f} requests/s, {3:.2f} MB/s".format(
+        count, errors, count / elapsed, size / elapsed / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how fast templated shortcodes are applied.
+
+Applies the shortcodes of a post with many templated shortcode
+invocations (by default, 1000), with the Mako and Jinja template systems.
+
+$ benchmark_shortcodes.py [--invocations N] [--runs N]
+"""
+
+from __future__ import print_function, unicode_literals
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from pkg_resources import resource_filename
+
+from nikola.plugins.template.jinja import JinjaTemplates
+from nikola.plugins.template.mako import MakoTemplates
+from nikola.shortcodes import apply_shortcodes
+
+BADGES = {
+    'mako': '<span class="badge badge-${kind}">${data}</span>',
+    'jinja': '<span class="badge badge-{{ kind }}">{{ data }}</span>',
+}
+
+
+def make_renderfunc(template_system, t_data):
+    """Return a shortcode function rendering a template, like Nikola does."""
+    def render_shortcode(*args, **kw):
+        kw['_args'] = args
+        return template_system.render_template_to_string(t_data, kw)
+    return render_shortcode
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invocations', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    post = '\n\n'.join(
+        'Paragraph {0} {{{{% raw %}}}}<b>raw {0}</b>{{{{% /raw %}}}} and '
+        '{{{{% badge kind=info %}}}}badge {0}{{{{% /badge %}}}}'.format(i)
+        for i in range(args.invocations // 2))
+
+    cache_folder = tempfile.mkdtemp()
+    try:
+        for template_system in (MakoTemplates(), JinjaTemplates()):
+            template_system.set_directories([], cache_folder)
+            with io.open(resource_filename('nikola', os.path.join('data', 'shortcodes', template_system.name, 'raw.tmpl')), encoding='utf-8') as inf:
+                raw = inf.read()
+            registry = {
+                'raw': make_renderfunc(template_system, raw),
+                'badge': make_renderfunc(template_system, BADGES[template_system.name]),
+            }
+            times = []
+            for _ in range(args.runs):
+                start = time.time()
+                apply_shortcodes(post, registry, raise_exceptions=True)
+                times.append(time.time() - start)
+            print("{0:<6} {1} invocations: {2:.3f}s (best of {3})".format(
+                template_system.name, args.invocations, min(times), args.runs))
+    finally:
+        shutil.rmtree(cache_folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how long common `nikola` commands take to start and finish.
+
+Runs each command several times in the site in the current directory,
+in a fresh interpreter every time, and reports the fastest and median
+wall-clock times.
+
+$ benchmark_startup.py [--runs N] [command ...]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    'version',
+    'new_post --available-formats',
+    'help',
+    'list',
+]
+
+
+def run(command):
+    """Run a nikola command once, returning its wall-clock time."""
+    start = time.time()
+    with open(os.devnull, 'wb') as devnull:
+        subprocess.check_call([sys.executable, '-m', 'nikola'] + command.split(), stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('commands', nargs='*', default=COMMANDS)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = min(run_python() for _ in range(args.runs))
+    print("{0:<32} {1:>8.3f}s".format('(python interpreter)', baseline))
+    for command in args.commands:
+        run(command)  # warm up caches (and the plugin index)
+        times = sorted(run(command) for _ in range(args.runs))
+        print("{0:<32} {1:>8.3f}s  (median {2:.3f}s)".format(command, times[0], times[len(times) // 2]))
+
+
+def run_python():
+    """Time an interpreter doing nothing."""
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', 'pass'])
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    main()
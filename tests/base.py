@@ -21,6 +21,7 @@ import logbook
 
 import nikola.utils
 import nikola.shortcodes
+import nikola.highlight
 nikola.utils.LOGGER.handlers.append(logbook.TestHandler())
 
 from yapsy.PluginManager import PluginManager
@@ -179,6 +180,7 @@ class FakeSite(object):
         })
         self.loghandlers = nikola.utils.STDERR_HANDLER  # TODO remove on v8
         self.shortcode_registry = {}
+        self.highlighter = nikola.highlight.Highlighter()
         self.plugin_manager.setPluginInfoExtension('plugin')
         if sys.version_info[0] == 3:
             places = [
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler  # NOQA
+
+from nikola.plugins.command.check import CommandCheck, RemoteLinkChecker, extract_links, _extract_links_if_changed
+
+
+class FakeRemoteHandler(BaseHTTPRequestHandler):
+    """A stand-in for remote servers, with a few canned responses."""
+
+    requests_seen = []
+
+    def _respond(self, body):
+        self.requests_seen.append((self.command, self.path))
+        if self.path == '/ok':
+            self.send_response(200)
+        elif self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/ok')
+        elif self.path == '/temporary':
+            self.send_response(302)
+            self.send_header('Location', '/missing')
+        elif self.path == '/no-head':
+            self.send_response(405 if self.command == 'HEAD' else 200)
+        else:
+            self.send_response(404)
+        self.send_header('Content-Length', '2' if body else '0')
+        self.end_headers()
+        if body:
+            self.wfile.write(b'ok')
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteLinkCheckerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), FakeRemoteHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base = 'http://127.0.0.1:{0}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, 'cache', 'check_remote_links.json')
+        del FakeRemoteHandler.requests_seen[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_checker(self, ttl=3600):
+        checker = RemoteLinkChecker(self.cache_path, ttl, threads=4, threads_per_host=2)
+        checker.retry_delay = 0
+        return checker
+
+    def test_statuses(self):
+        results = self.make_checker().check_all([
+            self.base + '/ok', self.base + '/missing', self.base + '/moved',
+            self.base + '/temporary', self.base + '/no-head'])
+        self.assertEqual(results[self.base + '/ok']['status'], 200)
+        self.assertEqual(results[self.base + '/ok']['redirect'], None)
+        self.assertEqual(results[self.base + '/missing']['status'], 404)
+        self.assertEqual(results[self.base + '/moved']['status'], 200)
+        self.assertEqual(results[self.base + '/moved']['redirect'], 301)
+        self.assertEqual(results[self.base + '/moved']['url'], self.base + '/ok')
+        self.assertEqual(results[self.base + '/temporary']['status'], 404)
+        self.assertEqual(results[self.base + '/temporary']['redirect'], 302)
+        # HEAD is refused, GET works
+        self.assertEqual(results[self.base + '/no-head']['status'], 200)
+
+    def test_unreachable(self):
+        server = HTTPServer(('127.0.0.1', 0), FakeRemoteHandler)
+        port = server.server_address[1]
+        server.server_close()
+        target = 'http://127.0.0.1:{0}/ok'.format(port)
+        result = self.make_checker().check_all([target])[target]
+        self.assertEqual(result['status'], None)
+        self.assertTrue(result['error'])
+
+    def test_cache(self):
+        targets = [self.base + '/ok', self.base + '/missing']
+        self.make_checker().check_all(targets)
+        seen = len(FakeRemoteHandler.requests_seen)
+        self.assertTrue(seen >= 2)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        # Within the TTL, a new checker does not touch the network
+        results = self.make_checker().check_all(targets)
+        self.assertEqual(len(FakeRemoteHandler.requests_seen), seen)
+        self.assertEqual(results[self.base + '/missing']['status'], 404)
+
+        # Expired entries are checked again
+        checker = self.make_checker(ttl=3600)
+        cached = checker._persistor.get('remote_links')
+        for entry in cached.values():
+            entry['checked'] -= 7200
+        checker._persistor.set('remote_links', cached)
+        checker.check_all(targets)
+        self.assertTrue(len(FakeRemoteHandler.requests_seen) > seen)
+
+    def test_no_cache(self):
+        checker = self.make_checker(ttl=0)
+        checker.check_all([self.base + '/ok'])
+        checker.check_all([self.base + '/ok'])
+        self.assertEqual(len(FakeRemoteHandler.requests_seen), 2)
+        self.assertFalse(os.path.exists(self.cache_path))
+
+
+class ExtractLinksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, 'index.html')
+        with open(self.fname, 'wb') as outf:
+            outf.write(b'<html><body><a href="foo.html">foo</a>'
+                       b'<img src="a.png" srcset="b.png 2x, c.png 3x"></body></html>')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_extract_links(self):
+        self.assertEqual(sorted(extract_links(self.fname)), ['a.png', 'b.png', 'c.png', 'foo.html'])
+        self.assertEqual(extract_links(os.path.join(self.tmpdir, 'foo.css'), b''), None)
+
+    def test_unchanged_files_are_not_parsed(self):
+        fname, digest, links, error = _extract_links_if_changed((self.fname, None))
+        self.assertEqual(error, None)
+        self.assertEqual(len(links), 4)
+        self.assertEqual(_extract_links_if_changed((self.fname, digest)), (self.fname, digest, None, None))
+
+
+class FakeSite(object):
+
+    def __init__(self, site_url):
+        self.config = {
+            'SITE_URL': site_url,
+            'BASE_URL': site_url,
+            'LINK_CHECK_WHITELIST': [],
+            'REDIRECTIONS': [],
+        }
+
+
+class RepeatedRunTest(unittest.TestCase):
+
+    def run_check(self, check, site):
+        check.site = site
+        check.scan_links = lambda find_sources, check_remote: check._prepare_analysis() or False
+        check._execute({'links': True, 'files': False, 'clean': False, 'verbose': False,
+                        'find_sources': False, 'remote': False}, [])
+
+    def test_analysis_state_is_reset(self):
+        check = CommandCheck()
+        self.run_check(check, FakeSite('https://example.com/'))
+        self.run_check(check, FakeSite('https://example.org/'))
+        self.assertTrue('https://example.org/' in check.existing_targets)
+        self.assertFalse('https://example.com/' in check.existing_targets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from nikola.plugins.command.serve import ThreadedHTTPServer, OurHTTPRequestHandler
+
+
+class ServeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.startdir = os.getcwd()
+        cls.tmpdir = tempfile.mkdtemp()
+        with io.open(os.path.join(cls.tmpdir, 'index.html'), 'w', encoding='utf-8') as outf:
+            outf.write('<html><head><base href="https://example.com/"></head><body>Hi</body></html>')
+        with io.open(os.path.join(cls.tmpdir, 'style.css'), 'wb') as outf:
+            outf.write(b'body { color: red; }')
+        with gzip.GzipFile(os.path.join(cls.tmpdir, 'style.css.gz'), 'wb') as outf:
+            outf.write(b'body { color: red; }')
+        with io.open(os.path.join(cls.tmpdir, 'media.bin'), 'wb') as outf:
+            outf.write(bytes(bytearray(range(256))) * 4)
+        os.chdir(cls.tmpdir)
+        OurHTTPRequestHandler.quiet = True
+        cls.server = ThreadedHTTPServer(('127.0.0.1', 0), OurHTTPRequestHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base = 'http://127.0.0.1:{0}/'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        OurHTTPRequestHandler.quiet = False
+        os.chdir(cls.startdir)
+        shutil.rmtree(cls.tmpdir)
+
+    def test_html(self):
+        resp = requests.get(self.base)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue('<!--base href="https://example.com/"-->' in resp.text)
+        self.assertTrue(resp.headers['ETag'])
+        self.assertTrue(resp.headers['Last-Modified'])
+        self.assertEqual(resp.headers['Cache-Control'], 'no-cache, must-revalidate')
+
+    def test_not_modified(self):
+        resp = requests.get(self.base + 'style.css', headers={'Accept-Encoding': 'identity'})
+        etag = resp.headers['ETag']
+        resp = requests.get(self.base + 'style.css', headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b'')
+        resp = requests.get(self.base + 'style.css', headers={
+            'Accept-Encoding': 'identity', 'If-Modified-Since': resp.headers['Last-Modified']})
+        self.assertEqual(resp.status_code, 304)
+
+    def test_precompressed(self):
+        resp = requests.get(self.base + 'style.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(resp.headers['Content-Type'], 'text/css; charset=UTF-8')
+        self.assertEqual(resp.content, b'body { color: red; }')
+        resp = requests.get(self.base + 'style.css', headers={'Accept-Encoding': 'identity'})
+        self.assertFalse('Content-Encoding' in resp.headers)
+        self.assertEqual(resp.content, b'body { color: red; }')
+
+    def test_range(self):
+        resp = requests.get(self.base + 'media.bin', headers={'Range': 'bytes=10-19'})
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp.headers['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(resp.content, bytes(bytearray(range(10, 20))))
+        resp = requests.get(self.base + 'media.bin', headers={'Range': 'bytes=-4'})
+        self.assertEqual(resp.content, bytes(bytearray(range(252, 256))))
+        resp = requests.get(self.base + 'media.bin', headers={'Range': 'bytes=2000-'})
+        self.assertEqual(resp.status_code, 416)
+        resp = requests.get(self.base + 'media.bin')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.content), 1024)
+
+    def test_missing(self):
+        self.assertEqual(requests.get(self.base + 'missing.html').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,43 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, absolute_import
 
+import io
+import json
 import os
+import shutil
 import sys
+import tempfile
 
 import unittest
 
+from nikola.__main__ import main
 from nikola.plugins.command.version import CommandVersion
+from nikola.startup_profile import PROFILER
 
 
 class CommandVersionCallTest(unittest.TestCase):
     def test_version(self):
         """Test `nikola version`."""
         CommandVersion().execute()
+
+
+class ProfileStartupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        PROFILER.enabled = False
+        del PROFILER.records[:]
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile_startup_json(self):
+        """Test `nikola --profile-startup=FILE version`."""
+        fname = os.path.join(self.tmpdir, 'profile.json')
+        main(['--profile-startup=' + fname, 'version'])
+        with io.open(fname, encoding='utf-8') as inf:
+            data = json.load(inf)
+        names = [r['name'] for r in data['records']]
+        self.assertTrue('import nikola' in names)
+        self.assertTrue('main: init_plugins' in names)
+        self.assertTrue(('set_site', 'version') in [(r['kind'], r['name']) for r in data['records']])
+        self.assertTrue(data['total'] > 0)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from nikola.plugins.compile.ipynb import read_notebook_metadata
+
+NOTEBOOK = {
+    'cells': [{
+        'cell_type': 'markdown',
+        'metadata': {'nikola': {'title': 'Not me'}},
+        'source': ['\n "metadata": {"nikola": {"title": "Nor me"}}\n'],
+    }],
+    'metadata': {'nikola': {'title': 'Notebook', 'slug': 'notebook'}},
+    'nbformat': 4,
+    'nbformat_minor': 0,
+}
+
+
+class ReadNotebookMetadataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'notebook.ipynb')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, **kw):
+        with io.open(self.source, 'w', encoding='utf-8') as outf:
+            outf.write(json.dumps(NOTEBOOK, sort_keys=True, **kw))
+
+    def test_nbformat_layout(self):
+        self.write(indent=1)
+        self.assertEqual(read_notebook_metadata(self.source), NOTEBOOK['metadata'])
+
+    def test_other_layouts(self):
+        self.write()
+        self.assertEqual(read_notebook_metadata(self.source), NOTEBOOK['metadata'])
+        self.write(indent=4)
+        self.assertEqual(read_notebook_metadata(self.source), NOTEBOOK['metadata'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,8 @@ import tempfile
 import unittest
 from os import path
 
+import mock
+
 from nikola.plugins.compile.markdown import CompileMarkdown
 from .base import BaseTestCase, FakeSite
 
@@ -68,5 +70,23 @@ class CompileMarkdownTests(BaseTestCase):
         actual_output = self.compile(input_str)
         self.assertEquals(actual_output.strip(), expected_output.strip())
 
+    def test_converter_is_reused(self):
+        extensions = list(self.compiler.extensions)
+        self.assertEquals(self.compile('[a link][x]\n\n[x]: https://example.com').strip(),
+                          '<p><a href="https://example.com">a link</a></p>')
+        converter = self.compiler.converter.markdown
+        # References from the previous document are forgotten
+        self.assertEquals(self.compile('[a link][x]').strip(), '<p>[a link][x]</p>')
+        self.assertIs(self.compiler.converter.markdown, converter)
+        self.assertEquals(self.compiler.extensions, extensions)
+
+    def test_converter_is_reset_after_errors(self):
+        self.compile('')
+        converter = self.compiler.converter.markdown
+        with mock.patch.object(converter, 'serializer', side_effect=ValueError):
+            self.assertRaises(ValueError, self.compile, '[a link][x]\n\n[x]: https://example.com')
+        self.assertEquals(self.compile('[a link][x]').strip(), '<p>[a link][x]</p>')
+
+
 if __name__ == '__main__':
     unittest.main()
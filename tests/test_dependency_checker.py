@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from nikola import dependency_checker
+from nikola.dependency_checker import checker_class
+
+
+class DependencyCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.photo = self.write('photo.jpg', 'photo')
+        self.post = self.write('post.rst', 'post')
+        self.task_deps = [
+            ('copy_files:output/photo.jpg', [self.photo]),
+            ('render_posts:cache/post.html', [self.post]),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir, name)
+        with io.open(path, 'w', encoding='utf-8') as outf:
+            outf.write(text)
+        return path
+
+    def modified(self, checker, path, state):
+        return checker.check_modified(path, os.stat(path), state)
+
+    def make_checker(self, setting):
+        return checker_class(setting, self.task_deps, os.path.join(self.tmpdir, 'cache'))()
+
+    def test_no_setting(self):
+        self.assertEqual(checker_class({}, self.task_deps), None)
+
+    def test_modes(self):
+        checker = self.make_checker({'copy_files': 'stat'})
+        self.assertEqual(checker.modes, {self.photo: 'stat', self.post: 'md5'})
+        photo_state = checker.get_state(self.photo, None)
+        post_state = checker.get_state(self.post, None)
+        self.assertEqual(photo_state[0], 'stat')
+        self.assertEqual(len(photo_state), 5)
+        self.assertEqual(len(post_state), 3)
+        self.assertEqual(checker.get_state(self.photo, photo_state), None)
+        self.assertFalse(self.modified(checker, self.photo, photo_state))
+        self.assertFalse(self.modified(checker, self.post, post_state))
+
+        # Same contents, new modification time: not a change
+        for path in (self.photo, self.post):
+            os.utime(path, (0, 1000))
+        self.assertFalse(self.modified(checker, self.photo, photo_state))
+        self.assertFalse(self.modified(checker, self.post, post_state))
+
+        # New contents are
+        self.write('photo.jpg', 'other')
+        self.assertTrue(self.modified(checker, self.photo, photo_state))
+
+        # Switching modes keeps using the hashes
+        checker = self.make_checker('md5')
+        self.assertFalse(self.modified(checker, self.post, post_state))
+        self.assertTrue(self.modified(checker, self.photo, photo_state))
+        self.assertEqual(len(checker.get_state(self.photo, photo_state)), 3)
+
+    def test_hashes_are_kept(self):
+        checker = self.make_checker('stat')
+        state = checker.get_state(self.photo, None)
+        os.utime(self.photo, (0, 1000))
+        self.assertFalse(self.modified(checker, self.photo, state))
+        checker.hashes.save()
+        with io.open(os.path.join(self.tmpdir, 'cache', 'file_hashes.json'), 'r', encoding='utf-8') as inf:
+            self.assertTrue(self.photo in json.load(inf))
+
+        # The next run does not read the file again
+        checker = self.make_checker('stat')
+        with mock.patch.object(dependency_checker, 'get_file_md5') as get_file_md5:
+            self.assertFalse(self.modified(checker, self.photo, state))
+        self.assertFalse(get_file_md5.called)
+
+    def test_shared_files_use_md5(self):
+        task_deps = self.task_deps + [('render_galleries:output/photo.jpg', [self.photo])]
+        checker = checker_class({'default': 'stat', 'render_galleries': 'md5'}, task_deps)()
+        self.assertEqual(checker.modes, {self.photo: 'md5', self.post: 'stat'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import lxml.html
+
+from nikola import filters
+
+# Appends a line to the file, and counts its runs in another file
+COMMAND = [sys.executable, '-c', '''
+import io, sys
+with io.open(sys.argv[1], 'a') as outf:
+    outf.write(u'filtered\\n')
+with io.open(sys.argv[2], 'a') as outf:
+    outf.write(u'run\\n')
+''', '%1']
+
+
+class RunInPlaceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.runs = os.path.join(self.tmpdir, 'runs.txt')
+        self.command = COMMAND + [self.runs]
+        filters.CACHE_FOLDER = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        filters.CACHE_FOLDER = None
+        filters._tool_versions.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def filter(self, name, text):
+        path = os.path.join(self.tmpdir, name)
+        with io.open(path, 'w', encoding='utf-8') as outf:
+            outf.write(text)
+        filters.runinplace(self.command, path)
+        with io.open(path, 'r', encoding='utf-8') as inf:
+            return inf.read()
+
+    def run_count(self):
+        with io.open(self.runs, 'r', encoding='utf-8') as inf:
+            return len(inf.readlines())
+
+    def test_same_contents_run_once(self):
+        self.assertEqual(self.filter('a.txt', 'a\n'), 'a\nfiltered\n')
+        self.assertEqual(self.filter('b.txt', 'a\n'), 'a\nfiltered\n')
+        self.assertEqual(self.run_count(), 1)
+        # The command list is left alone
+        self.assertEqual(self.command[-2:], ['%1', self.runs])
+
+    def test_changed_contents_run_again(self):
+        self.filter('a.txt', 'a\n')
+        self.assertEqual(self.filter('a.txt', 'b\n'), 'b\nfiltered\n')
+        self.assertEqual(self.run_count(), 2)
+
+    def test_changed_tool_run_again(self):
+        self.filter('a.txt', 'a\n')
+        filters._tool_versions[sys.executable] = ['upgraded']
+        self.filter('a.txt', 'a\n')
+        self.assertEqual(self.run_count(), 2)
+
+    def cached_files(self):
+        return [os.path.join(root, fname) for root, _, files in os.walk(filters.CACHE_FOLDER) for fname in files]
+
+    def test_prune_cache(self):
+        self.filter('a.txt', 'a\n')
+        old = self.cached_files()
+        os.utime(old[0], (0, 0))
+        self.filter('b.txt', 'b\n')
+        output_folder = os.path.join(self.tmpdir, 'output')
+        filters.prune_cache(output_folder)
+        cached = self.cached_files()
+        self.assertEqual(len(cached), 1)
+        self.assertFalse(old[0] in cached)
+        # Using the output again keeps it
+        os.utime(cached[0], (0, 0))
+        self.filter('c.txt', 'b\n')
+        filters.prune_cache(output_folder)
+        self.assertEqual(self.cached_files(), cached)
+
+    def test_prune_cache_in_use(self):
+        # Up to date tasks don't use their output, but it is still needed
+        self.filter('a.txt', 'a\n')
+        output_folder = os.path.join(self.tmpdir, 'output')
+        os.mkdir(output_folder)
+        shutil.copy(os.path.join(self.tmpdir, 'a.txt'), output_folder)
+        cached = self.cached_files()
+        os.utime(cached[0], (0, 0))
+        filters.prune_cache(output_folder)
+        self.assertEqual(self.cached_files(), cached)
+        os.unlink(os.path.join(output_folder, 'a.txt'))
+        os.utime(cached[0], (0, 0))
+        filters.prune_cache(output_folder)
+        self.assertEqual(self.cached_files(), [])
+
+    def test_no_cache(self):
+        filters.CACHE_FOLDER = None
+        self.filter('a.txt', 'a\n')
+        self.filter('a.txt', 'a\n')
+        self.assertEqual(self.run_count(), 2)
+
+
+class MinifyHTMLTest(unittest.TestCase):
+
+    def minify(self, html):
+        return filters.minify_html_document(lxml.html.document_fromstring(html))
+
+    def test_whitespace(self):
+        self.assertEqual(
+            self.minify('<html><body>\n  <p>Some   <b>bold</b>\n text</p>\n  <pre> keep\n   this </pre>\n</body></html>'),
+            '<html><body><p>Some <b>bold</b> text<pre> keep\n   this </pre>')
+
+    def test_comments_and_scripts(self):
+        self.assertEqual(
+            self.minify('<html><head><!-- comment --><!--[if lt IE 9]><script src="x.js"></script><![endif]-->'
+                        '<script>if (a  <  b) {}</script></head><body><div>a<!-- b -->c</div></body></html>'),
+            '<html><head><!--[if lt IE 9]><script src="x.js"></script><![endif]-->'
+            '<script>if (a  <  b) {}</script><body><div>ac</div>')
+
+    def test_optional_end_tags(self):
+        self.assertEqual(
+            self.minify('<html><body><ul><li>a</li> <li>b</li></ul>'
+                        '<p>kept</p> text <a href="#"><p>kept</p></a></body></html>'),
+            '<html><body><ul><li>a<li>b</ul><p>kept</p> text <a href=#><p>kept</p></a>')
+
+    def test_attributes(self):
+        self.assertEqual(
+            self.minify('<html><body><input type="checkbox" checked="checked" value="a b">'
+                        '<a href="../" title=\'say "hi"\' data-x="a&amp;b">x</a></body></html>'),
+            '<html><body><input type=checkbox checked value="a b">'
+            '<a href="../" title="say &quot;hi&quot;" data-x=a&amp;b>x</a>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from collections import defaultdict
+
+from nikola.fragment_store import FragmentStore
+
+
+class FakeCompiler(object):
+    name = 'fake'
+    library_version = '1.0'
+    config_dependencies = []
+
+
+class FakeSite(object):
+    configuration_filename = None
+    shortcode_registry = {}
+
+    def __init__(self):
+        self.config = {}
+
+
+class FakePost(object):
+    compiler = FakeCompiler()
+    is_two_file = True
+    config = {'DEFAULT_LANG': 'en', 'TRANSLATIONS': {'en': ''}, 'TRANSLATIONS_PATTERN': '{path}.{lang}.{ext}'}
+
+    def __init__(self, folder):
+        self.source = os.path.join(folder, 'post.rst')
+        self.metadata_path = os.path.join(folder, 'post.meta')
+        self._dependency_file_fragment = defaultdict(list)
+        self._dependency_uptodate_fragment = defaultdict(list)
+
+    def translated_source_path(self, lang):
+        return self.source
+
+
+class FragmentStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.post = FakePost(self.tmpdir)
+        self.dest = os.path.join(self.tmpdir, 'cache', 'post.html')
+        self.dep = os.path.join(self.tmpdir, 'included.txt')
+        self.write(self.post.source, 'source')
+        self.write(self.dep, 'included')
+        self.store = FragmentStore(os.path.join(self.tmpdir, 'store'), FakeSite())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, text):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='utf-8') as outf:
+            outf.write(text)
+
+    def read(self, path):
+        with io.open(path, 'r', encoding='utf-8') as inf:
+            return inf.read()
+
+    def compile(self, deps):
+        """Pretend to compile the post, storing the fragment."""
+        self.write(self.dest, 'compiled ' + self.read(self.post.source))
+        self.store.save(self.store.manifest_key(self.post, 'en'), self.dest, deps)
+        os.unlink(self.dest)
+
+    def fetch(self):
+        return self.store.fetch(self.store.manifest_key(self.post, 'en'), self.dest)
+
+    def test_hit(self):
+        self.assertEqual(self.fetch(), None)
+        self.compile([self.dep])
+        # The store can be moved around
+        shutil.move(self.store.folder, self.store.folder + '2')
+        self.store.folder += '2'
+        self.assertEqual(self.fetch(), [self.dep])
+        self.assertEqual(self.read(self.dest), 'compiled source')
+
+    def test_changed_inputs(self):
+        self.compile([self.dep])
+        self.write(self.dep, 'changed')
+        self.assertEqual(self.fetch(), None)
+        self.compile([self.dep])
+        self.write(self.post.source, 'changed source')
+        self.assertEqual(self.fetch(), None)
+        self.write(self.post.source, 'source')
+        self.assertEqual(self.fetch(), [self.dep])
+
+    def test_changed_library(self):
+        self.compile([self.dep])
+        self.post.compiler = FakeCompiler()
+        self.post.compiler.library_version = '1.1'
+        self.assertEqual(self.fetch(), None)
+
+    def test_timeline_dependency(self):
+        self.compile(['####MAGIC####TIMELINE'])
+        self.assertEqual(self.fetch(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
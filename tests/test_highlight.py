@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pygments
+import pygments.util
+
+from nikola.highlight import Highlighter
+from nikola.utils import NikolaPygmentsHTML
+
+from .base import LocaleSupportInTesting
+
+CODE = 'def answer():\n    return 42\n'
+
+
+class HighlighterTest(unittest.TestCase):
+
+    def setUp(self):
+        LocaleSupportInTesting.initialize_locales_for_testing('unilingual')
+        self.tmpdir = tempfile.mkdtemp()
+        self.highlighter = Highlighter(self.tmpdir)
+        self.lexer = self.highlighter.lexer_by_name('python')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def expected(self, code, anchor_ref, **kw):
+        return pygments.highlight(code, self.lexer, NikolaPygmentsHTML(anchor_ref, **kw))
+
+    def test_same_output(self):
+        for anchor_ref in ('rest_code_1', 'rest_code_2'):
+            self.assertEqual(self.highlighter.highlight(CODE, self.lexer, anchor_ref, linenos=False),
+                             self.expected(CODE, anchor_ref, linenos=False))
+        # Both are the same entry, with different anchors
+        self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+        # Cached entries are used
+        self.highlighter.instances.formatters.clear()
+        self.highlighter.formatter = None
+        self.assertEqual(self.highlighter.highlight(CODE, self.lexer, 'rest_code_3', linenos=False),
+                         self.expected(CODE, 'rest_code_3', linenos=False))
+
+    def test_options(self):
+        self.assertEqual(self.highlighter.highlight(CODE, self.lexer, 'listing.py', classes=['code', 'python'], linenostart=3),
+                         self.expected(CODE, 'listing.py', classes=['code', 'python'], linenostart=3))
+        self.assertNotEqual(self.highlighter.highlight(CODE, self.lexer, 'listing.py', linenostart=4),
+                            self.expected(CODE, 'listing.py', linenostart=3))
+
+    def test_lexers_are_reused(self):
+        self.assertTrue(self.highlighter.lexer_by_name('python') is self.lexer)
+        self.assertTrue(self.highlighter.lexer_for_filename('a/b.py') is self.highlighter.lexer_for_filename('c/b.py'))
+        with self.assertRaises(pygments.util.ClassNotFound):
+            self.highlighter.lexer_by_name('not-a-language')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import unittest
+
+import lxml.html
+
+from nikola.post import get_hyphenator, hyphenate
+
+from .base import LocaleSupportInTesting
+
+
+class HyphenationTest(unittest.TestCase):
+
+    def setUp(self):
+        LocaleSupportInTesting.initialize_locales_for_testing('unilingual')
+
+    def hyphenate(self, html):
+        document = lxml.html.fragment_fromstring(html, 'body')
+        hyphenate(document, 'en')
+        return lxml.html.tostring(document, encoding='unicode').replace('\u00AD', '-')
+
+    def test_hyphenate(self):
+        self.assertEqual(
+            self.hyphenate('<div><p>Considerations &amp; <b>unbelievably</b> complicated.</p></div>'),
+            '<body><div><p>Con-sid-er-a-tions &amp; <b>un-be-liev-ably</b> com-pli-cat-ed.</p></div></body>')
+
+    def test_nested_elements_are_hyphenated_once(self):
+        self.assertEqual(
+            self.hyphenate('<div><ul><li><p>Paragraph inside</p> characteristically</li></ul></div>'),
+            '<body><div><ul><li><p>Para-graph in-side</p> char-ac-ter-is-ti-cal-ly</li></ul></div></body>')
+
+    def test_skipped_elements(self):
+        html = ('<div><p>Use <code>extraordinarily</code> unconditionally</p>'
+                '<pre><span>extraordinarily</span></pre></div>')
+        self.assertEqual(self.hyphenate(html), '<body>' + html + '</body>')
+
+    def test_hyphenator_is_shared(self):
+        hyphenator = get_hyphenator('en')
+        self.assertTrue(hyphenator is get_hyphenator('en'))
+        self.hyphenate('<p>Extraordinarily</p>')
+        self.assertTrue(('Extraordinarily', '\u00AD') in hyphenator.words)
+
+
+if __name__ == '__main__':
+    unittest.main()
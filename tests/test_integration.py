@@ -1,22 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function, absolute_import
 
+import glob
 import os
 import sys
 
 import io
+import json
 import locale
+import multiprocessing.pool
 import shutil
 import subprocess
 import tempfile
 import unittest
 
+from blinker import signal
 import lxml.html
+import mock
 import pytest
 
 from nikola import __main__
 import nikola
 import nikola.plugins.command
+import nikola.plugins.command.auto
 import nikola.plugins.command.init
 import nikola.utils
 
@@ -313,6 +319,15 @@ class TestCheck(DemoBuildTest):
         with cd(self.target_dir):
             self.assertIsNone(__main__.main(['check', '-f']))
 
+    def test_build_manifest(self):
+        manifest_path = os.path.join(self.target_dir, "cache", "build_manifest.json")
+        with io.open(manifest_path, "r", encoding="utf8") as inf:
+            manifest = json.load(inf)
+        targets = set()
+        for task in manifest['tasks'].values():
+            targets.update(task['targets'])
+        self.assertTrue(os.path.join("output", "index.html") in targets)
+
 
 class TestCheckAbsoluteSubFolder(TestCheck):
     """Validate links in a site which is:
@@ -383,6 +398,332 @@ class TestCheckFailure(DemoBuildTest):
                 self.assertNotEqual(e.code, 0)
 
 
+class TestCheckIncremental(DemoBuildTest):
+    """Links to removed files are found even if no page changed."""
+
+    def test_check_links_incremental(self):
+        with cd(self.target_dir):
+            self.assertIsNone(__main__.main(['check', '-l']))
+            self.assertTrue(os.path.exists(os.path.join("cache", "check_links.json")))
+            os.unlink(os.path.join("output", "archive.html"))
+            self.assertEqual(__main__.main(['check', '-l']), 1)
+
+
+class AffectedByTest(DemoBuildTest):
+    """Only tasks depending on the changed files are run with --affected-by."""
+
+    def test_affected_by(self):
+        with cd(self.target_dir):
+            manifest_path = os.path.join("cache", "build_manifest.json")
+            with io.open(manifest_path, "r", encoding="utf8") as inf:
+                manifest = json.load(inf)
+            listing = os.path.join('listings', 'hello.py')
+            dependents = manifest['dependents'][listing]
+            page = os.path.join('output', 'listings', 'hello.py.html')
+            self.assertTrue('render_listings:' + page in dependents)
+
+            other = os.path.join('cache', 'posts', '1.html')
+            old_other = os.stat(other).st_mtime
+            with io.open(listing, 'a', encoding='utf8') as outf:
+                outf.write('\nprint("Some more code")\n')
+            self.assertEqual(__main__.main(['build', '--affected-by=listings/hello.py']), 0)
+            with io.open(page, 'r', encoding='utf8') as inf:
+                self.assertTrue('Some more code' in inf.read())
+            self.assertEqual(os.stat(other).st_mtime, old_other)
+            # The same tasks are in the manifest (dependencies found
+            # while building posts may have been added)
+            with io.open(manifest_path, "r", encoding="utf8") as inf:
+                self.assertEqual(sorted(json.load(inf)['tasks']), sorted(manifest['tasks']))
+
+    def test_affected_by_post_source(self):
+        """Changing a post builds everything, as its metadata is used by other pages."""
+        with cd(self.target_dir):
+            source = os.path.join('posts', '1.rst')
+            with io.open(source, 'r', encoding='utf8') as inf:
+                data = inf.read()
+            data = data.replace('.. slug: welcome-to-nikola', '.. slug: welcome-again')
+            data = data.replace('.. tags: nikola,', '.. tags: brandnewtag, nikola,')
+            with io.open(source, 'w', encoding='utf8') as outf:
+                outf.write(data)
+            self.assertEqual(__main__.main(['build', '--affected-by=posts/1.rst']), 0)
+            with io.open(os.path.join("cache", "build_manifest.json"), "r", encoding="utf8") as inf:
+                tasks = json.load(inf)['tasks']
+            self.assertTrue('render_pages:' + os.path.join('output', 'posts', 'welcome-again.html') in tasks)
+            self.assertFalse('render_pages:' + os.path.join('output', 'posts', 'welcome-to-nikola.html') in tasks)
+            self.assertTrue(os.path.exists(os.path.join('output', 'categories', 'brandnewtag.html')))
+            with io.open(os.path.join('output', 'index.html'), 'r', encoding='utf8') as inf:
+                self.assertTrue('posts/welcome-again.html' in inf.read())
+
+    def test_affected_by_unknown_file(self):
+        with cd(self.target_dir):
+            with io.open(os.path.join('files', 'new.txt'), 'w', encoding='utf8') as outf:
+                outf.write('new')
+            self.assertEqual(__main__.main(['build', '--affected-by=files/new.txt']), 0)
+            self.assertTrue(os.path.exists(os.path.join('output', 'new.txt')))
+
+
+class CompileWorkersTest(DemoBuildTest):
+    """Compile posts in worker processes."""
+
+    @classmethod
+    def patch_site(self):
+        """Set COMPILE_WORKERS."""
+        conf_path = os.path.join(self.target_dir, "conf.py")
+        with io.open(conf_path, "a", encoding="utf8") as outf:
+            outf.write("""\n\nCOMPILE_WORKERS = 2\n\n""")
+
+    def test_fragments_and_depfiles(self):
+        """Fragments and their depfiles are written by the main process."""
+        fragment = os.path.join(self.target_dir, 'cache', 'stories', 'listings-demo.html')
+        with io.open(fragment, 'r', encoding='utf8') as inf:
+            self.assertTrue('class="code' in inf.read())
+        with io.open(fragment + '.dep', 'r', encoding='utf8') as inf:
+            self.assertTrue(os.path.join('listings', 'hello.py') in inf.read())
+        self.assertFalse(glob.glob(os.path.join(tempfile.gettempdir(), 'nikola-compile-*', '*', '*.html')))
+
+    def test_only_tasks_to_run(self):
+        """Only fragments of selected tasks which are not up to date are compiled together."""
+        batches = []
+        pool_map = multiprocessing.pool.Pool.map
+
+        def record(pool, func, todo):
+            # The batch being compiled is a global of the plugin module
+            batch = func.__globals__['_batch']
+            batches.append(sorted(batch.task_names[index] for index in todo))
+            return pool_map(pool, func, todo)
+
+        with cd(self.target_dir):
+            for path in ('posts/1.rst', 'stories/1.rst', 'stories/manual.rst', 'stories/quickref.rst'):
+                with io.open(path, 'a', encoding='utf8') as outf:
+                    outf.write('\nChanged.\n')
+            with mock.patch('multiprocessing.pool.Pool.map', record):
+                __main__.main(['build', 'render_posts:cache/posts/1.html', 'render_posts:cache/stories/1.html'])
+                __main__.main(['build'])
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[0], ['render_posts:cache/posts/1.html', 'render_posts:cache/stories/1.html'])
+        # Those were compiled already (stories depending on the timeline may be compiled again)
+        self.assertFalse('render_posts:cache/posts/1.html' in batches[1])
+        self.assertFalse('render_posts:cache/stories/1.html' in batches[1])
+        self.assertTrue('render_posts:cache/stories/manual.html' in batches[1])
+        self.assertTrue('render_posts:cache/stories/quickref.html' in batches[1])
+
+
+class MinifyHTMLTest(DemoBuildTest):
+    """Minify pages while rendering them."""
+
+    @classmethod
+    def patch_site(self):
+        """Set MINIFY_HTML."""
+        conf_path = os.path.join(self.target_dir, "conf.py")
+        with io.open(conf_path, "a", encoding="utf8") as outf:
+            outf.write("""\n\nMINIFY_HTML = True\n\n""")
+
+    def test_minified(self):
+        """Pages are minified, and still have everything."""
+        with io.open(os.path.join(self.target_dir, "output", "index.html"), "r", encoding="utf8") as inf:
+            data = inf.read()
+        self.assertTrue(data.startswith('<!DOCTYPE html>\n<html'))
+        self.assertFalse('\n  <' in data)
+        self.assertTrue(lxml.html.fromstring(data).xpath('//article'))
+
+
+class FingerprintBundlesTest(DemoBuildTest):
+    """Write fingerprinted bundles and link to them."""
+
+    @classmethod
+    def patch_site(self):
+        """Set FINGERPRINT_BUNDLES."""
+        conf_path = os.path.join(self.target_dir, "conf.py")
+        with io.open(conf_path, "a", encoding="utf8") as outf:
+            outf.write("""\n\nFINGERPRINT_BUNDLES = True\n\n""")
+
+    def test_fingerprinted_bundles(self):
+        """The fingerprinted bundle is a copy of the bundle, and pages use it."""
+        css_folder = os.path.join(self.target_dir, "output", "assets", "css")
+        fingerprinted = glob.glob(os.path.join(css_folder, "all-nocdn.*.css"))
+        self.assertEqual(len(fingerprinted), 1)
+        with io.open(fingerprinted[0], "rb") as inf:
+            data = inf.read()
+        with io.open(os.path.join(css_folder, "all-nocdn.css"), "rb") as inf:
+            self.assertEqual(data, inf.read())
+        with io.open(os.path.join(self.target_dir, "output", "index.html"), "r", encoding="utf8") as inf:
+            page = inf.read()
+        self.assertTrue('href="assets/css/{0}"'.format(os.path.basename(fingerprinted[0])) in page)
+        self.assertFalse('all-nocdn.css' in page)
+
+    def test_changed_bundle(self):
+        """A changed bundle gets a new fingerprint, and the old copy is removed."""
+        css_folder = os.path.join(self.target_dir, "output", "assets", "css")
+        old = glob.glob(os.path.join(css_folder, "all-nocdn.*.css"))
+        custom_css = os.path.join(self.target_dir, "files", "assets", "css", "custom.css")
+        nikola.utils.makedirs(os.path.dirname(custom_css))
+        with io.open(custom_css, "w", encoding="utf8") as outf:
+            outf.write("body { color: #123456; }\n")
+        with cd(self.target_dir):
+            __main__.main(["build"])
+        fingerprinted = glob.glob(os.path.join(css_folder, "all-nocdn.*.css"))
+        self.assertEqual(len(fingerprinted), 1)
+        self.assertNotEqual(fingerprinted, old)
+        with io.open(fingerprinted[0], "r", encoding="utf8") as inf:
+            self.assertTrue("#123456" in inf.read())
+        with io.open(os.path.join(self.target_dir, "output", "index.html"), "r", encoding="utf8") as inf:
+            page = inf.read()
+        self.assertTrue('href="assets/css/{0}"'.format(os.path.basename(fingerprinted[0])) in page)
+
+    def test_generated_inputs(self):
+        """Only inputs made by other tasks, not files in the output folder, prevent fingerprinting."""
+        name = os.path.join('assets', 'css', 'all-nocdn.css')
+        custom_css = os.path.join(self.target_dir, "files", "assets", "css", "custom.css")
+        if os.path.exists(custom_css):
+            os.unlink(custom_css)
+        with cd(self.target_dir):
+            __main__._RETURN_DOITNIKOLA = True
+            try:
+                site = __main__.main(['build']).nikola
+            finally:
+                __main__._RETURN_DOITNIKOLA = False
+            site.init_plugins()
+            bundles = site.plugin_manager.getPluginByName('create_bundles', 'LateTask').plugin_object
+            fingerprints = bundles.get_fingerprints()
+            self.assertTrue(name in fingerprints)
+            with io.open(os.path.join('output', 'assets', 'css', 'custom.css'), "w", encoding="utf8") as outf:
+                outf.write("body { color: #123456; }\n")
+            self.assertEqual(bundles.get_fingerprints(), fingerprints)
+            site.task_targets[os.path.join('output', 'assets', 'css', 'custom.css')] = 'generate_custom_css'
+            self.assertFalse(name in bundles.get_fingerprints())
+
+
+class RescanTest(DemoBuildTest):
+    """Rescanning posts only re-reads the ones that changed."""
+
+    def test_rescan(self):
+        with cd(self.target_dir):
+            __main__._RETURN_DOITNIKOLA = True
+            try:
+                site = __main__.main(['build']).nikola
+            finally:
+                __main__._RETURN_DOITNIKOLA = False
+            site.init_plugins()
+            site.scan_posts()
+            before = dict((p.source_path, p) for p in site.timeline)
+            changed = sorted(before)[0]
+            os.utime(changed, (os.stat(changed).st_atime, os.stat(changed).st_mtime + 10))
+            unchanged = before[sorted(before)[1]]
+            deps = unchanged.deps('en')
+            unchanged.add_dependency('added-by-a-plugin.txt')
+            site.scan_posts(really=True)
+            after = dict((p.source_path, p) for p in site.timeline)
+        self.assertEqual(sorted(before), sorted(after))
+        for path in before:
+            if path == changed:
+                self.assertFalse(before[path] is after[path])
+            else:
+                self.assertTrue(before[path] is after[path])
+        # Plugins add their dependencies to reused posts again
+        self.assertEqual(unchanged.deps('en'), deps)
+
+
+class AutoRebuildTest(DemoBuildTest):
+    """nikola auto only rebuilds what the changed files affect."""
+
+    def get_auto(self):
+        __main__._RETURN_DOITNIKOLA = True
+        try:
+            site = __main__.main(['build']).nikola
+        finally:
+            __main__._RETURN_DOITNIKOLA = False
+        site.init_plugins()
+        auto = site.plugin_manager.getPluginByName('auto', 'Command').plugin_object
+        auto.logger = nikola.utils.get_logger('auto', nikola.utils.STDERR_HANDLER)
+        # As nikola auto does when it starts
+        self.assertTrue(auto.build())
+        return auto
+
+    def test_rebuild_affected(self):
+        with cd(self.target_dir):
+            auto = self.get_auto()
+            listing = os.path.abspath(os.path.join('listings', 'hello.py'))
+            with io.open(listing, 'a', encoding='utf8') as outf:
+                outf.write('\nprint("Automatically rebuilt")\n')
+            stderr = sys.stderr
+            with mock.patch('nikola.__main__.load_affected_tasks', wraps=__main__.load_affected_tasks) as load_affected:
+                self.assertTrue(auto.build([listing]))
+            self.assertTrue(sys.stderr is stderr)
+        load_affected.assert_called_once_with(auto.site, [os.path.join('listings', 'hello.py')])
+        with io.open(os.path.join(self.target_dir, 'output', 'listings', 'hello.py.html'), 'r', encoding='utf8') as inf:
+            self.assertTrue('Automatically rebuilt' in inf.read())
+
+    def test_restart(self):
+        """Restarting works when nikola was started by a console script."""
+        auto = nikola.plugins.command.auto.CommandAuto()
+        auto.logger = nikola.utils.get_logger('auto', nikola.utils.STDERR_HANDLER)
+        auto.server = auto.dns_sd = None
+        auto.site = mock.Mock(original_cwd=None)
+        with mock.patch('sys.argv', ['/usr/bin/nikola', 'auto', '-p', '8000']):
+            with mock.patch('os.execv') as execv:
+                auto.restart('conf.py')
+        execv.assert_called_once_with(sys.executable, [sys.executable, '-m', 'nikola', 'auto', '-p', '8000'])
+
+    def test_rebuild_changed_metadata(self):
+        """Pages using the metadata of a changed post are rebuilt."""
+        with cd(self.target_dir):
+            auto = self.get_auto()
+            source = os.path.abspath(os.path.join('posts', '1.rst'))
+            with io.open(source, 'r', encoding='utf8') as inf:
+                data = inf.read()
+            data = data.replace('.. title: Welcome to Nikola', '.. title: Welcome back to Nikola')
+            data = data.replace('.. tags: nikola,', '.. tags: brandnewtag, nikola,')
+            with io.open(source, 'w', encoding='utf8') as outf:
+                outf.write(data)
+            with mock.patch('nikola.__main__.load_affected_tasks') as load_affected:
+                self.assertTrue(auto.build([source]))
+        self.assertFalse(load_affected.called)
+        with io.open(os.path.join(self.target_dir, 'output', '2012', 'index.html'), 'r', encoding='utf8') as inf:
+            self.assertTrue('Welcome back to Nikola' in inf.read())
+        with io.open(os.path.join(self.target_dir, 'output', 'categories', 'brandnewtag.html'), 'r', encoding='utf8') as inf:
+            self.assertTrue('Welcome back to Nikola' in inf.read())
+        self.assertTrue(os.path.exists(os.path.join(self.target_dir, 'output', 'categories', 'brandnewtag.xml')))
+
+
+class LazyPluginsTest(DemoBuildTest):
+    """Plugins are activated when needed, and before anything that could need them."""
+
+    def get_site(self):
+        with cd(self.target_dir):
+            __main__._RETURN_DOITNIKOLA = True
+            try:
+                return __main__.main(['build']).nikola
+            finally:
+                __main__._RETURN_DOITNIKOLA = False
+
+    def test_lazy_activation(self):
+        site = self.get_site()
+        with cd(self.target_dir):
+            site.init_plugins()
+            self.assertFalse(site._site_plugins_activated)
+            # Commands are activated as yapsy knows them
+            self.assertTrue(site.plugin_manager.getPluginByName('version', 'Command').is_activated)
+            # Task plugins may register shortcodes
+            site.apply_shortcodes('')
+            self.assertTrue(site._site_plugins_activated)
+
+    def test_configured_signal(self):
+        site = self.get_site()
+        activated = []
+
+        def configured(site):
+            activated.append(site._site_plugins_activated)
+
+        signal('configured').connect(configured)
+        try:
+            with cd(self.target_dir):
+                site.init_plugins()
+        finally:
+            signal('configured').disconnect(configured)
+        self.assertEqual(activated, [True])
+        self.assertTrue(site.plugin_manager.getPluginByName('render_posts', 'Task').is_activated)
+
+
 class RelativeLinkTest2(DemoBuildTest):
     """Check that dropping stories to the root doesn't break links."""
 
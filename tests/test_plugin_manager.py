@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from nikola.plugin_categories import Command, Task
+from nikola.plugin_manager import NikolaPluginManager
+
+PLUGINS = {
+    'hello': ('Command', '''
+from nikola.plugin_categories import Command
+
+
+class CommandHello(Command):
+    name = "hello"
+'''),
+    'bye': ('Task', '''
+from nikola.plugin_categories import Task
+
+
+class TaskBye(Task):
+    name = "bye"
+'''),
+}
+
+
+class PluginManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.place = os.path.join(self.tmpdir, 'plugins')
+        os.mkdir(self.place)
+        for name, (category, code) in PLUGINS.items():
+            with io.open(os.path.join(self.place, name + '.plugin'), 'w', encoding='utf-8') as outf:
+                outf.write('[Core]\nName = {0}\nModule = {0}\n\n[Nikola]\nPluginCategory = {1}\n'.format(name, category))
+            with io.open(os.path.join(self.place, name + '.py'), 'w', encoding='utf-8') as outf:
+                outf.write(code)
+        self.index_path = os.path.join(self.tmpdir, 'cache', 'plugin_index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_manager(self):
+        manager = NikolaPluginManager(categories_filter={"Command": Command, "Task": Task}, index_path=self.index_path)
+        manager.getPluginLocator().setPluginInfoExtension('plugin')
+        manager.getPluginLocator().setPluginPlaces([self.place])
+        manager.locatePlugins()
+        manager.loadPlugins()
+        return manager
+
+    def test_first_run_loads_everything(self):
+        manager = self.make_manager()
+        self.assertEqual([p.name for p in manager.category_mapping['Command']], ['hello'])
+        self.assertEqual([p.name for p in manager.category_mapping['Task']], ['bye'])
+        self.assertTrue(os.path.exists(self.index_path))
+
+    def test_lazy_loading(self):
+        self.make_manager()
+        manager = self.make_manager()
+        # Nothing is imported until needed
+        self.assertEqual(manager.category_mapping['Command'], [])
+        self.assertEqual(manager.category_mapping['Task'], [])
+
+        activated = []
+        manager.activation_hooks['Command'] = activated.append
+        hello = manager.getPluginByName('hello', 'Command')
+        self.assertEqual(hello.name, 'hello')
+        self.assertEqual(hello.plugin_object.name, 'hello')
+        self.assertEqual(activated, [hello])
+        self.assertEqual(manager.category_mapping['Task'], [])
+        self.assertEqual(manager.getPluginByName('bye', 'Command'), None)
+
+        self.assertEqual([p.name for p in manager.getPluginsOfCategory('Task')], ['bye'])
+        manager.getPluginsOfCategory('Command')
+        self.assertEqual(activated, [hello])
+
+    def test_changed_plugins_invalidate_index(self):
+        self.make_manager()
+        with io.open(os.path.join(self.place, 'bye.plugin'), 'a', encoding='utf-8') as outf:
+            outf.write('\n[Documentation]\nDescription = Say goodbye\n')
+        os.utime(os.path.join(self.place, 'bye.plugin'), (0, 0))
+        manager = self.make_manager()
+        bye = manager.category_mapping['Task'][0]
+        self.assertEqual(bye.description, 'Say goodbye')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -214,6 +214,26 @@ class ListingTestCase(ReSTExtensionTestCase):
         self.setHtmlFromRst(self.sample3)
 
 
+class PublisherReuseTestCase(BaseTestCase):
+    """ Documents compiled one after the other do not share state """
+
+    def test_dependencies_are_not_shared(self):
+        tmpdir = tempfile.mkdtemp()
+        included = os.path.join(tmpdir, 'included.html')
+        with io.open(included, 'w+', encoding='utf8') as f:
+            f.write('<b>included</b>')
+        overrides = {'record_dependencies': True, 'stylesheet_path': None}
+        rst2html = nikola.plugins.compile.rest.rst2html
+        output, _, deps = rst2html('.. raw:: html\n   :file: {0}\n'.format(included), settings_overrides=overrides, transforms=[])
+        self.assertIn('<b>included</b>', output)
+        self.assertEqual(deps.list, [included])
+        output, _, deps = rst2html('Just *text*.', settings_overrides=overrides, transforms=[])
+        self.assertIn('<em>text</em>', output)
+        self.assertEqual(deps.list, [])
+        os.unlink(included)
+        os.rmdir(tmpdir)
+
+
 class DocTestCase(ReSTExtensionTestCase):
     """ Ref role test case """
 
@@ -249,5 +269,20 @@ class DocTestCase(ReSTExtensionTestCase):
                                 attributes={'href': '/posts/fake-post'})
 
 
+class PublisherContextTestCase(unittest.TestCase):
+    """Settings are cached per combination of docutils components."""
+
+    def get_settings(self, context, writer_name):
+        pub = docutils.core.Publisher(docutils.readers.get_reader_class('standalone')(),
+                                      context.parser('restructuredtext'),
+                                      context.writer(writer_name))
+        return context.get_settings(pub, None, {'report_level': 5}, None)
+
+    def test_settings_per_writer(self):
+        context = nikola.plugins.compile.rest.PublisherContext()
+        self.assertFalse(hasattr(self.get_settings(context, 'pseudoxml'), 'stylesheet_path'))
+        self.assertTrue(hasattr(self.get_settings(context, 'html'), 'stylesheet_path'))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -4,10 +4,12 @@
 u"""Test shortcodes."""
 
 from __future__ import unicode_literals
+import mock
 import pytest
 from nikola import shortcodes
 from .base import FakeSite, BaseTestCase
 import sys
+import time
 
 def noargs(site, data='', lang=''):
     return "noargs {0} success!".format(data)
@@ -53,6 +55,72 @@ def test_data(fakesite):
     assert shortcodes.apply_shortcodes('test({{% arg 123 456 foo=bar baz="quotes rock." %}}Hello test suite!{{% /arg %}})', fakesite.shortcode_registry) == "test(arg ('123', '456')/[('baz', 'quotes rock.'), ('foo', 'bar')]/Hello test suite!)"
     assert shortcodes.apply_shortcodes('test({{% arg "123 foo" foobar foo=bar baz="quotes rock." %}}Hello test suite!!{{% /arg %}})', fakesite.shortcode_registry) == "test(arg ('123 foo', 'foobar')/[('baz', 'quotes rock.'), ('foo', 'bar')]/Hello test suite!!)"
 
+def test_nesting(fakesite):
+    # Shortcodes get the raw text of the shortcodes inside them
+    assert shortcodes.apply_shortcodes('{{% arg 1 %}}a{{% noargs %}}b{{% /noargs %}}{{% /arg %}}', fakesite.shortcode_registry) == "arg ('1',)/[]/a{{% noargs %}}b{{% /noargs %}}"
+    # A shortcode ends at the first ending with its name
+    assert shortcodes.apply_shortcodes('{{% arg 1 %}}a{{% arg 2 %}}b{{% /arg %}}', fakesite.shortcode_registry) == "arg ('1',)/[]/a{{% arg 2 %}}b"
+    assert shortcodes.apply_shortcodes('{{% arg 1 %}}a{{% noargs %}}b{{% /noargs %}}', fakesite.shortcode_registry) == "arg ('1',)/[]/anoargs b success!"
+
+def test_nesting_same_name(fakesite):
+    # Nesting shortcodes with the same name is reported
+    with mock.patch.object(shortcodes.LOGGER, 'error') as error:
+        shortcodes.apply_shortcodes('{{% arg 1 %}}{{% arg 2 %}}{{% /arg %}}{{% arg 3 %}}{{% /arg %}}', fakesite.shortcode_registry)
+        assert error.call_count == 1
+        assert error.call_args[0][1] == 'arg'
+        with pytest.raises(shortcodes.ParsingError):
+            shortcodes.apply_shortcodes('{{% arg 1 %}}{{% arg 2 %}}a{{% /arg %}}b{{% /arg %}}', fakesite.shortcode_registry, raise_exceptions=True)
+        assert error.call_count == 2
+        shortcodes.apply_shortcodes('{{% arg 1 %}}{{% /arg %}}{{% arg 2 %}}{{% /arg %}}{{% arg 3 %}}', fakesite.shortcode_registry)
+        assert error.call_count == 2
+
+def test_linear_scaling(fakesite):
+    """Applying n shortcodes, some without ending, takes O(n) time."""
+    def timed(n):
+        data = 'Text {{% arg 1 %}} more {{% noargs %}}data{{% /noargs %}}\n' * n
+        times = []
+        for _ in range(3):
+            start = time.time()
+            shortcodes.apply_shortcodes(data, fakesite.shortcode_registry)
+            times.append(time.time() - start)
+        return min(times)
+    # Quadratic time would make this 64
+    assert timed(4000) / timed(500) < 20
+
+def test_pure_shortcodes(tmpdir):
+    calls = []
+
+    def pure(*args, **kwargs):
+        calls.append(args)
+        return "pure {0} {1}".format(len(args), kwargs['data'])
+    pure.nikola_shortcode_pure = '1'
+    registry = {'pure': pure, 'arg': arg}
+    data = '{{% pure 1 %}}{{% pure 1 %}}{{% pure 1 2 %}}{{% arg 1 %}}'
+    cache = shortcodes.ShortcodeCache(str(tmpdir))
+    used = set()
+    assert shortcodes.apply_shortcodes(data, registry, cache=cache, pure_used=used) == "pure 1 pure 1 pure 2 arg ('1',)/[]/"
+    assert len(calls) == 2
+    assert used == set(['pure'])
+    # Kept on disk for the next build...
+    cache = shortcodes.ShortcodeCache(str(tmpdir))
+    shortcodes.apply_shortcodes(data, registry, cache=cache)
+    assert len(calls) == 2
+    # ...unless the implementation changes
+    pure.nikola_shortcode_pure = '2'
+    shortcodes.apply_shortcodes(data, registry, cache=cache)
+    assert len(calls) == 4
+
+def test_shortcode_version():
+    def f():
+        return 1
+
+    def g():
+        return 2
+    assert shortcodes.shortcode_version(f) is None
+    f.nikola_shortcode_pure = g.nikola_shortcode_pure = True
+    assert shortcodes.shortcode_version(f) == shortcodes.shortcode_version(f)
+    assert shortcodes.shortcode_version(f) != shortcodes.shortcode_version(g)
+
 
 class TestErrors(BaseTestCase):
     def setUp(self):
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from nikola.plugins.template.jinja import JinjaTemplates
+
+
+class JinjaDependencyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.tmpdir, 'templates')
+        self.cache = os.path.join(self.tmpdir, 'cache')
+        os.mkdir(self.templates)
+        self.write('base.tmpl', 'base {% block content %}{% endblock %}')
+        self.write('page.tmpl', '{% extends "base.tmpl" %}{% block content %}page{% endblock %}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        with io.open(os.path.join(self.templates, name), 'w', encoding='utf-8') as outf:
+            outf.write(text)
+
+    def make_templates(self):
+        templates = JinjaTemplates()
+        templates.dependency_cache = {}
+        templates.set_directories([self.templates], self.cache)
+        return templates
+
+    def test_template_deps(self):
+        page, base = [os.path.join(self.templates, name) for name in ('page.tmpl', 'base.tmpl')]
+        templates = self.make_templates()
+        self.assertEqual(templates.template_deps('page.tmpl'), [page, base])
+        self.assertTrue(os.path.exists(os.path.join(self.cache, 'jinja', 'template_deps.json')))
+
+        # References come from the cache in the next run...
+        templates = self.make_templates()
+        templates.lookup.parse = None
+        self.assertEqual(templates.template_deps('page.tmpl'), [page, base])
+
+        # ...unless the template changed
+        self.write('page.tmpl', 'no more inheritance')
+        templates = self.make_templates()
+        self.assertEqual(templates.template_deps('page.tmpl'), [page])
+
+    def test_template_deps_saved_once(self):
+        templates = self.make_templates()
+        with mock.patch.object(templates, 'save_references_cache', wraps=templates.save_references_cache) as save:
+            templates.template_deps('page.tmpl')
+            templates.template_deps('base.tmpl')
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual([f for f in os.listdir(os.path.join(self.cache, 'jinja')) if f.startswith('tmp')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
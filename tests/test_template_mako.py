@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, absolute_import
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from nikola.plugins.template.mako import MakoTemplates
+
+
+class MakoModuleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.tmpdir, 'templates')
+        self.cache = os.path.join(self.tmpdir, 'cache')
+        os.mkdir(self.templates)
+        self.write('base.tmpl', 'base ${self.body()}')
+        self.write('page.tmpl', '<%inherit file="base.tmpl"/>page ${title}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text, mtime=None):
+        fname = os.path.join(self.templates, name)
+        with io.open(fname, 'w', encoding='utf-8') as outf:
+            outf.write(text)
+        if mtime is not None:
+            os.utime(fname, (mtime, mtime))
+
+    def make_templates(self):
+        templates = MakoTemplates()
+        templates.cache = {}
+        templates.set_directories([self.templates], self.cache)
+        return templates
+
+    def modules(self):
+        return sorted(f for f in os.listdir(os.path.join(self.cache, '.mako.tmp')) if f.endswith('.py'))
+
+    def test_modules_are_kept(self):
+        templates = self.make_templates()
+        self.assertEqual(templates.render_template('page.tmpl', None, {'title': 'x'}), 'base page x')
+        modules = self.modules()
+        self.assertEqual(len(modules), 2)
+
+        # A new run reuses the compiled modules
+        templates = self.make_templates()
+        self.assertEqual(templates.render_template('page.tmpl', None, {'title': 'y'}), 'base page y')
+        self.assertEqual(self.modules(), modules)
+
+    def test_changed_source_is_recompiled(self):
+        templates = self.make_templates()
+        templates.render_template('page.tmpl', None, {'title': 'x'})
+        # Changed, but looks older than the compiled module
+        self.write('base.tmpl', 'new base ${self.body()}', mtime=0)
+        templates = self.make_templates()
+        self.assertEqual(templates.render_template('page.tmpl', None, {'title': 'x'}), 'new base page x')
+        # The old module is gone
+        self.assertEqual(len(self.modules()), 2)
+
+    def test_template_deps(self):
+        templates = self.make_templates()
+        page, base = [os.path.join(self.templates, name).replace(os.sep, '/') for name in ('page.tmpl', 'base.tmpl')]
+        self.assertEqual(templates.template_deps('page.tmpl'), [page, base])
+        self.assertTrue(os.path.exists(os.path.join(self.cache, '.mako.tmp', 'template_deps.json')))
+
+        # Dependencies come from the cache in the next run...
+        templates = self.make_templates()
+        templates.get_deps = None
+        self.assertEqual(templates.template_deps('page.tmpl'), [page, base])
+
+        # ...unless the template changed
+        self.write('page.tmpl', 'no more inheritance')
+        templates = self.make_templates()
+        self.assertEqual(templates.template_deps('page.tmpl'), [page])
+
+    def test_template_deps_saved_once(self):
+        templates = self.make_templates()
+        with mock.patch.object(templates, 'save_deps_cache', wraps=templates.save_deps_cache) as save:
+            templates.template_deps('page.tmpl')
+            templates.template_deps('base.tmpl')
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual([f for f in os.listdir(os.path.join(self.cache, '.mako.tmp')) if f.endswith('.json')],
+                         ['template_deps.json'])
+        self.assertEqual([f for f in os.listdir(os.path.join(self.cache, '.mako.tmp')) if f.startswith('tmp')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
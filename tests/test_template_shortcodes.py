@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 
 import pytest
 from nikola import Nikola
+from nikola.shortcodes import shortcode_version
 
 
 class ShortcodeFakeSite(Nikola):
@@ -84,3 +85,22 @@ def test_data(fakesite):
     # surprise!
     res = fakesite.apply_shortcodes('{{% test1 data=dummy %}}')
     assert res == 'data='
+
+
+def test_compiled_once(fakesite):
+    fakesite.shortcode_registry['test1'] = \
+        fakesite._make_renderfunc('foo={{ foo }}')
+
+    res = fakesite.apply_shortcodes('{{% test1 foo=bar %}} {{% test1 foo=baz %}}')
+    assert res == 'foo=bar foo=baz'
+    compiled = fakesite.template_system.string_templates['foo={{ foo }}']
+    fakesite.apply_shortcodes('{{% test1 foo=bar %}}')
+    assert fakesite.template_system.string_templates['foo={{ foo }}'] is compiled
+
+
+def test_purity(fakesite):
+    # Templates may use anything, only Nikola's own are known to be pure
+    assert shortcode_version(fakesite._make_renderfunc('foo={{ foo }}')) is None
+    assert shortcode_version(fakesite._make_renderfunc('foo={{ foo }}', pure=True))
+    assert shortcode_version(fakesite.shortcode_registry['raw'])
+    assert shortcode_version(fakesite.shortcode_registry['media']) is None
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+import io
+import os
+import shutil
+import tempfile
 import unittest
 import mock
 import lxml.html
 from nikola.post import get_meta
-from nikola.utils import demote_headers, TranslatableSetting
+from nikola.utils import demote_headers, TranslatableSetting, copy_file, apply_filters
 
 
 class dummy(object):
@@ -225,6 +229,80 @@ class HeaderDemotionTest(unittest.TestCase):
         self.assertEquals(lxml.html.tostring(outdoc), lxml.html.tostring(doc))
 
 
+class CopyFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmpdir, 'files', 'video.bin')
+        self.dest = os.path.join(self.tmpdir, 'output', 'video.bin')
+        os.mkdir(os.path.dirname(self.source))
+        with io.open(self.source, 'wb') as outf:
+            outf.write(b'x' * 100000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        with io.open(path, 'rb') as inf:
+            return inf.read()
+
+    def assertCopied(self):
+        self.assertEqual(self.read(self.dest), self.read(self.source))
+        self.assertEqual(os.stat(self.dest).st_mtime, os.stat(self.source).st_mtime)
+
+    def test_modes(self):
+        for mode in ('copy', 'reflink', 'auto'):
+            copy_file(self.source, self.dest, mode=mode)
+            self.assertCopied()
+            os.unlink(self.dest)
+        copy_file(self.source, self.dest, mode='hardlink')
+        self.assertTrue(os.path.samefile(self.source, self.dest))
+        # Copying replaces the hard link
+        copy_file(self.source, self.dest, mode='copy')
+        self.assertFalse(os.path.samefile(self.source, self.dest))
+        self.assertCopied()
+
+    def test_hardlink_to_symlink(self):
+        symlink = os.path.join(self.tmpdir, 'files', 'link.bin')
+        os.symlink('video.bin', symlink)
+        copy_file(symlink, self.dest, mode='hardlink')
+        self.assertFalse(os.path.islink(self.dest))
+        self.assertTrue(os.path.samefile(self.source, self.dest))
+
+    def test_unchanged_files_are_kept(self):
+        copy_file(self.source, self.dest, mode='reflink')
+        inode = os.stat(self.dest).st_ino
+        copy_file(self.source, self.dest, mode='reflink')
+        self.assertEqual(os.stat(self.dest).st_ino, inode)
+        with io.open(self.source, 'ab') as outf:
+            outf.write(b'y')
+        copy_file(self.source, self.dest, mode='reflink')
+        self.assertCopied()
+
+    def test_copy_mode_always_copies(self):
+        copy_file(self.source, self.dest)
+        # Same size and modification time, other contents
+        stat = os.stat(self.source)
+        with io.open(self.source, 'wb') as outf:
+            outf.write(b'z' * 100000)
+        os.utime(self.source, (stat.st_atime, stat.st_mtime))
+        copy_file(self.source, self.dest)
+        self.assertCopied()
+
+    def test_filters_keep_source(self):
+        copy_file(self.source, self.dest, mode='hardlink')
+
+        def shorten(path):
+            with io.open(path, 'r+b') as outf:
+                outf.truncate(10)
+
+        task = apply_filters({'targets': [self.dest], 'actions': []}, {'.bin': [shorten]})
+        for action, args in task['actions']:
+            action(*args)
+        self.assertEqual(len(self.read(self.source)), 100000)
+        self.assertEqual(len(self.read(self.dest)), 10)
+
+
 class TranslatableSettingsTest(unittest.TestCase):
     """Tests for translatable settings."""
 